@@ -0,0 +1,43 @@
+"""
+Сравнение двух отчетов benchmarks.run.
+
+    python -m benchmarks.compare before.json after.json
+"""
+
+import argparse
+import json
+
+from benchmarks.stats import flatten
+
+
+def compare(before: dict, after: dict) -> list[tuple[str, float | None, float | None, float | None]]:
+    """Строки (метрика, было, стало, изменение в процентах) по числовым метрикам отчетов."""
+    old, new = flatten(before), flatten(after)
+    rows = []
+    for key in sorted(old.keys() | new.keys()):
+        if key.startswith("meta."):
+            continue
+        was, now = old.get(key), new.get(key)
+        change = None
+        if was and now is not None:
+            change = round((now - was) / abs(was) * 100, 1)
+        rows.append((key, was, now, change))
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Сравнение двух отчетов нагрузочного прогона")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+    with open(args.before) as before, open(args.after) as after:
+        rows = compare(json.load(before), json.load(after))
+
+    width = max((len(key) for key, *_ in rows), default=0)
+    for key, was, now, change in rows:
+        delta = "" if change is None else f"{change:+.1f}%"
+        print(f"{key:<{width}}  {str(was):>12}  {str(now):>12}  {delta:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Нагрузочный прогон мессенджера: WebSocket-рассылка и REST-история.
+
+По умолчанию поднимает benchmarks.server в отдельном процессе на локальных
+Postgres и Redis из .env, создает пользователей и чаты через REST, получает
+каждому токен доступа, открывает по соединению на пользователя и пишет отчет
+в JSON. Свой сервер запускается с AUTH_SECRET_KEY (случайным, если он не задан
+в окружении); внешнему серверу (--url) ключ нужен, чтобы выдавать токены.
+
+    python -m benchmarks.run --clients 200 --group-size 20 --output before.json
+    python -m benchmarks.compare before.json after.json
+
+С --protocol msgpack клиенты согласуют бинарный подпротокол вместо JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+import httpx
+import msgpack
+from websockets.asyncio.client import ClientConnection, connect
+
+from benchmarks.stats import summarize
+from src.core.ws_protocol import (
+    ACTION_KEYS,
+    BINARY_SUBPROTOCOL,
+    FLAG_DEFLATE,
+    MESSAGE_CREATE_KEYS,
+)
+
+# Имя поля JSON-протокола -> короткий ключ бинарного
+SHORT_ACTION_KEYS = {name: key for key, name in ACTION_KEYS.items()}
+SHORT_MESSAGE_CREATE_KEYS = {name: key for key, name in MESSAGE_CREATE_KEYS.items()}
+
+
+class Client:
+    """Имитация пользователя с одним WebSocket-соединением."""
+
+    def __init__(self, user_id: int, connection: ClientConnection):
+        self.user_id = user_id
+        self.connection = connection
+        self.chats: list[int] = []
+        self.reader: asyncio.Task | None = None
+
+
+class DeliveryTracker:
+    """Сопоставляет полученные сообщения с моментом отправки по тексту."""
+
+    def __init__(self):
+        self.sent_at: dict[str, float] = {}
+        self.latencies: list[float] = []
+        self.expected = 0
+        self.delivered = 0
+        # Полезная нагрузка кадров до permessage-deflate
+        self.frames = 0
+        self.payload_bytes = 0
+        self.done = asyncio.Event()
+
+    def sent(self, text: str, recipients: int):
+        self.sent_at[text] = time.perf_counter()
+        self.expected += recipients
+
+    def received(self, text: str):
+        sent_at = self.sent_at.get(text)
+        if sent_at is None:
+            return
+        self.latencies.append(time.perf_counter() - sent_at)
+        self.delivered += 1
+        if self.delivered >= self.expected:
+            self.done.set()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон WebSocket и REST")
+    parser.add_argument("--url", help="адрес уже запущенного сервера; по умолчанию поднимается свой")
+    parser.add_argument("--port", type=int, default=0, help="порт для своего сервера (0 — любой свободный)")
+    parser.add_argument("--clients", type=int, default=100, help="число пользователей и соединений")
+    parser.add_argument("--groups", type=int, default=5, help="число групповых чатов")
+    parser.add_argument("--group-size", type=int, default=20, help="участников в групповом чате")
+    parser.add_argument("--messages", type=int, default=50, help="сообщений от каждого клиента")
+    parser.add_argument("--interval-ms", type=float, default=10, help="пауза между сообщениями клиента")
+    parser.add_argument("--history-requests", type=int, default=2000, help="запросов GET /history")
+    parser.add_argument("--history-concurrency", type=int, default=50)
+    parser.add_argument("--history-limit", type=int, default=50)
+    parser.add_argument("--drain-timeout", type=float, default=30, help="ожидание доставки, секунд")
+    parser.add_argument("--protocol", choices=("json", "msgpack"), default="json", help="протокол WebSocket")
+    parser.add_argument(
+        "--compression", choices=("deflate", "none"), default="deflate", help="permessage-deflate клиента"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл для JSON-отчета; по умолчанию stdout")
+    return parser.parse_args(argv)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("AUTH_SECRET_KEY", secrets.token_hex(32))
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.server:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_ready(http: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await http.get("/docs")
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def server_stats(http: httpx.AsyncClient) -> dict | None:
+    """Счетчики benchmarks.server; у внешнего сервера без эндпоинта — None."""
+    response = await http.get("/__bench__/stats")
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+async def issue_token(http: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await http.post("/auth/token", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def bearer(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def create_fixture(
+    http: httpx.AsyncClient, args: argparse.Namespace
+) -> tuple[list[int], dict[int, list[int]], dict[int, str]]:
+    """
+    Создает пользователей, личные чаты по парам соседей и групповые чаты.
+    Возвращает также токены доступа пользователей.
+    """
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    user_ids = []
+    tokens: dict[int, str] = {}
+    for i in range(args.clients):
+        email = f"bench-{run_id}-{i}@example.com"
+        response = await http.post(
+            "/users/", json={"name": f"Bench{i}", "email": email, "password": "password"}
+        )
+        response.raise_for_status()
+        user_id = response.json()["id"]
+        user_ids.append(user_id)
+        tokens[user_id] = await issue_token(http, email, "password")
+
+    chats: dict[int, list[int]] = {}
+    for creator_id, friend_id in zip(user_ids[::2], user_ids[1::2]):
+        response = await http.post(
+            "/chats/create_personal",
+            json={"creator_id": creator_id, "friend_id": friend_id},
+            headers=bearer(tokens[creator_id]),
+        )
+        response.raise_for_status()
+        chats[response.json()["id"]] = [creator_id, friend_id]
+
+    group_size = min(args.group_size, len(user_ids))
+    for i in range(args.groups):
+        members = rng.sample(user_ids, group_size)
+        # Чат создает и пополняет первый участник со своим токеном
+        headers = bearer(tokens[members[0]])
+        response = await http.post(
+            "/chats/create_group",
+            json={"name": f"Bench group {i}", "creator_id": members[0]},
+            headers=headers,
+        )
+        response.raise_for_status()
+        chat_id = response.json()["id"]
+        for user_id in members[1:]:
+            added = await http.post(
+                "/chats/add_member", json={"chat_id": chat_id, "user_id": user_id}, headers=headers
+            )
+            added.raise_for_status()
+        chats[chat_id] = members
+    return user_ids, chats, tokens
+
+
+def encode_action(action: dict, protocol: str) -> str | bytes:
+    if protocol == "json":
+        return json.dumps(action)
+    compact = {SHORT_ACTION_KEYS.get(key, key): value for key, value in action.items()}
+    if "msg" in compact:
+        compact["msg"] = {SHORT_MESSAGE_CREATE_KEYS.get(key, key): value for key, value in compact["msg"].items()}
+    return b"\x00" + msgpack.packb(compact)
+
+
+def decode_events(frame: str | bytes) -> list[tuple[str | None, str | None]]:
+    """События кадра любого протокола как пары (имя события, текст сообщения)."""
+    if isinstance(frame, str):
+        data = json.loads(frame)
+        return [(data.get("event"), data.get("text"))]
+    body = frame[1:]
+    if frame[0] & FLAG_DEFLATE:
+        body = zlib.decompress(body)
+    return [
+        (None, event.get("t")) if event.get("e") == "m" else (event.get("e"), None)
+        for event in msgpack.unpackb(body)
+    ]
+
+
+async def read_frames(client: Client, tracker: DeliveryTracker, args: argparse.Namespace):
+    async for frame in client.connection:
+        tracker.frames += 1
+        tracker.payload_bytes += len(frame.encode() if isinstance(frame, str) else frame)
+        for event, text in decode_events(frame):
+            if event == "ping":
+                await client.connection.send(encode_action({"action": "pong"}, args.protocol))
+            elif text is not None:
+                tracker.received(text)
+
+
+async def run_client(client: Client, chats: dict[int, list[int]], tracker: DeliveryTracker, args, rng: random.Random):
+    for chat_id in client.chats:
+        await client.connection.send(
+            encode_action({"action": "get_chat_members", "chat_id": chat_id}, args.protocol)
+        )
+    for _ in range(args.messages):
+        chat_id = rng.choice(client.chats)
+        external_id = str(uuid.uuid4())
+        text = f"bench {external_id}"
+        tracker.sent(text, len(chats[chat_id]) - 1)
+        await client.connection.send(
+            encode_action(
+                {
+                    "action": "send_message",
+                    "msg": {"chat_id": chat_id, "external_id": external_id, "text": text},
+                },
+                args.protocol,
+            )
+        )
+        if args.interval_ms:
+            await asyncio.sleep(args.interval_ms / 1000)
+
+
+async def run_ws_load(clients: list[Client], chats: dict[int, list[int]], args) -> dict:
+    tracker = DeliveryTracker()
+    for client in clients:
+        client.reader = asyncio.create_task(read_frames(client, tracker, args))
+
+    started = time.perf_counter()
+    senders = [client for client in clients if client.chats]
+    await asyncio.gather(
+        *(run_client(client, chats, tracker, args, random.Random(args.seed + client.user_id)) for client in senders)
+    )
+    sent_elapsed = time.perf_counter() - started
+    if tracker.delivered < tracker.expected:
+        try:
+            await asyncio.wait_for(tracker.done.wait(), args.drain_timeout)
+        except TimeoutError:
+            pass
+    elapsed = time.perf_counter() - started
+
+    sent = len(tracker.sent_at)
+    return {
+        "messages_sent": sent,
+        "deliveries_expected": tracker.expected,
+        "deliveries": tracker.delivered,
+        "send_rate": round(sent / sent_elapsed, 1) if sent_elapsed else None,
+        "msgs_per_sec": round(sent / elapsed, 1) if elapsed else None,
+        "deliveries_per_sec": round(tracker.delivered / elapsed, 1) if elapsed else None,
+        "delivery_latency_ms": summarize(tracker.latencies),
+        "frames": tracker.frames,
+        "payload_bytes_per_delivery": round(tracker.payload_bytes / tracker.delivered, 1)
+        if tracker.delivered
+        else None,
+    }
+
+
+async def run_history_load(
+    http: httpx.AsyncClient, chats: dict[int, list[int]], tokens: dict[int, str], args
+) -> dict:
+    rng = random.Random(args.seed)
+    chat_ids = list(chats)
+    latencies: list[float] = []
+    errors = 0
+    remaining = args.history_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            chat_id = rng.choice(chat_ids)
+            started = time.perf_counter()
+            # Историю читает участник чата со своим токеном
+            response = await http.get(
+                f"/history/{chat_id}",
+                params={"limit": args.history_limit, "latest": "true"},
+                headers=bearer(tokens[chats[chat_id][0]]),
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.history_concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": summarize(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    started_at = datetime.now(timezone.utc).isoformat()
+    port = args.port or free_port()
+    base_url = args.url or f"http://127.0.0.1:{port}"
+    server = None if args.url else spawn_server(port)
+    ws_url = base_url.replace("http", "ws", 1)
+    limits = httpx.Limits(max_connections=args.history_concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as http:
+            await wait_ready(http)
+            user_ids, chats, tokens = await create_fixture(http, args)
+
+            idle = await server_stats(http)
+            clients = []
+            subprotocols = [BINARY_SUBPROTOCOL] if args.protocol == "msgpack" else None
+            compression = "deflate" if args.compression == "deflate" else None
+            for user_id in user_ids:
+                connection = await connect(
+                    f"{ws_url}/ws/{user_id}?token={tokens[user_id]}",
+                    max_queue=None,
+                    subprotocols=subprotocols,
+                    compression=compression,
+                )
+                clients.append(Client(user_id, connection))
+            for chat_id, members in chats.items():
+                for client in clients:
+                    if client.user_id in members:
+                        client.chats.append(chat_id)
+            connected = await server_stats(http)
+
+            ws_result = await run_ws_load(clients, chats, args)
+            loaded = await server_stats(http)
+
+            for client in clients:
+                client.reader.cancel()
+                await client.connection.close()
+
+            history_result = await run_history_load(http, chats, tokens, args)
+            finished = await server_stats(http)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    server_result = None
+    if idle is not None:
+        sent = ws_result["messages_sent"]
+        server_result = {
+            "settings": idle["settings"],
+            "connections": connected["connections"],
+            "memory_per_connection_bytes": (connected["rss"] - idle["rss"]) // max(len(clients), 1),
+            "rss_bytes": finished["rss"],
+            "queries_per_message": round((loaded["queries"] - connected["queries"]) / sent, 2) if sent else None,
+            "cpu_ms_per_message": round((loaded["cpu"] - connected["cpu"]) / sent * 1000, 3) if sent else None,
+            "queries_per_history_request": round(
+                (finished["queries"] - loaded["queries"]) / max(history_result["requests"], 1), 2
+            ),
+        }
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": started_at,
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "url", "port")},
+        },
+        "ws": ws_result,
+        "history": history_result,
+        "server": server_result,
+    }
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    report = json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
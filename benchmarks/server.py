@@ -0,0 +1,52 @@
+"""
+Приложение для замеров: тот же src.main.app плюс служебный эндпоинт
+/__bench__/stats со счетчиком SQL-запросов, RSS и процессорным временем процесса.
+
+Запуск: python -m uvicorn benchmarks.server:app
+"""
+
+import os
+import resource
+import time
+
+from sqlalchemy import event
+
+from src.core.config import settings
+from src.core.ws_manager import ws_manager
+from src.db.session import engine
+from src.main import app
+
+_queries = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(*args):  # noqa
+    global _queries
+    _queries += 1
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Вне Linux доступен только пиковый RSS (в килобайтах)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@app.get("/__bench__/stats", include_in_schema=False)
+async def bench_stats():
+    return {
+        "queries": _queries,
+        "rss": _rss_bytes(),
+        "cpu": time.process_time(),
+        "connections": ws_manager.connection_count,
+        "settings": {
+            "MESSAGE_WRITE_BEHIND": settings.MESSAGE_WRITE_BEHIND,
+            "DB_POOL_SIZE": settings.DB_POOL_SIZE,
+            "DB_MAX_OVERFLOW": settings.DB_MAX_OVERFLOW,
+            "WS_SEND_QUEUE_SIZE": settings.WS_SEND_QUEUE_SIZE,
+            "WS_BINARY_BATCH_SIZE": settings.WS_BINARY_BATCH_SIZE,
+            "WS_BINARY_COMPRESS_THRESHOLD": settings.WS_BINARY_COMPRESS_THRESHOLD,
+        },
+    }
@@ -0,0 +1,36 @@
+import math
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float]) -> dict:
+    """Сводка задержек в миллисекундах; latencies передаются в секундах."""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+def flatten(report: dict, prefix: str = "") -> dict[str, float]:
+    """Разворачивает вложенный отчет в плоский словарь числовых метрик `a.b.c`."""
+    result = {}
+    for key, value in report.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            result.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            result[path] = value
+    return result
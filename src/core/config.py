@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import SecretStr
 
@@ -9,6 +11,19 @@ class Settings(BaseSettings):
     DB_PORT: int = 1111
     DB_NAME: str = ""
 
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DB_COMMAND_TIMEOUT: float = 60
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    DB_APPLICATION_NAME: str = "messenger"
+    # Совместимость с PgBouncer в режиме pool_mode=transaction: без подготовленных выражений
+    DB_PGBOUNCER: bool = False
+
     TEST_DB_USER: str = ""
     TEST_DB_PASS: SecretStr = ""
     TEST_DB_HOST: str = ""
@@ -18,7 +33,61 @@ class Settings(BaseSettings):
     REDIS_HOST: str = ""
     REDIS_PORT: int = 1111
 
+    AUTH_SECRET_KEY: SecretStr = ""
+    # С заданным AUTH_SECRET_KEY токен обязателен для всех запросов, кроме
+    # регистрации (POST /users/) и получения токена; без ключа запросы без
+    # токена принимаются как раньше, если AUTH_REQUIRED не включен явно
+    AUTH_REQUIRED: bool = False
+    AUTH_TOKEN_TTL: int = 86400
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 300
+
     WS_URL: str = ""
+    WS_PRESENCE_TTL: int = 60
+    # Пинг после WS_HEARTBEAT_INTERVAL секунд тишины (0 — без пингов), отключение,
+    # если за WS_HEARTBEAT_TIMEOUT после пинга ничего не пришло; шаг колеса таймеров
+    WS_HEARTBEAT_INTERVAL: float = 30
+    WS_HEARTBEAT_TIMEOUT: float = 10
+    WS_HEARTBEAT_TICK: float = 1
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: Literal["drop", "disconnect"] = "disconnect"
+    # Бинарный подпротокол: событий в одном кадре, порог и уровень сжатия кадра
+    # (0 — не сжимать), предельный размер входящего кадра после распаковки
+    WS_BINARY_BATCH_SIZE: int = 32
+    WS_BINARY_COMPRESS_THRESHOLD: int = 1024
+    WS_BINARY_COMPRESS_LEVEL: int = 1
+    WS_BINARY_MAX_FRAME: int = 1 << 20
+
+    OFFLINE_QUEUE_MAX_LEN: int = 1000
+    OFFLINE_QUEUE_TTL: int = 86400
+    # Курсор устройства, не подключавшегося дольше этого срока, забывается и
+    # больше не задерживает очистку очереди
+    OFFLINE_DEVICE_TTL: int = 86400
+    OFFLINE_REPLAY_BATCH: int = 100
+    OFFLINE_ACK_TIMEOUT: float = 10
+    OFFLINE_REPLAY_ATTEMPTS: int = 3
+
+    MEMBERSHIP_CACHE_TTL: int = 86400
+    MEMBERSHIP_LOCAL_CACHE_SIZE: int = 10000
+    MEMBERSHIP_LOCAL_CACHE_TTL: float = 60
+
+    READ_RECEIPT_FLUSH_MS: int = 500
+
+    RECENT_MESSAGES_CAPACITY: int = 100
+    RECENT_MESSAGES_TTL: int = 3600
+
+    MESSAGE_WRITE_BEHIND: bool = False
+    MESSAGE_BATCH_SIZE: int = 200
+    MESSAGE_BATCH_MAX_WAIT_MS: int = 5
+
+    # Резерв external_id на время отправки и хранение ответа для повторов, секунды
+    MESSAGE_IDEMPOTENCY_PENDING_TTL: int = 30
+    MESSAGE_IDEMPOTENCY_TTL: int = 600
+
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = 2
+    MESSAGE_PARTITION_RETENTION_MONTHS: int = 0
+    MESSAGE_PARTITION_HASH_MODULUS: int = 0
+    MESSAGE_PARTITION_CHECK_INTERVAL: int = 3600
 
     @property
     def db_url(self) -> SecretStr:
@@ -36,6 +105,10 @@ class Settings(BaseSettings):
     def ws_url(self) -> str:
         return self.WS_URL
 
+    @property
+    def auth_required(self) -> bool:
+        return self.AUTH_REQUIRED or bool(self.AUTH_SECRET_KEY.get_secret_value())
+
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
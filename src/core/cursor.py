@@ -0,0 +1,34 @@
+"""
+Непрозрачные курсоры для keyset-пагинации.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from src.core.exceptions import ValidationError
+
+
+def encode_cursor(*values: Any) -> str:
+    """Кодирует значения ключа сортировки в url-безопасную строку."""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """Декодирует курсор, приводя каждое значение к ожидаемому типу."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for value, type_ in zip(values, types)
+        )
+    except (ValueError, TypeError):
+        raise ValidationError("Некорректный курсор")
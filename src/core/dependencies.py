@@ -1,9 +1,15 @@
-from typing import Annotated
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from src.core.config import settings
+from src.core.exceptions import AuthenticationError, NotFoundError, PermissionDeniedError
 from src.core.redis_config import redis
+from src.core.security import Principal, token_authenticator
+from src.db import session as db_session
 from src.db.session import get_async_session
 from src.repositories.chat import ChatRepository
 from src.repositories.chat_member import ChatMemberRepository
@@ -13,12 +19,66 @@ from src.repositories.user import UserRepository
 from src.services.chat import ChatService
 from src.services.chat_member import ChatMemberService
 from src.services.group import GroupService
+from src.services.membership_cache import membership_cache
 from src.services.message import MessageService
+from src.services.recent_messages import recent_messages
 from src.services.redis_chat import RedisChatService
 from src.services.user import UserService
 
 SesionDepends = Annotated[AsyncSession, Depends(get_async_session)]
 
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def get_principal(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> Principal | None:
+    """
+    Пользователь из заголовка Authorization: Bearer. Токен проверяется без БД;
+    без токена возвращается None, только если аутентификация не обязательна
+    (не задан AUTH_SECRET_KEY и выключен AUTH_REQUIRED).
+    """
+    try:
+        if credentials is None:
+            if settings.auth_required:
+                raise AuthenticationError("Требуется токен доступа")
+            return None
+        return token_authenticator.authenticate(credentials.credentials)
+    except AuthenticationError as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=e.message, headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+def check_principal(principal: Principal | None, user_id: int) -> None:
+    """Запрещает действовать от имени другого пользователя."""
+    if principal is not None and principal.user_id != user_id:
+        error = PermissionDeniedError()
+        raise HTTPException(status_code=error.status_code, detail=error.message)
+
+
+async def check_chat_member(
+    principal: Principal | None, chat_member_service: ChatMemberService, chat_id: int
+) -> None:
+    """Запрещает доступ к чату тому, кто в нем не состоит."""
+    if principal is None:
+        return
+    try:
+        await chat_member_service.check_user_in_this_chat(chat_id, principal.user_id)
+    except NotFoundError as e:
+        error = PermissionDeniedError(e.message)
+        raise HTTPException(status_code=error.status_code, detail=error.message)
+
+
+def require_principal(principal: Principal | None = Depends(get_principal)) -> Principal:
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=AuthenticationError("Требуется токен доступа").message,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
 
 def get_chat_repo(session: SesionDepends) -> ChatRepository:
     return ChatRepository(session)
@@ -48,7 +108,7 @@ def get_chat_member_service(
     chat_member_repo: ChatMemberRepository = Depends(get_chat_member_repo),
     user_service: UserService = Depends(get_user_service),
 ) -> ChatMemberService:
-    return ChatMemberService(chat_member_repo, user_service)
+    return ChatMemberService(chat_member_repo, user_service, membership_cache)
 
 
 def get_group_service(
@@ -81,7 +141,9 @@ def get_message_service(
     user_service: UserService = Depends(get_user_service),
     chat_member_service: ChatMemberService = Depends(get_chat_member_service),
 ) -> MessageService:
-    return MessageService(message_repo, chat_service, user_service, chat_member_service)
+    return MessageService(
+        message_repo, chat_service, user_service, chat_member_service, recent_messages
+    )
 
 
 def get_redis_chat_service(
@@ -90,6 +152,50 @@ def get_redis_chat_service(
     return RedisChatService(redis, chat_members_service)
 
 
+def build_message_service(session: AsyncSession) -> MessageService:
+    """Собирает MessageService с зависимостями вне DI FastAPI."""
+    user_service = get_user_service(get_user_repo(session))
+    chat_member_service = get_chat_member_service(
+        get_chat_member_repo(session), user_service
+    )
+    group_service = get_group_service(
+        get_group_repo(session),
+        get_chat_repo(session),
+        get_chat_member_repo(session),
+        chat_member_service,
+        user_service,
+    )
+    chat_service = get_chat_service(
+        get_chat_repo(session),
+        get_chat_member_repo(session),
+        user_service,
+        chat_member_service,
+        group_service,
+    )
+    return get_message_service(
+        get_message_repo(session), chat_service, user_service, chat_member_service
+    )
+
+
+@asynccontextmanager
+async def message_service_scope(
+    session_factory: async_sessionmaker[AsyncSession] | None = None,
+) -> AsyncIterator[MessageService]:
+    """
+    Короткая единица работы для долгоживущих соединений: своя сессия на каждый
+    кадр WebSocket, коммит при выходе. Соединение с БД берется из пула только
+    на время запросов, а карта идентичности не копится между кадрами.
+    """
+    async with (session_factory or db_session.async_session_factory)() as session:
+        try:
+            yield build_message_service(session)
+            await session.commit()
+            await db_session.run_after_commit(session)
+        except Exception:
+            await session.rollback()
+            raise
+
+
 UserServiceDepends = Annotated[UserService, Depends(get_user_service)]
 ChatServiceDepends = Annotated[ChatService, Depends(get_chat_service)]
 GroupServiceDepends = Annotated[GroupService, Depends(get_group_service)]
@@ -98,3 +204,5 @@ ChatMemberServiceDepends = Annotated[
 ]
 MessageServiceDepends = Annotated[MessageService, Depends(get_message_service)]
 RedisChatServiceDepends = Annotated[RedisChatService, Depends(get_redis_chat_service)]
+PrincipalDepends = Annotated[Principal | None, Depends(get_principal)]
+RequiredPrincipalDepends = Annotated[Principal, Depends(require_principal)]
@@ -0,0 +1,146 @@
+import time
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from prometheus_client import Counter, Gauge, Histogram
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Границы гистограмм задержек: от 0.1 мс до 5 с
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+)
+
+WS_CONNECTIONS = Gauge("ws_connections", "Активные WebSocket-соединения воркера", ["node"])
+WS_FRAMES = Counter("ws_frames_total", "Входящие WebSocket-кадры", ["action"])
+WS_CONNECTS = Counter("ws_connects_total", "Открытые WebSocket-соединения")
+WS_DISCONNECTS = Counter(
+    "ws_disconnects_total", "Закрытые WebSocket-соединения по причине", ["reason"]
+)
+WS_CONNECTION_SECONDS = Histogram(
+    "ws_connection_seconds",
+    "Время жизни WebSocket-соединения",
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600, 24 * 3600),
+)
+WS_HEARTBEAT_PINGS = Counter("ws_heartbeat_pings_total", "Пинги простаивающим соединениям")
+WS_FANOUT_SIZE = Histogram(
+    "ws_fanout_recipients",
+    "Число получателей одного сообщения",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000),
+)
+WS_BROADCAST_SECONDS = Histogram(
+    "ws_broadcast_seconds", "Время рассылки сообщения по очередям и узлам", buckets=LATENCY_BUCKETS
+)
+WS_SEND_SECONDS = Histogram(
+    "ws_send_seconds", "Время записи одного кадра в сокет", buckets=LATENCY_BUCKETS
+)
+WS_SLOW_CONSUMERS = Counter(
+    "ws_slow_consumers_total", "Переполнения очереди отправки соединения", ["policy"]
+)
+OFFLINE_QUEUE_PUSHES = Counter("offline_queue_pushes_total", "Сообщения, поставленные в оффлайн-очереди")
+MESSAGE_REPLAYS = Counter(
+    "message_replays_total", "Повторные отправки сообщений по источнику ответа", ["source"]
+)
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Ожидание соединения из пула БД", buckets=LATENCY_BUCKETS
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Соединения БД, выданные из пула")
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Время выполнения SQL-запроса", ["operation"], buckets=LATENCY_BUCKETS
+)
+REDIS_COMMAND_SECONDS = Histogram(
+    "redis_command_seconds", "Время выполнения команды Redis", ["command"], buckets=LATENCY_BUCKETS
+)
+
+# Метод репозитория, от имени которого сейчас выполняются запросы
+db_operation: ContextVar[str] = ContextVar("db_operation", default="other")
+
+
+def track_queries(cls):
+    """
+    Декоратор класса репозитория: запросы его публичных методов попадают
+    в db_query_seconds с меткой `Класс.метод`.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not iscoroutinefunction(method):
+            continue
+        setattr(cls, name, _tracked(f"{cls.__name__}.{name}", method))
+    return cls
+
+
+def _tracked(operation: str, method):
+    @wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = db_operation.set(operation)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            db_operation.reset(token)
+
+    return wrapper
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Подключает к движку замер времени запросов и число выданных соединений."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_SECONDS.labels(db_operation.get()).observe(elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):  # noqa
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
+
+    DB_POOL_CHECKED_OUT.set_function(sync_engine.pool.checkedout)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание свободного соединения."""
+
+    def _do_get(self):
+        # У пула нет события до выдачи соединения, поэтому замеряем саму выдачу
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_SECONDS.labels("PIPELINE").observe(time.perf_counter() - started)
+
+
+class InstrumentedRedis(Redis):
+    """Клиент Redis с замером времени каждой команды и каждого конвейера."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            command = args[0] if isinstance(args[0], str) else args[0].decode()
+            REDIS_COMMAND_SECONDS.labels(command.upper()).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
@@ -0,0 +1,133 @@
+import time
+
+from redis.asyncio import Redis
+
+from src.core.config import settings
+from src.core.metrics import OFFLINE_QUEUE_PUSHES
+from src.core.redis_config import redis
+
+
+# Устройство клиентов, не передавших device_id: у них общий курсор, как до поддержки нескольких устройств
+DEFAULT_DEVICE_ID = "default"
+
+
+def parse_stream_id(stream_id: str) -> tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class OfflineQueue:
+    """
+    Очередь сообщений для пользователей без активного соединения.
+
+    Хранится в Redis Stream `offline:user:{user_id}` ограниченной длины.
+    Записи удаляются только после подтверждения клиентом (ack), поэтому
+    обрыв соединения во время выдачи не теряет сообщения.
+
+    Каждое устройство пользователя подтверждает выдачу своим курсором в хэше
+    `offline:user:{user_id}:cursors`, а из очереди удаляются только записи,
+    подтвержденные всеми известными устройствами. Время последнего подключения
+    или ack устройства хранится в `offline:user:{user_id}:seen`; курсор
+    устройства, не появлявшегося дольше OFFLINE_DEVICE_TTL, удаляется при
+    очередном ack и больше не задерживает очистку. Вернувшись, такое
+    устройство начинает с нулевого курсора и получает все, что осталось.
+
+    В очередь попадают только сообщения для пользователей, у которых в момент
+    рассылки не было ни одного соединения. Устройство, которое было отключено,
+    пока пользователь был онлайн на другом, эти сообщения из очереди не получит
+    и догружает их через историю (GET /history).
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"offline:user:{user_id}"
+
+    @staticmethod
+    def cursors_key(user_id: int) -> str:
+        return f"offline:user:{user_id}:cursors"
+
+    @staticmethod
+    def seen_key(user_id: int) -> str:
+        return f"offline:user:{user_id}:seen"
+
+    async def push_many(self, user_ids: list[int], message: str):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.xadd(
+                    self.key(user_id),
+                    {"m": message},
+                    maxlen=settings.OFFLINE_QUEUE_MAX_LEN,
+                    approximate=True,
+                )
+                pipe.expire(self.key(user_id), settings.OFFLINE_QUEUE_TTL)
+            await pipe.execute()
+        OFFLINE_QUEUE_PUSHES.inc(len(user_ids))
+
+    async def read(
+        self, user_id: int, after: str | None, count: int
+    ) -> list[tuple[str, str]]:
+        """Возвращает до count записей (stream_id, сообщение) строго после after."""
+        entries = await self.redis.xrange(
+            self.key(user_id), min=f"({after}" if after else "-", count=count
+        )
+        return [(_decode(stream_id), _decode(fields[b"m"])) for stream_id, fields in entries]
+
+    async def get_cursor(self, user_id: int, device_id: str = DEFAULT_DEVICE_ID) -> str:
+        """
+        Последняя запись, подтвержденная устройством. Новое устройство
+        регистрируется с нулевым курсором: пока оно не подтвердит выдачу,
+        очередь для него не очищается.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(self.cursors_key(user_id), device_id, "0-0")
+            pipe.zadd(self.seen_key(user_id), {device_id: time.time()})
+            pipe.expire(self.cursors_key(user_id), settings.OFFLINE_QUEUE_TTL)
+            pipe.expire(self.seen_key(user_id), settings.OFFLINE_QUEUE_TTL)
+            pipe.hget(self.cursors_key(user_id), device_id)
+            *_, cursor = await pipe.execute()
+        return _decode(cursor)
+
+    async def ack(self, user_id: int, stream_id: str, device_id: str = DEFAULT_DEVICE_ID):
+        """
+        Запоминает курсор устройства и удаляет из очереди записи до самого
+        раннего курсора среди активных устройств пользователя включительно.
+        Курсоры устройств, не появлявшихся дольше OFFLINE_DEVICE_TTL, удаляются.
+        """
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.cursors_key(user_id), device_id, stream_id)
+            pipe.zadd(self.seen_key(user_id), {device_id: now})
+            pipe.expire(self.cursors_key(user_id), settings.OFFLINE_QUEUE_TTL)
+            pipe.expire(self.seen_key(user_id), settings.OFFLINE_QUEUE_TTL)
+            pipe.hgetall(self.cursors_key(user_id))
+            pipe.zrangebyscore(self.seen_key(user_id), now - settings.OFFLINE_DEVICE_TTL, "+inf")
+            *_, cursors, active = await pipe.execute()
+        active = {_decode(device) for device in active}
+        cursors = {_decode(device): _decode(cursor) for device, cursor in cursors.items()}
+        # Курсор без отметки о последнем появлении тоже устарел
+        stale = [device for device in cursors if device not in active]
+        if stale:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hdel(self.cursors_key(user_id), *stale)
+                pipe.zrem(self.seen_key(user_id), *stale)
+                await pipe.execute()
+        ms, seq = min(
+            parse_stream_id(cursor) for device, cursor in cursors.items() if device in active
+        )
+        await self.redis.xtrim(self.key(user_id), minid=f"{ms}-{seq + 1}")
+
+    @staticmethod
+    def build_frame(entries: list[tuple[str, str]]) -> str:
+        # Сообщения уже сериализованы в JSON, поэтому кадр собирается без повторного парсинга
+        messages = ",".join(message for _, message in entries)
+        return f'{{"event":"offline_messages","cursor":"{entries[-1][0]}","messages":[{messages}]}}'
+
+
+def _decode(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+offline_queue = OfflineQueue(redis)
@@ -1,4 +1,5 @@
 from redis.asyncio import Redis
 from src.core.config import settings
+from src.core.metrics import InstrumentedRedis
 
-redis: Redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+redis: Redis = InstrumentedRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
@@ -0,0 +1,250 @@
+"""
+Подписанные токены доступа (JWT с HS256) и их проверка без обращения к БД.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+import orjson
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+from src.core.config import settings
+from src.core.exceptions import AuthenticationError
+from src.core.redis_config import redis
+
+REVOKED_TOKENS_KEY = "auth:revoked:tokens"
+REVOKED_USERS_KEY = "auth:revoked:users"
+REVOCATION_CHANNEL = "auth:revocations"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+# Заголовок фиксирован: принимаются только свои токены, подмена alg невозможна
+TOKEN_HEADER = _b64encode(orjson.dumps({"alg": "HS256", "typ": "JWT"}))
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Пользователь, от имени которого выполняется запрос, и его токен."""
+
+    user_id: int
+    token_id: str
+    issued_at: float
+    expires_at: float
+
+
+def _sign(signing_input: str, secret: str) -> str:
+    return _b64encode(hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest())
+
+
+def encode_token(principal: Principal, secret: str) -> str:
+    payload = _b64encode(
+        orjson.dumps(
+            {
+                "sub": str(principal.user_id),
+                "jti": principal.token_id,
+                "iat": principal.issued_at,
+                "exp": principal.expires_at,
+            }
+        )
+    )
+    signing_input = f"{TOKEN_HEADER}.{payload}"
+    return f"{signing_input}.{_sign(signing_input, secret)}"
+
+
+def decode_token(token: str, secret: str, now: float | None = None) -> Principal:
+    """Проверяет подпись и срок действия токена."""
+    header, _, rest = token.partition(".")
+    payload, _, signature = rest.partition(".")
+    if header != TOKEN_HEADER or not payload or not signature:
+        raise AuthenticationError("Некорректный токен")
+    if not hmac.compare_digest(signature, _sign(f"{header}.{payload}", secret)):
+        raise AuthenticationError("Неверная подпись токена")
+    try:
+        claims = orjson.loads(_b64decode(payload))
+        principal = Principal(
+            int(claims["sub"]), str(claims["jti"]), float(claims["iat"]), float(claims["exp"])
+        )
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise AuthenticationError("Некорректный токен")
+    if principal.expires_at <= (now or time.time()):
+        raise AuthenticationError("Срок действия токена истек")
+    return principal
+
+
+class TokenAuthenticator:
+    """
+    Аутентификация по подписанным токенам без запросов к БД.
+
+    Проверенные токены хранятся в локальном LRU с коротким TTL, так что
+    повторная проверка — это поиск в словаре. Отзывы пишутся в Redis-хэши
+    (отдельный токен или все токены пользователя, выданные до момента отзыва)
+    и рассылаются через канал; каждый процесс держит их копию в памяти и
+    сверяет с ней каждый токен, в том числе взятый из кэша. Получив отзыв,
+    процесс вызывает подписчиков on_revoke — так закрываются соединения,
+    открытые отозванным токеном.
+    """
+
+    def __init__(
+        self, redis: Redis, secret: str, token_ttl: int, cache_size: int, cache_ttl: float
+    ):
+        self.redis = redis
+        self.secret = secret
+        self.token_ttl = token_ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        # token_id -> срок действия отозванного токена
+        self._revoked_tokens: dict[str, float] = {}
+        # user_id -> токены, выданные не позже этого момента, отозваны
+        self._revoked_users: dict[int, float] = {}
+        self._pubsub: PubSub | None = None
+        self._listener: asyncio.Task | None = None
+        self._on_revoke: list[Callable[[], Awaitable[None]]] = []
+
+    def on_revoke(self, callback: Callable[[], Awaitable[None]]):
+        """Подписывает callback на отзывы, свои и пришедшие из других процессов."""
+        self._on_revoke.append(callback)
+
+    async def start(self):
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(REVOCATION_CHANNEL)
+        self._listener = asyncio.create_task(self._listen())
+        # Отзывы, сделанные до запуска процесса, читаются после подписки, чтобы не пропустить новые
+        tokens = await self.redis.hgetall(REVOKED_TOKENS_KEY)
+        users = await self.redis.hgetall(REVOKED_USERS_KEY)
+        for token_id, expires_at in tokens.items():
+            self._revoked_tokens[_decode(token_id)] = float(expires_at)
+        for user_id, revoked_at in users.items():
+            self._revoked_users[int(user_id)] = float(revoked_at)
+        expired = self._prune()
+        if expired:
+            await self.redis.hdel(REVOKED_TOKENS_KEY, *expired)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._cache.clear()
+        self._on_revoke.clear()
+
+    def issue(self, user_id: int) -> tuple[str, Principal]:
+        if not self.secret:
+            raise AuthenticationError("Аутентификация не настроена")
+        now = time.time()
+        principal = Principal(user_id, uuid4().hex, round(now, 3), round(now + self.token_ttl, 3))
+        return encode_token(principal, self.secret), principal
+
+    def authenticate(self, token: str) -> Principal:
+        now = time.time()
+        entry = self._cache.get(token)
+        if entry is not None and entry[0] > now:
+            self._cache.move_to_end(token)
+            principal = entry[1]
+        else:
+            if not self.secret:
+                raise AuthenticationError("Аутентификация не настроена")
+            principal = decode_token(token, self.secret, now)
+            self._remember(token, principal, now)
+        if self.is_revoked(principal):
+            raise AuthenticationError("Токен отозван")
+        return principal
+
+    def is_revoked(self, principal: Principal) -> bool:
+        if principal.token_id in self._revoked_tokens:
+            return True
+        revoked_at = self._revoked_users.get(principal.user_id)
+        return revoked_at is not None and principal.issued_at <= revoked_at
+
+    async def revoke_token(self, principal: Principal):
+        self._revoked_tokens[principal.token_id] = principal.expires_at
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(REVOKED_TOKENS_KEY, principal.token_id, principal.expires_at)
+            pipe.publish(
+                REVOCATION_CHANNEL,
+                orjson.dumps({"token_id": principal.token_id, "expires_at": principal.expires_at}),
+            )
+            await pipe.execute()
+        await self._notify()
+
+    async def revoke_user(self, user_id: int):
+        """Отзывает все уже выданные токены пользователя."""
+        revoked_at = round(time.time(), 3)
+        self._revoked_users[user_id] = revoked_at
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(REVOKED_USERS_KEY, str(user_id), revoked_at)
+            pipe.publish(
+                REVOCATION_CHANNEL, orjson.dumps({"user_id": user_id, "revoked_at": revoked_at})
+            )
+            await pipe.execute()
+        await self._notify()
+
+    def _remember(self, token: str, principal: Principal, now: float):
+        if not self.cache_size:
+            return
+        self._cache[token] = (min(now + self.cache_ttl, principal.expires_at), principal)
+        self._cache.move_to_end(token)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _prune(self) -> list[str]:
+        """Забывает отзывы уже истекших токенов; возвращает их id."""
+        now = time.time()
+        expired = [token_id for token_id, expires_at in self._revoked_tokens.items() if expires_at <= now]
+        for token_id in expired:
+            del self._revoked_tokens[token_id]
+        return expired
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            try:
+                revocation = orjson.loads(item["data"])
+                if "token_id" in revocation:
+                    self._revoked_tokens[revocation["token_id"]] = float(revocation["expires_at"])
+                    self._prune()
+                else:
+                    user_id = int(revocation["user_id"])
+                    revoked_at = float(revocation["revoked_at"])
+                    if revoked_at > self._revoked_users.get(user_id, 0):
+                        self._revoked_users[user_id] = revoked_at
+            except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                continue
+            await self._notify()
+
+    async def _notify(self):
+        for callback in self._on_revoke:
+            try:
+                await callback()
+            except Exception as e:
+                print(f"Revocation callback error: {e}", flush=True)
+
+
+def _decode(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+token_authenticator = TokenAuthenticator(
+    redis,
+    settings.AUTH_SECRET_KEY.get_secret_value(),
+    settings.AUTH_TOKEN_TTL,
+    settings.AUTH_CACHE_SIZE,
+    settings.AUTH_CACHE_TTL,
+)
@@ -0,0 +1,48 @@
+from math import ceil
+from typing import Hashable
+
+
+class TimerWheel:
+    """
+    Хэшированное колесо таймеров: кольцо корзин по одной на тик.
+
+    Постановка, отмена и срабатывание — O(1) на элемент, а все таймеры
+    обслуживает один цикл, вызывающий advance() раз в tick секунд, вместо
+    задачи на каждый таймер. Точность — один тик; задержка длиннее оборота
+    колеса сокращается до оборота, и владелец перепланирует элемент при
+    срабатывании.
+    """
+
+    def __init__(self, tick: float, horizon: float):
+        self.tick = tick
+        self.slots: list[set[Hashable]] = [set() for _ in range(ceil(horizon / tick) + 1)]
+        self.position = 0
+        self._slot_of: dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._slot_of
+
+    def schedule(self, item: Hashable, delay: float):
+        """Ставит (или переставляет) таймер элемента на delay секунд, но не меньше тика."""
+        self.cancel(item)
+        ticks = min(max(1, ceil(delay / self.tick)), len(self.slots) - 1)
+        index = (self.position + ticks) % len(self.slots)
+        self.slots[index].add(item)
+        self._slot_of[item] = index
+
+    def cancel(self, item: Hashable):
+        index = self._slot_of.pop(item, None)
+        if index is not None:
+            self.slots[index].discard(item)
+
+    def advance(self) -> set[Hashable]:
+        """Переходит к следующему тику и возвращает элементы, чьи таймеры сработали."""
+        self.position = (self.position + 1) % len(self.slots)
+        due = self.slots[self.position]
+        self.slots[self.position] = set()
+        for item in due:
+            del self._slot_of[item]
+        return due
@@ -1,26 +1,510 @@
-from typing import Dict
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable
+from uuid import uuid4
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+from src.core.config import settings
+from src.core.metrics import (
+    WS_CONNECTION_SECONDS,
+    WS_CONNECTIONS,
+    WS_CONNECTS,
+    WS_DISCONNECTS,
+    WS_HEARTBEAT_PINGS,
+    WS_SEND_SECONDS,
+    WS_SLOW_CONSUMERS,
+)
+from src.core.offline_queue import DEFAULT_DEVICE_ID, OfflineQueue, parse_stream_id
+from src.core.redis_config import redis
+from src.core.security import Principal
+from src.core.timer_wheel import TimerWheel
+from src.core.ws_protocol import BINARY_SUBPROTOCOL, encode_event, encode_frame
+
+
+# Пинг уровня приложения: ASGI не дает приложению управлять ping/pong-кадрами
+# протокола, поэтому клиент отвечает на него любым кадром, например {"action": "pong"}
+PING_FRAME = '{"event":"ping"}'
+
+
+def build_envelope(user_ids: list[int], message: str) -> str:
+    """
+    Конверт для канала узла: id получателей через запятую, перевод строки и
+    сообщение как есть. В отличие от JSON-конверта сообщение не экранируется
+    повторно; сериализованный JSON не содержит сырых переводов строки.
+    """
+    return f"{','.join(map(str, user_ids))}\n{message}"
+
+
+def parse_envelope(data: bytes | str) -> tuple[list[int], str]:
+    if isinstance(data, bytes):
+        data = data.decode()
+    user_ids, _, message = data.partition("\n")
+    return [int(user_id) for user_id in user_ids.split(",")], message
+
+
+class Connection:
+    """
+    Одно соединение (вкладка или устройство) пользователя.
+
+    Простаивающее соединение держит только сам объект: очередь исходящих,
+    задача-писатель и событие ack создаются по требованию и освобождаются,
+    когда становятся не нужны.
+    """
+
+    __slots__ = (
+        "user_id",
+        "device_id",
+        "websocket",
+        "binary",
+        "principal",
+        "queue",
+        "writer",
+        "replay",
+        "acked",
+        "ack_event",
+        "connected_at",
+        "last_seen",
+        "pinged_at",
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        device_id: str = DEFAULT_DEVICE_ID,
+        binary: bool = False,
+        principal: Principal | None = None,
+    ):
+        self.user_id = user_id
+        self.device_id = device_id
+        self.websocket = websocket
+        # Соединение согласовало бинарный подпротокол (см. ws_protocol)
+        self.binary = binary
+        # Токен рукопожатия: его отзыв закрывает соединение
+        self.principal = principal
+        self.queue: deque[str] | None = None
+        self.writer: asyncio.Task | None = None
+        self.replay: asyncio.Task | None = None
+        # Последний подтвержденный устройством id записи оффлайн-очереди
+        self.acked: str | None = None
+        self.ack_event: asyncio.Event | None = None
+        self.connected_at = self.last_seen = time.monotonic()
+        # Когда соединению отправлен пинг, оставшийся без ответа
+        self.pinged_at: float | None = None
 
 
 class WSManager:
-    def __init__(self):
-        self.connections: Dict[int, WebSocket] = {}
+    """
+    Реестр WebSocket-соединений воркера.
 
-    async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.connections[user_id] = websocket
+    Каждый воркер подписан на собственный канал `ws:node:{node_id}`, а в Redis
+    хранится реестр присутствия `ws:presence:{user_id}` -> множество node_id,
+    поэтому сообщение для пользователя, подключенного к другому воркеру или поду,
+    публикуется в канал нужного узла.
 
-    def disconnect(self, user_id: int):
-        if user_id in self.connections:
-            del self.connections[user_id]
+    У пользователя может быть несколько соединений (вкладки, устройства):
+    реестр хранит для каждого множество Connection, добавление и удаление —
+    O(1), рассылка идет во все соединения получателя.
+
+    Отправка в сокет выполняется отдельной задачей-писателем на каждое соединение,
+    так что медленный клиент не задерживает рассылку остальным. Писатель
+    запускается при появлении сообщений и завершается, когда очередь пуста.
+    В очереди лежат JSON-строки; для соединений с бинарным подпротоколом
+    писатель перекодирует их и отправляет пачкой в одном кадре.
+
+    При подключении накопленная оффлайн-очередь выдается пакетами начиная с
+    курсора устройства; следующий пакет отправляется после ack предыдущего,
+    неподтвержденный — повторяется.
+
+    Полуоткрытые соединения (мобильная сеть пропала без FIN) выявляет
+    heartbeat: одно колесо таймеров на узел. Входящий кадр только обновляет
+    last_seen, а при срабатывании таймера соединение либо перепланируется,
+    либо получает пинг, либо, не ответив за WS_HEARTBEAT_TIMEOUT, отключается
+    и снимается из реестра присутствия. Тот же цикл продлевает присутствие.
+    """
+
+    def __init__(self, redis: Redis, node_id: str | None = None):
+        self.redis = redis
+        self.offline_queue = OfflineQueue(redis)
+        self.node_id = node_id or uuid4().hex
+        self.connections: Dict[int, set[Connection]] = {}
+        self.connection_count = 0
+        self.heartbeats = TimerWheel(
+            settings.WS_HEARTBEAT_TICK,
+            max(settings.WS_HEARTBEAT_INTERVAL, settings.WS_HEARTBEAT_TIMEOUT),
+        )
+        self._pubsub: PubSub | None = None
+        self._listener: asyncio.Task | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        # Закрытия отключенных соединений идут в фоне, чтобы не задерживать цикл heartbeat
+        self._closing: set[asyncio.Task] = set()
+
+    @property
+    def node_channel(self) -> str:
+        return self.channel_for(self.node_id)
+
+    @staticmethod
+    def channel_for(node_id: str) -> str:
+        return f"ws:node:{node_id}"
+
+    @staticmethod
+    def presence_key(user_id: int) -> str:
+        return f"ws:presence:{user_id}"
+
+    async def start(self):
+        WS_CONNECTIONS.labels(self.node_id).set_function(lambda: self.connection_count)
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.node_channel)
+        self._listener = asyncio.create_task(self._listen())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        for task in (self._listener, self._heartbeat_task, *self._closing):
+            if task is not None:
+                task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        for connections in self.connections.values():
+            for connection in connections:
+                self.heartbeats.cancel(connection)
+                for task in (connection.writer, connection.replay):
+                    if task is not None:
+                        task.cancel()
+        if self.connections:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in self.connections:
+                    pipe.srem(self.presence_key(user_id), self.node_id)
+                await pipe.execute()
+        self.connections.clear()
+        self.connection_count = 0
+        try:
+            WS_CONNECTIONS.remove(self.node_id)
+        except KeyError:
+            pass
+
+    async def connect(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        device_id: str = DEFAULT_DEVICE_ID,
+        binary: bool = False,
+        principal: Principal | None = None,
+    ) -> Connection:
+        await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+        connection = Connection(user_id, websocket, device_id, binary, principal)
+        self.connections.setdefault(user_id, set()).add(connection)
+        self.connection_count += 1
+        WS_CONNECTS.inc()
+        if settings.WS_HEARTBEAT_INTERVAL:
+            self.heartbeats.schedule(connection, settings.WS_HEARTBEAT_INTERVAL)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.sadd(self.presence_key(user_id), self.node_id)
+            pipe.expire(self.presence_key(user_id), settings.WS_PRESENCE_TTL)
+            await pipe.execute()
+        # Очередь читается после регистрации присутствия, чтобы не пропустить
+        # сообщения, поставленные в нее во время подключения
+        connection.acked = await self.offline_queue.get_cursor(user_id, device_id)
+        connection.replay = asyncio.create_task(self._replay(connection))
+        return connection
 
-    async def send_to_user(self, user_id: int, message: str):
+    async def disconnect(self, connection: Connection, reason: str = "closed"):
+        connections = self.connections.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return
+        connections.remove(connection)
+        self.connection_count -= 1
+        self.heartbeats.cancel(connection)
+        WS_DISCONNECTS.labels(reason).inc()
+        WS_CONNECTION_SECONDS.observe(time.monotonic() - connection.connected_at)
+        for task in (connection.writer, connection.replay):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        if not connections:
+            # Узел остается в реестре присутствия, пока открыто хотя бы одно соединение
+            del self.connections[connection.user_id]
+            await self.redis.srem(self.presence_key(connection.user_id), self.node_id)
+
+    async def close_revoked(self, is_revoked: Callable[[Principal], bool]):
+        """Закрывает соединения, открытые отозванными токенами."""
+        revoked = [
+            connection
+            for connections in self.connections.values()
+            for connection in connections
+            if connection.principal is not None and is_revoked(connection.principal)
+        ]
+        for connection in revoked:
+            await self.disconnect(connection, "revoked")
+            self._close_in_background(connection, status.WS_1008_POLICY_VIOLATION)
+
+    @staticmethod
+    def touch(connection: Connection):
+        """Входящий кадр подтверждает, что соединение живо."""
+        connection.last_seen = time.monotonic()
+
+    async def ack(self, connection: Connection, cursor: str):
+        """Подтверждение устройством получения оффлайн-сообщений до cursor включительно."""
+        position = parse_stream_id(cursor)
+        if connection.acked is None or position > parse_stream_id(connection.acked):
+            connection.acked = cursor
+        if connection.ack_event is not None:
+            connection.ack_event.set()
+        await self.offline_queue.ack(connection.user_id, cursor, connection.device_id)
+
+    async def send_to_user(self, user_id: int, message: str) -> bool:
+        """
+        Доставляет сообщение пользователю на любом узле.
+        Возвращает False, если пользователь нигде не подключен.
+        """
+        return not await self.broadcast([user_id], message)
+
+    async def broadcast(self, user_ids: Iterable[int], message: str) -> list[int]:
+        """
+        Рассылает сообщение нескольким пользователям без ожидания отправки в сокеты.
+        Возвращает id пользователей, которым доставить сообщение не удалось.
+
+        Сообщение ставится в локальные соединения получателя и публикуется на
+        все остальные узлы из его реестра присутствия: устройства одного
+        пользователя могут быть подключены к разным воркерам. Недоставленным
+        получатель считается, только если его не принял ни один узел.
+        """
+        user_ids = list(user_ids)
+        delivered = {
+            user_id
+            for user_id in user_ids
+            if user_id in self.connections and await self._enqueue_user(user_id, message)
+        }
+        undelivered = await self._publish(user_ids, message)
+        return [user_id for user_id in undelivered if user_id not in delivered]
+
+    async def is_online(self, user_id: int) -> bool:
         if user_id in self.connections:
-            await self.connections[user_id].send_text(message)
+            return True
+        return bool(await self.redis.scard(self.presence_key(user_id)))
+
+    async def _enqueue_user(self, user_id: int, message: str) -> bool:
+        """Ставит сообщение во все соединения пользователя; True, если хотя бы в одно."""
+        delivered = False
+        # Копия: медленное соединение удаляется из множества во время обхода
+        for connection in tuple(self.connections.get(user_id, ())):
+            if await self._enqueue(connection, message):
+                delivered = True
+        return delivered
+
+    async def _enqueue(self, connection: Connection, message: str) -> bool:
+        if connection.queue is not None and len(connection.queue) >= settings.WS_SEND_QUEUE_SIZE:
+            WS_SLOW_CONSUMERS.labels(settings.WS_SLOW_CONSUMER_POLICY).inc()
+            if settings.WS_SLOW_CONSUMER_POLICY == "drop":
+                return True
+            # Клиент не успевает читать: отключаем его, сообщение уйдет в оффлайн-очередь
+            await self.disconnect(connection, "slow_consumer")
+            # Сокет с полными буферами может закрываться долго: рассылка и heartbeat его не ждут
+            self._close_in_background(connection, status.WS_1013_TRY_AGAIN_LATER)
+            return False
+        self._push(connection, message)
+        return True
+
+    def _push(self, connection: Connection, message: str):
+        if connection.queue is None:
+            connection.queue = deque()
+        connection.queue.append(message)
+        if connection.writer is None:
+            connection.writer = asyncio.create_task(self._write_loop(connection))
+
+    async def _publish(self, user_ids: list[int], message: str) -> list[int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.smembers(self.presence_key(user_id))
+            presence = await pipe.execute()
+
+        # Группируем получателей по узлам, чтобы публиковать один раз на узел
+        by_node: Dict[str, list[int]] = {}
+        undelivered: list[int] = []
+        for user_id, nodes in zip(user_ids, presence):
+            node_ids = [n.decode() if isinstance(n, bytes) else n for n in nodes]
+            node_ids = [n for n in node_ids if n != self.node_id]
+            if not node_ids:
+                undelivered.append(user_id)
+            for node_id in node_ids:
+                by_node.setdefault(node_id, []).append(user_id)
+        if not by_node:
+            return undelivered
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for node_id, node_users in by_node.items():
+                pipe.publish(self.channel_for(node_id), build_envelope(node_users, message))
+            receivers = await pipe.execute()
+
+        delivered: set[int] = set()
+        stale: list[tuple[int, str]] = []
+        for (node_id, node_users), count in zip(by_node.items(), receivers):
+            if count:
+                delivered.update(node_users)
+            else:
+                # Узел никого не слушает — запись о присутствии устарела
+                stale.extend((user_id, node_id) for user_id in node_users)
+        if stale:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id, node_id in stale:
+                    pipe.srem(self.presence_key(user_id), node_id)
+                await pipe.execute()
+        stale_users = {user_id for user_id, _ in stale}
+        undelivered.extend(
+            user_id
+            for user_id in user_ids
+            if user_id in stale_users and user_id not in delivered
+        )
+        return undelivered
+
+    async def _write_loop(self, connection: Connection):
+        queue = connection.queue
+        try:
+            while queue:
+                started = time.perf_counter()
+                try:
+                    if connection.binary:
+                        # Накопившиеся за время предыдущей отправки события уходят одним кадром
+                        count = min(len(queue), settings.WS_BINARY_BATCH_SIZE)
+                        events = [encode_event(queue.popleft()) for _ in range(count)]
+                        await connection.websocket.send_bytes(
+                            encode_frame(
+                                events,
+                                settings.WS_BINARY_COMPRESS_THRESHOLD,
+                                settings.WS_BINARY_COMPRESS_LEVEL,
+                            )
+                        )
+                    else:
+                        await connection.websocket.send_text(queue.popleft())
+                    WS_SEND_SECONDS.observe(time.perf_counter() - started)
+                except Exception:
+                    await self.disconnect(connection, "send_error")
+                    return
+        finally:
+            # Между проверкой пустой очереди и этой точкой нет await: новое
+            # сообщение либо уже отправлено, либо запустит нового писателя
+            connection.writer = None
+            if not queue:
+                connection.queue = None
+
+    @staticmethod
+    async def _close(connection: Connection, code: int):
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _replay(self, connection: Connection):
+        try:
+            await self._replay_batches(connection)
+        finally:
+            connection.replay = None
+            connection.ack_event = None
+
+    async def _replay_batches(self, connection: Connection):
+        attempts = 0
+        while True:
+            entries = await self.offline_queue.read(
+                connection.user_id, connection.acked, settings.OFFLINE_REPLAY_BATCH
+            )
+            if not entries:
+                return
+            last_id = parse_stream_id(entries[-1][0])
+            if connection.ack_event is None:
+                connection.ack_event = asyncio.Event()
+            # Следующий пакет ждет ack предыдущего, так что лимит очереди к ним не применяется
+            self._push(connection, self.offline_queue.build_frame(entries))
+            try:
+                await asyncio.wait_for(
+                    self._wait_ack(connection, last_id), settings.OFFLINE_ACK_TIMEOUT
+                )
+                attempts = 0
+            except TimeoutError:
+                # Пакет не подтвержден: повторяем с последнего ack, но не бесконечно
+                attempts += 1
+                if attempts >= settings.OFFLINE_REPLAY_ATTEMPTS:
+                    return
+
+    @staticmethod
+    async def _wait_ack(connection: Connection, stream_id: tuple[int, int]):
+        while connection.acked is None or parse_stream_id(connection.acked) < stream_id:
+            connection.ack_event.clear()
+            await connection.ack_event.wait()
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            try:
+                user_ids, message = parse_envelope(item["data"])
+                undelivered = [
+                    user_id
+                    for user_id in user_ids
+                    if not await self._enqueue_user(user_id, message)
+                ]
+                if undelivered:
+                    # Пользователь успел отключиться от этого узла
+                    await self.offline_queue.push_many(undelivered, message)
+            except Exception as e:
+                print(f"WS node listener error: {e}", flush=True)
+
+    async def _heartbeat(self):
+        """Единственный таймер узла: колесо heartbeat и продление присутствия."""
+        tick = self.heartbeats.tick
+        presence_ticks = max(1, round(settings.WS_PRESENCE_TTL / 3 / tick))
+        ticks = 0
+        while True:
+            await asyncio.sleep(tick)
+            ticks += 1
+            now = time.monotonic()
+            for connection in self.heartbeats.advance():
+                try:
+                    await self._check_heartbeat(connection, now)
+                except Exception as e:
+                    print(f"WS heartbeat error: {e}", flush=True)
+                    # Колесо уже сняло таймер: без него соединение больше не проверяется
+                    if connection in self.connections.get(connection.user_id, ()):
+                        self.heartbeats.schedule(connection, settings.WS_HEARTBEAT_TIMEOUT)
+                    else:
+                        self._close_in_background(connection, status.WS_1001_GOING_AWAY)
+            if ticks % presence_ticks == 0:
+                try:
+                    await self._refresh_presence()
+                except Exception as e:
+                    print(f"WS presence refresh error: {e}", flush=True)
+
+    async def _check_heartbeat(self, connection: Connection, now: float):
+        interval = settings.WS_HEARTBEAT_INTERVAL
+        timeout = settings.WS_HEARTBEAT_TIMEOUT
+        idle = now - connection.last_seen
+        if idle < interval:
+            # Клиент активен: таймер переставляется только здесь, а не на каждый кадр
+            self.heartbeats.schedule(connection, interval - idle)
+        elif connection.pinged_at is None or connection.pinged_at < connection.last_seen:
+            connection.pinged_at = now
+            WS_HEARTBEAT_PINGS.inc()
+            if await self._enqueue(connection, PING_FRAME):
+                self.heartbeats.schedule(connection, timeout)
+        elif now - connection.pinged_at < timeout:
+            self.heartbeats.schedule(connection, timeout - (now - connection.pinged_at))
+        else:
+            await self.disconnect(connection, "heartbeat")
+            # Полуоткрытый сокет может не принять и кадр закрытия: закрываем в фоне
+            self._close_in_background(connection, status.WS_1001_GOING_AWAY)
+
+    def _close_in_background(self, connection: Connection, code: int):
+        task = asyncio.create_task(self._close(connection, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
-    def is_online(self, user_id: int) -> bool:
-        return user_id in self.connections
+    async def _refresh_presence(self):
+        if not self.connections:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in self.connections:
+                pipe.sadd(self.presence_key(user_id), self.node_id)
+                pipe.expire(self.presence_key(user_id), settings.WS_PRESENCE_TTL)
+            await pipe.execute()
 
 
-ws_manager = WSManager()
+ws_manager = WSManager(redis)
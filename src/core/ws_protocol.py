@@ -0,0 +1,136 @@
+"""
+Бинарный подпротокол WebSocket `msgpack.v1`, работающий рядом с JSON.
+
+Клиент запрашивает его в Sec-WebSocket-Protocol; без него соединение
+остается на JSON-кадрах. Бинарный кадр — байт флагов и тело msgpack:
+сервер шлет массив событий (несколько событий в одном кадре), клиент —
+одно действие или массив действий. Ключи полей сокращены, время сообщения
+передается целым числом микросекунд UTC. Тело не короче порога сжимается
+zlib и помечается флагом FLAG_DEFLATE.
+"""
+
+import zlib
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import msgpack
+import orjson
+
+BINARY_SUBPROTOCOL = "msgpack.v1"
+FLAG_DEFLATE = 0x01
+
+# Длинное имя поля -> короткий ключ бинарного протокола
+MESSAGE_KEYS = {
+    "id": "i",
+    "chat_id": "c",
+    "sender_id": "s",
+    "text": "t",
+    "is_read": "r",
+    "timestamp": "ts",
+}
+# Короткий ключ входящего действия -> имя поля JSON-протокола
+ACTION_KEYS = {"a": "action", "c": "chat_id", "cur": "cursor", "mid": "message_id", "msg": "msg"}
+MESSAGE_CREATE_KEYS = {"x": "external_id", "c": "chat_id", "t": "text"}
+
+EVENT_MESSAGE = "m"
+EVENT_OFFLINE_MESSAGES = "o"
+
+
+def _timestamp_us(value: str) -> int:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        # Время сообщений хранится в UTC без зоны
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 1_000_000 + moment.microsecond
+
+
+def compact_message(message: dict) -> dict:
+    compact = {MESSAGE_KEYS.get(key, key): value for key, value in message.items()}
+    if isinstance(compact.get("ts"), str):
+        compact["ts"] = _timestamp_us(compact["ts"])
+    return compact
+
+
+def compact_event(event: dict) -> dict:
+    """Событие JSON-протокола в форме бинарного: сообщение без поля event — это новое сообщение."""
+    name = event.get("event")
+    if name is None:
+        return {"e": EVENT_MESSAGE, **compact_message(event)}
+    if name == "offline_messages":
+        return {
+            "e": EVENT_OFFLINE_MESSAGES,
+            "cur": event["cursor"],
+            "ms": [compact_message(message) for message in event["messages"]],
+        }
+    return {"e": name, **{key: value for key, value in event.items() if key != "event"}}
+
+
+def encode_event(message: str) -> bytes:
+    """msgpack-тело одного события, полученного сервером как JSON-строка."""
+    if message.startswith('{"event"'):
+        # Пакеты оффлайн-очереди и уведомления адресные: кэшировать их незачем
+        return msgpack.packb(compact_event(orjson.loads(message)))
+    return _encode_message(message)
+
+
+@lru_cache(maxsize=1024)
+def _encode_message(message: str) -> bytes:
+    # Одна и та же строка рассылается всем получателям: кодируем ее один раз
+    # на процесс, а хэш строки вычисляется однажды и хранится в ней самой
+    return msgpack.packb(compact_event(orjson.loads(message)))
+
+
+def _array_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length < 1 << 16:
+        return b"\xdc" + length.to_bytes(2, "big")
+    return b"\xdd" + length.to_bytes(4, "big")
+
+
+def encode_frame(events: list[bytes], compress_threshold: int, compress_level: int) -> bytes:
+    """
+    Кадр из уже закодированных событий: заголовок массива msgpack и тела
+    событий склеиваются без повторной упаковки.
+    """
+    body = _array_header(len(events)) + b"".join(events)
+    if compress_threshold and len(body) >= compress_threshold:
+        return bytes((FLAG_DEFLATE,)) + zlib.compress(body, compress_level)
+    return b"\x00" + body
+
+
+def decode_frame(frame: bytes, max_size: int, max_actions: int) -> list[dict]:
+    """Входящий кадр в виде списка действий JSON-протокола; ValueError при ошибке формата."""
+    if not frame:
+        raise ValueError("Пустой кадр")
+    body = frame[1:]
+    if frame[0] & FLAG_DEFLATE:
+        decompressor = zlib.decompressobj()
+        try:
+            body = decompressor.decompress(body, max_size)
+        except zlib.error as e:
+            raise ValueError(f"Некорректное сжатие кадра: {e}")
+        if decompressor.unconsumed_tail:
+            raise ValueError("Кадр больше допустимого размера")
+    elif len(body) > max_size:
+        raise ValueError("Кадр больше допустимого размера")
+    try:
+        actions = msgpack.unpackb(body)
+    except ValueError as e:
+        # Ошибки формата msgpack (ExtraData, FormatError, StackError) — подклассы ValueError
+        raise ValueError(f"Некорректный кадр msgpack: {e}")
+    if isinstance(actions, dict):
+        actions = [actions]
+    if not isinstance(actions, list) or not all(isinstance(action, dict) for action in actions):
+        raise ValueError("Кадр должен содержать действие или массив действий")
+    if len(actions) > max_actions:
+        raise ValueError("Слишком много действий в кадре")
+    return [expand_action(action) for action in actions]
+
+
+def expand_action(action: dict) -> dict:
+    expanded = {ACTION_KEYS.get(key, key): value for key, value in action.items()}
+    message = expanded.get("msg")
+    if isinstance(message, dict):
+        expanded["msg"] = {MESSAGE_CREATE_KEYS.get(key, key): value for key, value in message.items()}
+    return expanded
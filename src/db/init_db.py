@@ -1,24 +1,75 @@
+import asyncio
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
 from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
 
-from src.models.base import Base
 from src.db.session import engine
 
+ROOT_DIR = Path(__file__).resolve().parents[2]
+# Ревизия, соответствующая схеме, которую раньше создавал create_all
+BASELINE_REVISION = "0001"
+# Таблицы и колонки этой схемы: помечать ревизией можно только совпадающую с ней базу
+BASELINE_SCHEMA = {
+    "users": {"id", "name", "email", "hashed_password"},
+    "chats": {"id", "name", "type"},
+    "groups": {"id", "name", "creator_id"},
+    "chat_members": {"chat_id", "user_id"},
+    "messages": {"id", "external_id", "chat_id", "sender_id", "text", "timestamp", "is_read"},
+}
+
+
+def alembic_config(url: str | None = None) -> Config:
+    config = Config(str(ROOT_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT_DIR / "src" / "migrations"))
+    config.attributes["configure_logger"] = False
+    if url is not None:
+        config.attributes["url"] = url
+    return config
+
+
+def baseline_differences(conn: Connection) -> list[str]:
+    """Расхождения схемы базы с базовой ревизией; пустой список — схема совпадает."""
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names()) - {"alembic_version"}
+    differences = [f"unexpected table {name}" for name in sorted(tables - BASELINE_SCHEMA.keys())]
+    for table, expected in BASELINE_SCHEMA.items():
+        if table not in tables:
+            differences.append(f"missing table {table}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        differences.extend(f"missing column {table}.{name}" for name in sorted(expected - columns))
+        differences.extend(f"unexpected column {table}.{name}" for name in sorted(columns - expected))
+    return differences
+
 
 async def init_db():
     """
-    Создает таблицы в базе данных, если они еще не существуют.
+    Приводит схему базы данных к последней ревизии миграций.
+    База, созданная create_all до появления миграций, помечается базовой ревизией,
+    только если ее схема совпадает с базовой; иначе запуск прерывается.
     """
     async with engine.connect() as conn:
         schema = 'public'
         await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
-        # Проверяем существование таблиц
         existing_tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+        differences = []
+        if existing_tables and "alembic_version" not in existing_tables:
+            differences = await conn.run_sync(baseline_differences)
+        await conn.commit()
 
-        if not existing_tables:
-            print("Creating database tables...")
-            await conn.run_sync(Base.metadata.create_all)
-            await conn.commit()
-            print("Database tables created successfully!")
-        else:
-            print("Tables already exist. Skipping creation.")
-        print("Startup completed. Database tables are ready!")
+    config = alembic_config()
+    # env.py сам запускает цикл событий, поэтому команды alembic выполняются в отдельном потоке
+    if existing_tables and "alembic_version" not in existing_tables:
+        if differences:
+            raise RuntimeError(
+                f"Schema without alembic_version does not match revision {BASELINE_REVISION}: "
+                + "; ".join(differences)
+            )
+        print("Stamping existing schema with the baseline revision...")
+        await asyncio.to_thread(command.stamp, config, BASELINE_REVISION)
+    print("Applying database migrations...")
+    await asyncio.to_thread(command.upgrade, config, "head")
+    print("Startup completed. Database tables are ready!")
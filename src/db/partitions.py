@@ -0,0 +1,169 @@
+"""
+Обслуживание помесячных секций таблицы messages.
+
+messages секционирована по RANGE (timestamp): на каждый месяц своя секция
+`messages_pYYYYMM`, а строки вне созданных секций попадают в messages_default.
+PartitionManager заранее создает секции на months_ahead месяцев вперед и,
+если задан срок хранения, отсоединяет и удаляет старые секции целиком вместо
+построчного DELETE. При hash_modulus > 0 месячная секция дополнительно делится
+по HASH (chat_id), чтобы горячий месяц не упирался в одну кучу и один индекс.
+"""
+
+import asyncio
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.core.config import settings
+from src.db.session import engine as default_engine
+
+PARENT_TABLE = "messages"
+PARTITION_PREFIX = f"{PARENT_TABLE}_p"
+# Ключ рекомендательной блокировки: секции обслуживает один процесс за раз
+ADVISORY_LOCK_KEY = 0x6D736770
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def partition_month(name: str) -> date | None:
+    """Месяц секции по ее имени; для посторонних таблиц — None."""
+    suffix = name.removeprefix(PARTITION_PREFIX)
+    if suffix == name or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def partition_ddl(month: date, hash_modulus: int = 0, parent: str = PARENT_TABLE) -> list[str]:
+    """
+    DDL секции месяца month и, при hash_modulus > 0, ее хеш-подсекций.
+    parent отличается от messages только в миграции, которая строит
+    секционированную таблицу рядом со старой.
+    """
+    name = partition_name(month)
+    bounds = f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    if not hash_modulus:
+        return [f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} {bounds}"]
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} {bounds} "
+        "PARTITION BY HASH (chat_id)"
+    ]
+    statements.extend(
+        f"CREATE TABLE IF NOT EXISTS {name}_h{remainder} PARTITION OF {name} "
+        f"FOR VALUES WITH (MODULUS {hash_modulus}, REMAINDER {remainder})"
+        for remainder in range(hash_modulus)
+    )
+    return statements
+
+
+async def ensure_partitions(conn: AsyncConnection, months: list[date], hash_modulus: int = 0) -> list[date]:
+    """
+    Создает недостающие секции месяцев months. Возвращает созданные месяцы.
+    Секция, чей диапазон уже занят строками в messages_default, пропускается
+    с предупреждением: такие строки нужно сначала перенести вручную.
+    """
+    existing = await list_partitions(conn)
+    created = []
+    for month in months:
+        if month in existing:
+            continue
+        try:
+            async with conn.begin_nested():
+                for statement in partition_ddl(month, hash_modulus):
+                    await conn.execute(text(statement))
+        except Exception as e:
+            print(f"Partition {partition_name(month)} was not created: {e}", flush=True)
+            continue
+        created.append(month)
+    return created
+
+
+async def list_partitions(conn: AsyncConnection) -> set[date]:
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    return {month for (name,) in result if (month := partition_month(name)) is not None}
+
+
+class PartitionManager:
+    """Фоновое создание будущих и удаление устаревших секций messages."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        months_ahead: int,
+        retention_months: int,
+        hash_modulus: int,
+        interval: float,
+    ):
+        self.engine = engine
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.hash_modulus = hash_modulus
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        await self.maintain()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.maintain()
+            except Exception as e:
+                print(f"Partition maintenance error: {e}", flush=True)
+
+    async def maintain(self, today: date | None = None):
+        current = month_start(today or datetime.now(timezone.utc))
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            months = [add_months(current, offset) for offset in range(self.months_ahead + 1)]
+            await ensure_partitions(conn, months, self.hash_modulus)
+            if self.retention_months:
+                await self._drop_expired(conn, add_months(current, -self.retention_months))
+
+    async def _drop_expired(self, conn: AsyncConnection, cutoff: date):
+        """Удаляет секции целиком старше cutoff и их записи дедупликации."""
+        for month in sorted(await list_partitions(conn)):
+            if month >= cutoff:
+                break
+            name = partition_name(month)
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+            print(f"Partition {name} dropped", flush=True)
+        await conn.execute(
+            text("DELETE FROM message_dedup WHERE timestamp < :cutoff"),
+            {"cutoff": datetime.combine(cutoff, datetime.min.time())},
+        )
+
+
+partition_manager = PartitionManager(
+    default_engine,
+    settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+    settings.MESSAGE_PARTITION_RETENTION_MONTHS,
+    settings.MESSAGE_PARTITION_HASH_MODULUS,
+    settings.MESSAGE_PARTITION_CHECK_INTERVAL,
+)
@@ -0,0 +1,280 @@
+"""
+Генератор синтетических данных для нагрузочных проверок истории и состава чатов.
+
+Пользователи, чаты, участники и сообщения генерируются потоком и пишутся
+в Postgres через COPY (asyncpg copy_records_to_table) пачками. Размеры групп
+распределены по степенному закону, а сообщения идут всплесками.
+
+    python -m src.db.seed --users 1000000 --groups 100000 --personal-chats 500000 --messages 10000000
+
+Запускать на базе без параллельной записи: id выдаются генератором, а
+последовательности сдвигаются в конце одной транзакции.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, islice
+from typing import Iterable, Iterator
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from src.core.config import settings
+from src.db.init_db import init_db
+from src.db.partitions import add_months, month_start, partition_ddl
+from src.models.base import ChatType
+
+WORDS = (
+    "привет", "как", "дела", "сегодня", "завтра", "встреча", "проект", "код", "релиз", "баг",
+    "тест", "ок", "да", "нет", "спасибо", "посмотри", "созвон", "обед", "кофе", "задача",
+    "hello", "deploy", "review", "merge", "ticket", "build", "done", "ping", "later", "thanks",
+)
+
+
+def power_law_sizes(
+    rng: random.Random, count: int, alpha: float, min_size: int, max_size: int
+) -> list[int]:
+    """Размеры групп по распределению Парето: много маленьких групп и редкие огромные."""
+    return [
+        min(int(min_size / (1 - rng.random()) ** (1 / alpha)), max_size)
+        for _ in range(count)
+    ]
+
+
+def bursts(
+    rng: random.Random, count: int, span: float, mean_burst: float, burst_gap: float
+) -> Iterator[list[float]]:
+    """
+    Смещения времени сообщений в секундах от начала периода, сгруппированные
+    во всплески: внутри всплеска паузы около burst_gap, между всплесками —
+    экспоненциальные паузы, растягивающие count сообщений на span секунд.
+    """
+    expected_bursts = max(count / mean_burst, 1)
+    mean_pause = max(span - count * burst_gap, 0) / expected_bursts
+    offset = 0.0
+    emitted = 0
+    while emitted < count:
+        size = 1 + int(rng.expovariate(1 / max(mean_burst - 1, 1e-9)))
+        size = min(size, count - emitted)
+        burst = []
+        for _ in range(size):
+            burst.append(min(offset, span))
+            offset += rng.expovariate(1 / burst_gap)
+        emitted += size
+        yield burst
+        if mean_pause:
+            offset += rng.expovariate(1 / mean_pause)
+
+
+def random_text(rng: random.Random) -> str:
+    # Длина сообщений логнормальная: в основном короткие, изредка длинные
+    words = max(1, min(int(rng.lognormvariate(1.5, 0.8)), 200))
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def chunked(records: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    iterator = iter(records)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Seeder:
+    def __init__(self, conn: asyncpg.Connection, args: argparse.Namespace):
+        self.conn = conn
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.end = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.start = self.end - timedelta(days=args.days)
+        # Участники всех чатов подряд; участники i-го чата — members[offsets[i]:offsets[i + 1]]
+        self.offsets = array("q", [0])
+        self.members = array("q")
+
+    async def run(self):
+        user_start = await self._next_id("users")
+        chat_start = await self._next_id("chats")
+        message_start = await self._next_id("messages")
+
+        await self._copy("users", ["id", "name", "email", "hashed_password"], self._users(user_start))
+        sizes = [2] * self.args.personal_chats + power_law_sizes(
+            self.rng, self.args.groups, self.args.group_alpha, self.args.group_min, self.args.group_max
+        )
+        self._assign_members(user_start, sizes)
+        await self._copy(
+            "chats", ["id", "name", "type", "last_activity_at"], self._chats(chat_start, sizes)
+        )
+        await self._copy("groups", ["id", "name", "creator_id"], self._groups(chat_start))
+        await self._copy("chat_members", ["chat_id", "user_id"], self._memberships(chat_start))
+
+        await self._ensure_partitions()
+        last_id = array("q", [0]) * len(sizes)
+        last_offset = array("d", [0.0]) * len(sizes)
+        await self._copy(
+            "messages",
+            ["id", "external_id", "chat_id", "sender_id", "text", "timestamp"],
+            self._messages(message_start, chat_start, sizes, last_id, last_offset),
+        )
+        await self.conn.execute(
+            "INSERT INTO message_dedup (external_id, chat_id, timestamp, message_id) "
+            "SELECT external_id, chat_id, timestamp, id FROM messages WHERE id >= $1",
+            message_start,
+        )
+        await self._update_chat_activity(chat_start, last_id, last_offset)
+        await self._mark_read(chat_start)
+        for table in ("users", "chats", "messages"):
+            await self.conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+            )
+
+    async def _next_id(self, table: str) -> int:
+        return await self.conn.fetchval(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+
+    async def _ensure_partitions(self):
+        """Месячные секции на весь период, чтобы COPY не сваливал сообщения в messages_default."""
+        month = month_start(self.start)
+        while month <= self.end.date():
+            for statement in partition_ddl(month, settings.MESSAGE_PARTITION_HASH_MODULUS):
+                await self.conn.execute(statement)
+            month = add_months(month, 1)
+
+    async def _copy(self, table: str, columns: list[str], records: Iterable[tuple]):
+        started = time.monotonic()
+        total = 0
+        for chunk in chunked(records, self.args.chunk_size):
+            await self.conn.copy_records_to_table(table, records=chunk, columns=columns)
+            total += len(chunk)
+            print(f"{table}: {total}", end="\r", flush=True)
+        print(f"{table}: {total} rows in {time.monotonic() - started:.1f}s", flush=True)
+
+    def _users(self, user_start: int) -> Iterator[tuple]:
+        for user_id in range(user_start, user_start + self.args.users):
+            yield user_id, f"User{user_id}", f"user{user_id}@seed.example.com", "password"
+
+    def _assign_members(self, user_start: int, sizes: list[int]):
+        for size in sizes:
+            size = min(size, self.args.users)
+            self.members.extend(
+                user_start + index for index in self.rng.sample(range(self.args.users), size)
+            )
+            self.offsets.append(len(self.members))
+
+    def _chats(self, chat_start: int, sizes: list[int]) -> Iterator[tuple]:
+        for index in range(len(sizes)):
+            if index < self.args.personal_chats:
+                # Как и create_personal_chat, личный чат называется именем собеседника
+                friend_id = self.members[self.offsets[index] + 1]
+                yield chat_start + index, f"User{friend_id}", ChatType.PERSONAL.name, self.start
+            else:
+                yield chat_start + index, f"Group {chat_start + index}", ChatType.GROUP.name, self.start
+
+    def _groups(self, chat_start: int) -> Iterator[tuple]:
+        for index in range(self.args.personal_chats, len(self.offsets) - 1):
+            yield chat_start + index, f"Group {chat_start + index}", self.members[self.offsets[index]]
+
+    def _memberships(self, chat_start: int) -> Iterator[tuple]:
+        for index in range(len(self.offsets) - 1):
+            chat_id = chat_start + index
+            for position in range(self.offsets[index], self.offsets[index + 1]):
+                yield chat_id, self.members[position]
+
+    def _messages(
+        self,
+        message_start: int,
+        chat_start: int,
+        sizes: list[int],
+        last_id: array,
+        last_offset: array,
+    ) -> Iterator[tuple]:
+        # Активность чата растет с числом участников
+        cum_weights = list(accumulate(min(size, self.args.users) for size in sizes))
+        span = (self.end - self.start).total_seconds()
+        message_id = message_start
+        for burst in bursts(self.rng, self.args.messages, span, self.args.mean_burst, self.args.burst_gap):
+            index = self.rng.choices(range(len(sizes)), cum_weights=cum_weights)[0]
+            first, last = self.offsets[index], self.offsets[index + 1]
+            for offset in burst:
+                sender_id = self.members[self.rng.randrange(first, last)]
+                external_id = str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+                timestamp = self.start + timedelta(seconds=offset)
+                yield message_id, external_id, chat_start + index, sender_id, random_text(self.rng), timestamp
+                last_id[index] = message_id
+                last_offset[index] = offset
+                message_id += 1
+
+    async def _update_chat_activity(self, chat_start: int, last_id: array, last_offset: array):
+        """Переносит в чаты last_message_id и last_activity_at через временную таблицу."""
+        await self.conn.execute(
+            "CREATE TEMP TABLE seed_chat_activity "
+            "(chat_id integer, last_message_id integer, last_activity_at timestamp) ON COMMIT DROP"
+        )
+        await self._copy(
+            "seed_chat_activity",
+            ["chat_id", "last_message_id", "last_activity_at"],
+            (
+                (chat_start + index, message_id, self.start + timedelta(seconds=last_offset[index]))
+                for index, message_id in enumerate(last_id)
+                if message_id
+            ),
+        )
+        await self.conn.execute(
+            "UPDATE chats SET last_message_id = a.last_message_id, last_activity_at = a.last_activity_at "
+            "FROM seed_chat_activity a WHERE chats.id = a.chat_id"
+        )
+
+    async def _mark_read(self, chat_start: int):
+        """Большинство участников дочитали свои чаты до конца, остальные — нет."""
+        await self.conn.execute(
+            "UPDATE chat_members SET last_read_message_id = chats.last_message_id "
+            "FROM chats WHERE chats.id = chat_members.chat_id AND chats.id >= $1 "
+            "AND chats.last_message_id IS NOT NULL AND random() < $2",
+            chat_start,
+            self.args.read_ratio,
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных через COPY")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--personal-chats", type=int, default=200_000)
+    parser.add_argument("--groups", type=int, default=10_000)
+    parser.add_argument("--group-min", type=int, default=3)
+    parser.add_argument("--group-max", type=int, default=5_000)
+    parser.add_argument("--group-alpha", type=float, default=1.5, help="показатель Парето для размеров групп")
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--days", type=float, default=90, help="период, на который растягиваются сообщения")
+    parser.add_argument("--mean-burst", type=float, default=8, help="среднее число сообщений во всплеске")
+    parser.add_argument("--burst-gap", type=float, default=20, help="средняя пауза внутри всплеска, секунд")
+    parser.add_argument("--read-ratio", type=float, default=0.8, help="доля участников, дочитавших чат")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.users < 2:
+        parser.error("нужно не меньше двух пользователей")
+    if args.group_min < 1 or args.group_alpha <= 0:
+        parser.error("размеры групп должны быть положительными")
+    if args.messages and not args.personal_chats + args.groups:
+        parser.error("для сообщений нужен хотя бы один чат")
+    return args
+
+
+async def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    await init_db()
+    dsn = make_url(settings.db_url.get_secret_value()).set(drivername="postgresql")
+    conn = await asyncpg.connect(dsn.render_as_string(hide_password=False))
+    started = time.monotonic()
+    try:
+        async with conn.transaction():
+            await Seeder(conn, args).run()
+        await conn.execute("ANALYZE")
+    finally:
+        await conn.close()
+    print(f"Seed completed in {time.monotonic() - started:.1f}s", flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
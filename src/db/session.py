@@ -1,8 +1,88 @@
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from src.core.config import Settings, settings
+from src.core.metrics import InstrumentedQueuePool, instrument_engine
+
+
+def engine_url(settings: Settings) -> URL:
+    url = make_url(settings.db_url.get_secret_value())
+    cache_size = 0 if settings.DB_PGBOUNCER else settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+    return url.update_query_dict({"prepared_statement_cache_size": str(cache_size)})
+
+
+def engine_options(settings: Settings) -> dict[str, Any]:
+    """Параметры пула и подключения asyncpg для create_async_engine."""
+    server_settings = {"application_name": settings.DB_APPLICATION_NAME}
+    connect_args: dict[str, Any] = {
+        "command_timeout": settings.DB_COMMAND_TIMEOUT,
+        "server_settings": server_settings,
+    }
+    if settings.DB_PGBOUNCER:
+        # PgBouncer не сохраняет подготовленные выражения между транзакциями,
+        # а параметры запуска, кроме application_name, по умолчанию отклоняет
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    else:
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+# Ключи session.info: действия до коммита и после него, еще не выполненные
+PENDING_KEY = "after_commit_pending"
+COMMITTED_KEY = "after_commit_ready"
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Откладывает callback до коммита сессии: кэши, читаемые в обход БД, нельзя
+    менять, пока изменение не видно другим транзакциям. При откате действие
+    отбрасывается. Выполняет его run_after_commit() после коммита.
+    """
+    session.info.setdefault(PENDING_KEY, []).append(callback)
+
+
+def has_pending_after_commit(session: AsyncSession) -> bool:
+    """В сессии есть незакоммиченные изменения, о которых должны узнать кэши."""
+    return bool(session.info.get(PENDING_KEY))
+
+
+async def run_after_commit(session: AsyncSession) -> None:
+    for callback in session.info.pop(COMMITTED_KEY, []):
+        await callback()
+
+
+@event.listens_for(Session, "after_commit")
+def _release_pending(session: Session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        session.info.setdefault(COMMITTED_KEY, []).extend(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction):
+    # Откат точки сохранения отменяет не все изменения: лишний сброс кэша безвреден
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
 
-from src.core.config import settings
 
-engine = create_async_engine(settings.db_url.get_secret_value())
+engine = create_async_engine(engine_url(settings), **engine_options(settings))
+instrument_engine(engine)
 async_session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
 
@@ -11,6 +91,7 @@ async def get_async_session() -> AsyncSession:
         try:
             yield session
             await session.commit()
+            await run_after_commit(session)
         except Exception as e:
             await session.rollback()
             raise e
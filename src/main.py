@@ -4,15 +4,36 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
+from src.core.config import settings
 from src.core.handler_exceptions import register_exception_handlers
+from src.core.security import token_authenticator
+from src.core.ws_manager import ws_manager
 from src.db.init_db import init_db
+from src.db.partitions import partition_manager
 from src.routers.base import routers
+from src.services.membership_cache import membership_cache
+from src.services.message_batcher import message_batcher
+from src.services.read_receipts import read_receipts
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):  # noqa
     await init_db()
+    await partition_manager.start()
+    await token_authenticator.start()
+    await ws_manager.start()
+    token_authenticator.on_revoke(lambda: ws_manager.close_revoked(token_authenticator.is_revoked))
+    await membership_cache.start()
+    if settings.MESSAGE_WRITE_BEHIND:
+        await message_batcher.start()
+    await read_receipts.start()
     yield
+    await read_receipts.stop()
+    await message_batcher.stop()
+    await membership_cache.stop()
+    await ws_manager.stop()
+    await token_authenticator.stop()
+    await partition_manager.stop()
 
 
 app = FastAPI(title="Messenger API", lifespan=lifespan)
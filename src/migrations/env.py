@@ -10,9 +10,13 @@ from src.core.config import settings
 from src.models import *
 
 config = context.config
-config.set_main_option("sqlalchemy.url", settings.db_url.get_secret_value())
+# Адрес базы можно передать из кода (тесты мигрируют тестовую базу), иначе — из настроек
+config.set_main_option(
+    "sqlalchemy.url", config.attributes.get("url") or settings.db_url.get_secret_value()
+)
 
-if config.config_file_name is not None:
+# При запуске из приложения (init_db) логирование uvicorn не перенастраиваем
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
     fileConfig(config.config_file_name)
 
 target_metadata = Base.metadata
@@ -43,7 +47,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # Ревизии с CREATE INDEX CONCURRENTLY коммитят транзакцию посреди прогона,
+    # поэтому каждая ревизия выполняется в своей транзакции
+    context.configure(
+        connection=connection, target_metadata=target_metadata, transaction_per_migration=True
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,85 @@
+"""initial schema
+
+Схема, которую создавал Base.metadata.create_all до появления миграций, —
+таблицы, первичные, внешние и уникальные ключи. Базы, созданные так, init_db
+помечает этой ревизией, поэтому она должна совпадать с ними в точности;
+дальнейшие изменения схемы вносят следующие ревизии.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-06-01 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("TIMEZONE('utc', now())")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=32), nullable=False),
+        sa.Column("email", sa.String(length=100), nullable=False),
+        sa.Column("hashed_password", sa.String(length=60), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("email"),
+    )
+    op.create_table(
+        "chats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=128), nullable=False),
+        sa.Column("type", sa.Enum("PERSONAL", "GROUP", name="chattype"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "groups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=128), nullable=False),
+        sa.Column("creator_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["creator_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["id"], ["chats.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "chat_members",
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["chat_id"], ["chats.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("chat_id", "user_id"),
+    )
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("external_id", sa.String(length=64), nullable=False),
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("sender_id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.String(length=4096), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.Column("is_read", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["chat_id"], ["chats.id"]),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        # Модель объявляла уникальность дважды: колонкой и именованным ограничением
+        sa.UniqueConstraint("external_id", name="uq_message_external_id"),
+        sa.UniqueConstraint("external_id", name="messages_external_id_key"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("messages")
+    op.drop_table("chat_members")
+    op.drop_table("groups")
+    op.drop_table("chats")
+    op.drop_table("users")
+    sa.Enum(name="chattype").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,51 @@
+"""read watermarks
+
+Состояние прочтения переносится из флага messages.is_read в водяные знаки
+chat_members.last_read_message_id. Водяной знак участника заполняется
+последним прочитанным сообщением чата от других участников, после чего
+колонка is_read удаляется: модель ее больше не пишет, а NOT NULL без
+значения по умолчанию ломал бы каждую вставку.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-06-01 12:05:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("chat_members", sa.Column("last_read_message_id", sa.Integer(), nullable=True))
+    # Один проход по прочитанным сообщениям вместо подзапроса на каждого участника
+    op.execute(
+        "UPDATE chat_members cm SET last_read_message_id = marks.id "
+        "FROM (SELECT reader.chat_id, reader.user_id, max(m.id) AS id "
+        "FROM chat_members reader JOIN messages m ON m.chat_id = reader.chat_id "
+        "AND m.sender_id != reader.user_id AND m.is_read "
+        "GROUP BY reader.chat_id, reader.user_id) marks "
+        "WHERE cm.chat_id = marks.chat_id AND cm.user_id = marks.user_id"
+    )
+    op.drop_column("messages", "is_read")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column(
+        "messages",
+        sa.Column("is_read", sa.Boolean(), server_default=sa.false(), nullable=False),
+    )
+    op.execute(
+        "UPDATE messages m SET is_read = NOT EXISTS ("
+        "SELECT 1 FROM chat_members cm WHERE cm.chat_id = m.chat_id AND cm.user_id != m.sender_id "
+        "AND coalesce(cm.last_read_message_id, 0) < m.id)"
+    )
+    op.alter_column("messages", "is_read", server_default=None)
+    op.drop_column("chat_members", "last_read_message_id")
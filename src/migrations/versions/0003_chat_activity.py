@@ -0,0 +1,43 @@
+"""chat activity
+
+Денормализованные chats.last_message_id и chats.last_activity_at для списка
+чатов. Значения существующих чатов заполняются по их последним сообщениям;
+чаты без сообщений получают время применения ревизии.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-06-01 12:10:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("TIMEZONE('utc', now())")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("chats", sa.Column("last_message_id", sa.Integer(), nullable=True))
+    op.add_column(
+        "chats",
+        sa.Column("last_activity_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+    )
+    # Так же, как вставка сообщений: максимумы id и времени по чату
+    op.execute(
+        "UPDATE chats c SET last_message_id = latest.id, last_activity_at = latest.timestamp "
+        "FROM (SELECT chat_id, max(id) AS id, max(timestamp) AS timestamp "
+        "FROM messages GROUP BY chat_id) latest "
+        "WHERE c.id = latest.chat_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("chats", "last_activity_at")
+    op.drop_column("chats", "last_message_id")
@@ -0,0 +1,38 @@
+"""message search
+
+Хранимая вычисляемая колонка messages.search_vector для полнотекстового
+поиска. Добавление переписывает таблицу; GIN-индекс по колонке строит
+ревизия 0006.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-06-01 12:15:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "messages",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('russian', text)", persisted=True),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("messages", "search_vector")
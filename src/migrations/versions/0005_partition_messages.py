@@ -0,0 +1,114 @@
+"""partition messages
+
+messages секционируется по RANGE (timestamp). Секционировать существующую
+таблицу нельзя, поэтому рядом создается секционированная messages_partitioned
+с секцией по умолчанию и месячными секциями под уже имеющиеся строки, строки
+копируются, а затем таблицы меняются местами. Последовательность id
+переходит к новой таблице, поэтому нумерация продолжается.
+
+Уникальность external_id в секционированной таблице переходит в
+message_dedup, которая заполняется теми же строками.
+
+На время ревизии messages заблокирована от записи (SHARE), чтения
+продолжаются; большую таблицу стоит переносить в окно обслуживания.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-06-01 12:20:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.core.config import settings
+from src.db.partitions import partition_ddl
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("TIMEZONE('utc', now())")
+NEXT_ID = sa.text("nextval('messages_id_seq'::regclass)")
+COLUMNS = "id, external_id, chat_id, sender_id, text, timestamp"
+
+
+def message_columns() -> list[sa.Column]:
+    return [
+        sa.Column("id", sa.Integer(), server_default=NEXT_ID, nullable=False),
+        sa.Column("external_id", sa.String(length=64), nullable=False),
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("sender_id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.String(length=4096), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('russian', text)", persisted=True),
+            nullable=False,
+        ),
+        # Имена внешних ключей — как у таблицы, созданной create_all
+        sa.ForeignKeyConstraint(["chat_id"], ["chats.id"], name="messages_chat_id_fkey"),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"], name="messages_sender_id_fkey"),
+    ]
+
+
+def swap(new_table: str):
+    """Передает последовательность id таблице new_table и ставит ее на место messages."""
+    op.execute(f"ALTER SEQUENCE messages_id_seq OWNED BY {new_table}.id")
+    op.execute("DROP TABLE messages")
+    op.execute(f"ALTER TABLE {new_table} RENAME TO messages")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("LOCK TABLE messages IN SHARE MODE")
+    op.create_table(
+        "message_dedup",
+        sa.Column("external_id", sa.String(length=64), nullable=False),
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("external_id"),
+    )
+    op.create_table(
+        "messages_partitioned",
+        *message_columns(),
+        sa.PrimaryKeyConstraint("chat_id", "timestamp", "id", name="pk_messages"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.execute("CREATE TABLE messages_default PARTITION OF messages_partitioned DEFAULT")
+    # Строки уходят сразу в месячные секции: занятый диапазон в секции по
+    # умолчанию не дал бы PartitionManager создать секцию этого месяца
+    months = op.get_bind().execute(
+        sa.text("SELECT DISTINCT date_trunc('month', timestamp)::date FROM messages")
+    ).scalars().all()
+    for month in months:
+        for statement in partition_ddl(
+            month, settings.MESSAGE_PARTITION_HASH_MODULUS, parent="messages_partitioned"
+        ):
+            op.execute(statement)
+
+    op.execute(f"INSERT INTO messages_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM messages")
+    op.execute(
+        "INSERT INTO message_dedup (external_id, chat_id, timestamp, message_id) "
+        "SELECT external_id, chat_id, timestamp, id FROM messages"
+    )
+    swap("messages_partitioned")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("LOCK TABLE messages IN SHARE MODE")
+    op.create_table(
+        "messages_unpartitioned",
+        *message_columns(),
+        sa.PrimaryKeyConstraint("id", name="messages_pkey"),
+        sa.UniqueConstraint("external_id", name="uq_message_external_id"),
+        sa.UniqueConstraint("external_id", name="messages_external_id_key"),
+    )
+    op.execute(f"INSERT INTO messages_unpartitioned ({COLUMNS}) SELECT {COLUMNS} FROM messages")
+    swap("messages_unpartitioned")
+    op.drop_table("message_dedup")
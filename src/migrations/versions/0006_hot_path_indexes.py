@@ -0,0 +1,105 @@
+"""hot path indexes
+
+Вторичные индексы под запросы репозиториев. Все индексы строятся через
+CREATE INDEX CONCURRENTLY вне транзакции, поэтому ревизия применима к живой
+базе без блокировки записи.
+
+- chat_members (user_id, chat_id): чаты пользователя и список чатов;
+- chats (last_activity_at, id): keyset-пагинация списка чатов;
+- groups (creator_id), messages (sender_id): проверки внешних ключей
+  при удалении пользователя;
+- messages (chat_id, id): подсчет непрочитанных и сдвиг водяных знаков;
+- messages GIN (search_vector): полнотекстовый поиск;
+- message_dedup (timestamp): очистка вместе со старыми секциями.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-06-01 12:30:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_chat_members_user_id_chat_id", "chat_members", ["user_id", "chat_id"]),
+    ("ix_chats_last_activity_at_id", "chats", ["last_activity_at", "id"]),
+    ("ix_groups_creator_id", "groups", ["creator_id"]),
+    ("ix_message_dedup_timestamp", "message_dedup", ["timestamp"]),
+]
+# Индексы секционированной messages: (имя, колонки, метод доступа)
+PARTITIONED_INDEXES = [
+    ("ix_messages_chat_id_id", "chat_id, id", "btree"),
+    ("ix_messages_sender_id", "sender_id", "btree"),
+    ("ix_messages_search_vector", "search_vector", "gin"),
+]
+
+
+def drop_invalid_index(name: str):
+    """Остаток прерванного CONCURRENTLY-построения невалиден, и IF NOT EXISTS его бы пропустил."""
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name},
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY {name}")
+
+
+def create_partitioned_index(name: str, table: str, columns: str, using: str):
+    """
+    Секционированный индекс нельзя построить CONCURRENTLY целиком. Поэтому на
+    секционированных таблицах индекс создается ON ONLY (пустой и невалидный),
+    на листовых секциях — CONCURRENTLY, затем индексы секций присоединяются
+    снизу вверх, и родительский индекс становится валидным. Секции, созданные
+    позже, получают индекс автоматически.
+    """
+    tree = op.get_bind().execute(
+        sa.text(
+            "SELECT relid::regclass::text, parentrelid::regclass::text, isleaf, level "
+            "FROM pg_partition_tree(CAST(:table AS regclass)) ORDER BY level"
+        ),
+        {"table": table},
+    ).all()
+    suffix = name.removeprefix(f"ix_{table}_")
+    index_names = {}
+    for relation, parent, is_leaf, _ in tree:
+        index = name if parent is None else f"{relation}_{suffix}_idx"[:63]
+        index_names[relation] = index
+        if is_leaf:
+            drop_invalid_index(index)
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {relation} USING {using} ({columns})"
+            )
+        else:
+            op.execute(f"CREATE INDEX IF NOT EXISTS {index} ON ONLY {relation} USING {using} ({columns})")
+    for relation, parent, _, _ in reversed(tree):
+        if parent is not None:
+            op.execute(f"ALTER INDEX {index_names[parent]} ATTACH PARTITION {index_names[relation]}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            drop_invalid_index(name)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        for name, columns, using in PARTITIONED_INDEXES:
+            create_partitioned_index(name, "messages", columns, using)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        # Индекс секционированной таблицы удаляется только без CONCURRENTLY
+        for name, _, _ in reversed(PARTITIONED_INDEXES):
+            op.drop_index(name, table_name="messages", if_exists=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
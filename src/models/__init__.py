@@ -3,6 +3,7 @@ from src.models.chat import Chat
 from src.models.user import User
 from src.models.group import Group
 from src.models.message import Message
+from src.models.message_dedup import MessageDedup
 from src.models.chat_member import ChatMember
 
-__all__ = ["Base", "ChatType", "Chat", "User", "Group", "Message", "ChatMember"]
+__all__ = ["Base", "ChatType", "Chat", "User", "Group", "Message", "MessageDedup", "ChatMember"]
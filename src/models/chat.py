@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
+from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Enum
+from sqlalchemy import DateTime, String, Enum, Index, text
 
 from src.models.base import Base, ChatType, primary_key
 
@@ -15,6 +16,11 @@ class Chat(Base):
     id: Mapped[primary_key]
     name: Mapped[str] = mapped_column(String(128), nullable=False)
     type: Mapped[ChatType] = mapped_column(Enum(ChatType), default=ChatType.PERSONAL)
+    # Денормализация для списка чатов; обновляются тем же запросом, что вставляет сообщение
+    last_message_id: Mapped[int | None] = mapped_column(nullable=True)
+    last_activity_at: Mapped[datetime] = mapped_column(
+        DateTime(), server_default=text("TIMEZONE('utc', now())"), nullable=False
+    )
 
     # Связь с пользователями через ChatMember
     members: Mapped[list["User"]] = relationship(
@@ -28,3 +34,7 @@ class Chat(Base):
         uselist=False
     )
     messages: Mapped[list["Message"]] = relationship(back_populates="chat")
+
+    __table_args__ = (
+        Index("ix_chats_last_activity_at_id", "last_activity_at", "id"),
+    )
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 
 from src.models.base import Base
 
@@ -10,3 +10,10 @@ class ChatMember(Base):
 
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Водяной знак прочтения: все сообщения чата с id <= этого значения прочитаны участником
+    last_read_message_id: Mapped[int | None] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        # Первичный ключ начинается с chat_id; чаты пользователя ищутся по этому индексу
+        Index("ix_chat_members_user_id_chat_id", "user_id", "chat_id"),
+    )
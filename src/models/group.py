@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import String, ForeignKey, Index
 
 from src.models.base import Base
 
@@ -26,3 +26,8 @@ class Group(Base):
 
     # Связь с создателем
     creator: Mapped["User"] = relationship(foreign_keys=[creator_id])
+
+    __table_args__ = (
+        # Проверка внешнего ключа при удалении пользователя
+        Index("ix_groups_creator_id", "creator_id"),
+    )
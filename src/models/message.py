@@ -1,28 +1,73 @@
 from typing import TYPE_CHECKING
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship, query_expression
+from sqlalchemy import (
+    DDL,
+    Computed,
+    String,
+    ForeignKey,
+    Index,
+    PrimaryKeyConstraint,
+    event,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
-from src.models.base import Base, primary_key, timestamp
+from src.models.base import Base, timestamp
 
 if TYPE_CHECKING:
     from src.models import User, Chat
 
+# Конфигурация полнотекстового поиска: русская морфология, латиница стеммируется как английская
+SEARCH_CONFIG = "russian"
+# Последовательность SERIAL-колонки id; значения берутся заранее, чтобы записать их и в message_dedup
+MESSAGE_ID_SEQUENCE = "messages_id_seq"
+
 
 # Модель сообщения
 class Message(Base):
+    """
+    Таблица секционирована по диапазонам timestamp (см. src/db/partitions.py).
+    Первичный ключ включает ключи секционирования всех уровней, поэтому
+    уникальность external_id обеспечивает отдельная таблица message_dedup.
+    """
+
     __tablename__ = "messages"
 
-    id: Mapped[primary_key]
-    external_id: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    id: Mapped[int] = mapped_column(autoincrement=True)
+    external_id: Mapped[str] = mapped_column(String(64), nullable=False)
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), nullable=False)
     sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     text: Mapped[str] = mapped_column(String(4096), nullable=False)
     timestamp: Mapped[timestamp]
-    is_read: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Поисковый вектор вычисляется базой; в обычных запросах не загружается
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', text)", persisted=True),
+        deferred=True,
+    )
+    # Прочитано всеми участниками, кроме отправителя; вычисляется по водяным знакам chat_members
+    is_read: Mapped[bool] = query_expression()
 
     # Связь с чатом
     chat: Mapped["Chat"] = relationship(back_populates="messages")
 
     # Связь с отправителем
     sender: Mapped["User"] = relationship(back_populates="messages")
-    __table_args__ = (UniqueConstraint("external_id", name="uq_message_external_id"),)
+    __table_args__ = (
+        # Покрывает историю чата и keyset-пагинацию по (timestamp, id);
+        # chat_id нужен и для необязательного hash-подсекционирования
+        PrimaryKeyConstraint("chat_id", "timestamp", "id", name="pk_messages"),
+        # Подсчет непрочитанных: сообщения чата с id больше водяного знака
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+        # Проверка внешнего ключа при удалении пользователя
+        Index("ix_messages_sender_id", "sender_id"),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+# Секция по умолчанию принимает строки, для которых месячная секция еще не создана
+event.listen(
+    Message.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"),
+)
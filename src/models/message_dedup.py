@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.base import Base
+
+
+# Реестр external_id: глобальная уникальность поверх секций messages
+class MessageDedup(Base):
+    __tablename__ = "message_dedup"
+
+    external_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Полный первичный ключ исходного сообщения: поиск по нему затрагивает одну секцию
+    chat_id: Mapped[int] = mapped_column(nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(), nullable=False)
+    message_id: Mapped[int] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        # Очистка вместе с удалением старых секций
+        Index("ix_message_dedup_timestamp", "timestamp"),
+    )
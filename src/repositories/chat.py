@@ -2,9 +2,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from sqlalchemy import select
 
+from src.core.metrics import track_queries
 from src.models import Chat, ChatType
 
 
+@track_queries
 class ChatRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
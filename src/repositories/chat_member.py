@@ -1,14 +1,19 @@
-from sqlalchemy import select
+from sqlalchemy import Integer, column, exists, func, select, tuple_, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
-from src.models import Chat, Group, User, ChatMember
+from src.core.metrics import track_queries
+from src.models import Chat, Group, User, ChatMember, Message
 
 
+@track_queries
 class ChatMemberRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    async def get_chat(self, chat_id: int) -> Chat | None:
+        return await self.session.get(Chat, chat_id)
+
     async def get_chat_with_members(self, chat_id: int) -> Chat | None:
         stmt = select(Chat).where(Chat.id == chat_id).options(joinedload(Chat.members))
         result = await self.session.execute(stmt)
@@ -27,6 +32,36 @@ class ChatMemberRepository:
         self.session.add(ChatMember(chat_id=chat.id, user_id=user.id))
         await self.session.flush()
 
+    async def is_member(self, chat_id: int, user_id: int) -> bool:
+        stmt = select(
+            exists().where(ChatMember.chat_id == chat_id, ChatMember.user_id == user_id)
+        )
+        result = await self.session.execute(stmt)
+        return bool(result.scalar())
+
+    async def get_existing_memberships(
+        self, pairs: list[tuple[int, int]]
+    ) -> set[tuple[int, int]]:
+        """Возвращает те пары (chat_id, user_id), которые есть в chat_members."""
+        stmt = select(ChatMember.chat_id, ChatMember.user_id).where(
+            tuple_(ChatMember.chat_id, ChatMember.user_id).in_(pairs)
+        )
+        result = await self.session.execute(stmt)
+        return {(chat_id, user_id) for chat_id, user_id in result.all()}
+
+    async def get_chat_member_ids(self, chat_id: int) -> list[int]:
+        stmt = select(ChatMember.user_id).where(ChatMember.chat_id == chat_id)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_read_watermarks(self, chat_id: int) -> dict[int, int]:
+        """Водяные знаки прочтения участников чата: {user_id: last_read_message_id}."""
+        stmt = select(
+            ChatMember.user_id, func.coalesce(ChatMember.last_read_message_id, 0)
+        ).where(ChatMember.chat_id == chat_id)
+        result = await self.session.execute(stmt)
+        return {user_id: mark for user_id, mark in result.all()}
+
     async def get_chat_members(self, chat_id: int) -> list[User]:
         stmt = (
             select(User)
@@ -35,3 +70,70 @@ class ChatMemberRepository:
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
+
+    async def advance_read_watermarks(
+        self, marks: list[tuple[int, int, int]]
+    ) -> list[tuple[int, int, int, int]]:
+        """
+        Сдвигает водяные знаки прочтения (chat_id, user_id, message_id) только вперед
+        и только на сообщения этого чата. Возвращает (chat_id, user_id, old_id, new_id)
+        для реально сдвинутых строк.
+        """
+        members = ChatMember.__table__
+        old = members.alias("old")
+        batch = values(
+            column("chat_id", Integer),
+            column("user_id", Integer),
+            column("message_id", Integer),
+            name="marks",
+        ).data(marks)
+        stmt = (
+            update(members)
+            .where(
+                members.c.chat_id == batch.c.chat_id,
+                members.c.user_id == batch.c.user_id,
+                # Самосоединение позволяет вернуть значение до обновления
+                old.c.chat_id == members.c.chat_id,
+                old.c.user_id == members.c.user_id,
+                func.coalesce(old.c.last_read_message_id, 0) < batch.c.message_id,
+                exists().where(
+                    Message.id == batch.c.message_id,
+                    Message.chat_id == batch.c.chat_id,
+                ),
+            )
+            .values(last_read_message_id=batch.c.message_id)
+            .returning(
+                members.c.chat_id,
+                members.c.user_id,
+                func.coalesce(old.c.last_read_message_id, 0),
+                batch.c.message_id,
+            )
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def get_read_by_all(
+        self, pairs: list[tuple[int, int]]
+    ) -> dict[tuple[int, int], int]:
+        """
+        Для пар (chat_id, sender_id) возвращает id, до которого включительно
+        сообщения прочитаны всеми участниками, кроме отправителя.
+        """
+        batch = values(
+            column("chat_id", Integer), column("sender_id", Integer), name="pairs"
+        ).data(pairs)
+        stmt = (
+            select(
+                batch.c.chat_id,
+                batch.c.sender_id,
+                func.min(func.coalesce(ChatMember.last_read_message_id, 0)),
+            )
+            .join(
+                ChatMember,
+                (ChatMember.chat_id == batch.c.chat_id)
+                & (ChatMember.user_id != batch.c.sender_id),
+            )
+            .group_by(batch.c.chat_id, batch.c.sender_id)
+        )
+        result = await self.session.execute(stmt)
+        return {(chat_id, sender_id): value for chat_id, sender_id, value in result.all()}
@@ -2,9 +2,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
+from src.core.metrics import track_queries
 from src.models import Group, Chat, User
 
 
+@track_queries
 class GroupRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -1,11 +1,117 @@
-from sqlalchemy import select
+from datetime import datetime
+
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    column,
+    exists,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    update,
+    values,
+)
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload
+
+from src.core.metrics import track_queries
+from src.models import Chat, ChatMember, Message, MessageDedup
+from src.models.message import MESSAGE_ID_SEQUENCE, SEARCH_CONFIG
+from src.schemas.message import MessageRow
+
+# Подсветка совпадений в сниппетах поиска; текст предварительно экранируется
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2"
+
+
+def read_by_all_expression():
+    """Сообщение прочитано, если водяные знаки всех участников, кроме отправителя, не меньше его id."""
+    return ~exists().where(
+        ChatMember.chat_id == Message.chat_id,
+        ChatMember.user_id != Message.sender_id,
+        func.coalesce(ChatMember.last_read_message_id, 0) < Message.id,
+    )
+
 
-from src.models import Message
+def with_chat_activity(insert_stmt):
+    """
+    Выполняет INSERT сообщений как CTE и тем же запросом переносит в чаты
+    last_message_id и last_activity_at самого нового из вставленных сообщений.
+    Возвращает SELECT вставленных строк как сущностей Message.
+    """
+    inserted = insert_stmt.returning(*Message.__table__.c).cte("inserted")
+    latest = (
+        select(
+            inserted.c.chat_id,
+            func.max(inserted.c.id).label("id"),
+            func.max(inserted.c.timestamp).label("timestamp"),
+        )
+        .group_by(inserted.c.chat_id)
+        .subquery("latest")
+    )
+    # Параллельная вставка с меньшим id не должна откатить указатель назад
+    touch = (
+        update(Chat)
+        .where(
+            Chat.id == latest.c.chat_id,
+            or_(Chat.last_message_id.is_(None), Chat.last_message_id < latest.c.id),
+        )
+        .values(last_message_id=latest.c.id, last_activity_at=latest.c.timestamp)
+        .cte("touch")
+    )
+    return select(aliased(Message, inserted)).add_cte(touch)
+
+
+def insert_messages(source):
+    """
+    Вставляет сообщения из SELECT (external_id, chat_id, sender_id, text) одним запросом.
+    external_id сначала занимается в message_dedup: в messages попадают только строки,
+    чей external_id занят этим запросом, дубликаты (в том числе внутри пачки) отбрасываются.
+    """
+    source = source.cte("source")
+    # id выдаются заранее: их же вместе с ключом секции записываем в message_dedup
+    rows = (
+        select(
+            literal_column(f"nextval('{MESSAGE_ID_SEQUENCE}')").label("id"),
+            source.c.external_id,
+            source.c.chat_id,
+            source.c.sender_id,
+            source.c.text,
+            func.timezone("utc", func.now()).label("timestamp"),
+        )
+        .distinct(source.c.external_id)
+        .cte("numbered")
+    )
+    dedup = MessageDedup.__table__
+    claimed = (
+        pg_insert(dedup)
+        .from_select(
+            ["external_id", "chat_id", "timestamp", "message_id"],
+            select(rows.c.external_id, rows.c.chat_id, rows.c.timestamp, rows.c.id),
+        )
+        .on_conflict_do_nothing(index_elements=["external_id"])
+        .returning(dedup.c.external_id)
+        .cte("claimed")
+    )
+    insert_stmt = pg_insert(Message).from_select(
+        ["id", "external_id", "chat_id", "sender_id", "text", "timestamp"],
+        select(
+            rows.c.id,
+            rows.c.external_id,
+            rows.c.chat_id,
+            rows.c.sender_id,
+            rows.c.text,
+            rows.c.timestamp,
+        ).join(claimed, claimed.c.external_id == rows.c.external_id),
+    )
+    return with_chat_activity(insert_stmt)
 
 
+@track_queries
 class MessageRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -13,19 +119,79 @@ class MessageRepository:
     async def create(
         self, external_id: str, chat_id: int, sender_id: int, text: str
     ) -> Message | None:
-        stmt = (
-            pg_insert(Message)
-            .values(
-                external_id=external_id, chat_id=chat_id, sender_id=sender_id, text=text
-            )
-            .on_conflict_do_nothing(index_elements=["external_id"])
-            .returning(Message)
+        row = select(
+            literal(external_id, String).label("external_id"),
+            literal(chat_id, Integer).label("chat_id"),
+            literal(sender_id, Integer).label("sender_id"),
+            literal(text, String).label("text"),
         )
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(insert_messages(row))
         message = result.scalars().first()
         await self.session.flush()
         return message
 
+    async def create_if_member(
+        self, external_id: str, chat_id: int, sender_id: int, text: str
+    ) -> Message | None:
+        """
+        Вставляет сообщение одним запросом, только если отправитель состоит в чате.
+        Возвращает None, если отправитель не в чате или сообщение уже существует.
+        """
+        member_row = select(
+            literal(external_id, String).label("external_id"),
+            ChatMember.chat_id,
+            ChatMember.user_id.label("sender_id"),
+            literal(text, String).label("text"),
+        ).where(ChatMember.chat_id == chat_id, ChatMember.user_id == sender_id)
+        result = await self.session.execute(insert_messages(member_row))
+        return result.scalars().first()
+
+    async def create_many_if_member(
+        self, rows: list[tuple[str, int, int, str]]
+    ) -> list[Message]:
+        """
+        Многострочная вставка (external_id, chat_id, sender_id, text) одним запросом.
+        Строки отправителей не из чата и дубликаты external_id пропускаются.
+        """
+        batch = values(
+            column("external_id", String),
+            column("chat_id", Integer),
+            column("sender_id", Integer),
+            column("text", String),
+            name="batch",
+        ).data(rows)
+        member_rows = select(
+            batch.c.external_id, batch.c.chat_id, batch.c.sender_id, batch.c.text
+        ).join(
+            ChatMember,
+            and_(
+                ChatMember.chat_id == batch.c.chat_id,
+                ChatMember.user_id == batch.c.sender_id,
+            ),
+        )
+        result = await self.session.execute(insert_messages(member_rows))
+        return list(result.scalars().all())
+
+    async def get_by_external_id(self, external_id: str) -> MessageRow | None:
+        """Исходное сообщение по external_id: message_dedup хранит его полный первичный ключ."""
+        stmt = select(
+            Message.id,
+            Message.chat_id,
+            Message.sender_id,
+            Message.text,
+            read_by_all_expression().label("is_read"),
+            Message.timestamp,
+        ).join(
+            MessageDedup,
+            and_(
+                MessageDedup.chat_id == Message.chat_id,
+                MessageDedup.timestamp == Message.timestamp,
+                MessageDedup.message_id == Message.id,
+            ),
+        ).where(MessageDedup.external_id == external_id)
+        row = (await self.session.execute(stmt)).first()
+        return MessageRow(*row) if row is not None else None
+
     async def get_messages_by_chat(self, chat_id: int) -> list[Message]:
         stmt = (
             select(Message)
@@ -35,3 +201,130 @@ class MessageRepository:
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
+
+    async def get_history(
+        self,
+        chat_id: int,
+        limit: int,
+        offset: int = 0,
+        before: tuple[datetime, int] | None = None,
+        after: tuple[datetime, int] | None = None,
+        latest: bool = False,
+    ) -> list[MessageRow]:
+        """
+        Возвращает страницу истории чата в хронологическом порядке.
+        Курсоры before/after задают границы по ключу (timestamp, id), offset
+        используется только без курсоров. Строки читаются кортежами колонок,
+        минуя ORM и карту идентичности.
+        """
+        key = tuple_(Message.timestamp, Message.id)
+        stmt = (
+            select(
+                Message.id,
+                Message.chat_id,
+                Message.sender_id,
+                Message.text,
+                read_by_all_expression().label("is_read"),
+                Message.timestamp,
+            )
+            .where(Message.chat_id == chat_id)
+            .limit(limit)
+        )
+        # Отдельные условия по timestamp отсекают секции вне курсоров при планировании
+        if after is not None:
+            stmt = stmt.where(key > tuple_(*after), Message.timestamp >= after[0])
+        if before is not None:
+            stmt = stmt.where(key < tuple_(*before), Message.timestamp <= before[0])
+
+        # Листаем назад от курсора before (или от конца чата), затем разворачиваем
+        backwards = (before is not None or latest) and after is None
+        if backwards:
+            stmt = stmt.order_by(Message.timestamp.desc(), Message.id.desc())
+        else:
+            stmt = stmt.order_by(Message.timestamp, Message.id)
+        if before is None and after is None and not latest:
+            stmt = stmt.offset(offset)
+
+        result = await self.session.execute(stmt)
+        messages = [MessageRow(*row) for row in result]
+        if backwards:
+            messages.reverse()
+        return messages
+
+    async def get_read_senders(
+        self, advanced: list[tuple[int, int, int, int]]
+    ) -> list[tuple[int, int, int]]:
+        """
+        Для сдвигов водяных знаков (chat_id, reader_id, old_id, new_id) возвращает
+        тройки (chat_id, reader_id, sender_id) авторов, чьи сообщения стали прочитанными.
+        """
+        marks = values(
+            column("chat_id", Integer),
+            column("reader_id", Integer),
+            column("old_id", Integer),
+            column("new_id", Integer),
+            name="marks",
+        ).data(advanced)
+        stmt = (
+            select(marks.c.chat_id, marks.c.reader_id, Message.sender_id)
+            .join(
+                Message,
+                and_(
+                    Message.chat_id == marks.c.chat_id,
+                    Message.id > marks.c.old_id,
+                    Message.id <= marks.c.new_id,
+                    Message.sender_id != marks.c.reader_id,
+                ),
+            )
+            .distinct()
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def search(
+        self,
+        user_id: int,
+        query: str,
+        limit: int,
+        chat_id: int | None = None,
+        after: tuple[float, int] | None = None,
+    ) -> list[tuple[Message, str, float]]:
+        """
+        Полнотекстовый поиск по чатам пользователя (или по одному чату).
+        Возвращает (сообщение, сниппет, ранг) по убыванию (ранг, id); after — ключ
+        последнего результата предыдущей страницы.
+        """
+        config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+        tsquery = func.websearch_to_tsquery(config, query)
+        rank = func.ts_rank(Message.search_vector, tsquery)
+        page = (
+            select(Message.id, rank.label("rank"))
+            .join(
+                ChatMember,
+                and_(ChatMember.chat_id == Message.chat_id, ChatMember.user_id == user_id),
+            )
+            .where(Message.search_vector.bool_op("@@")(tsquery))
+            .order_by(rank.desc(), Message.id.desc())
+            .limit(limit)
+        )
+        if chat_id is not None:
+            page = page.where(Message.chat_id == chat_id)
+        if after is not None:
+            page = page.where(tuple_(rank, Message.id) < tuple_(*after))
+        page = page.subquery("page")
+
+        # Сниппеты строятся только для строк страницы
+        escaped = func.replace(
+            func.replace(func.replace(Message.text, "&", "&amp;"), "<", "&lt;"), ">", "&gt;"
+        )
+        stmt = (
+            select(
+                Message,
+                func.ts_headline(config, escaped, tsquery, HEADLINE_OPTIONS).label("snippet"),
+                page.c.rank,
+            )
+            .join(page, page.c.id == Message.id)
+            .order_by(page.c.rank.desc(), Message.id.desc())
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
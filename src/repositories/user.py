@@ -1,9 +1,17 @@
-from sqlalchemy import select
+from datetime import datetime
+
+from sqlalchemy import Row, and_, func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from src.core.metrics import track_queries
+from src.models import Chat, ChatMember, Message, User
 
-from src.models import Chat, ChatMember, User
+# Длина превью последнего сообщения в списке чатов
+PREVIEW_LENGTH = 100
 
 
+@track_queries
 class UserRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -40,3 +48,53 @@ class UserRepository:
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
+
+    async def get_chat_list(
+        self, user_id: int, limit: int, before: tuple[datetime, int] | None = None
+    ) -> list[Row]:
+        """
+        Страница списка чатов пользователя по убыванию (last_activity_at, id)
+        с превью последнего сообщения и числом непрочитанных — одним запросом.
+        """
+        # Отдельный псевдоним: Message во внешнем запросе — последнее сообщение чата
+        unread = aliased(Message)
+        unread_count = (
+            select(func.count())
+            .where(
+                unread.chat_id == Chat.id,
+                unread.id > func.coalesce(ChatMember.last_read_message_id, 0),
+                unread.sender_id != user_id,
+            )
+            .correlate(Chat, ChatMember)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(
+                Chat.id,
+                Chat.name,
+                Chat.type,
+                Chat.last_activity_at,
+                Message.id.label("last_message_id"),
+                Message.sender_id.label("last_message_sender_id"),
+                func.substr(Message.text, 1, PREVIEW_LENGTH).label("last_message_text"),
+                Message.timestamp.label("last_message_timestamp"),
+                unread_count.label("unread_count"),
+            )
+            .join(ChatMember, ChatMember.chat_id == Chat.id)
+            .outerjoin(
+                Message,
+                # chat_id и timestamp ведут в нужную секцию и по первичному ключу
+                and_(
+                    Message.chat_id == Chat.id,
+                    Message.timestamp == Chat.last_activity_at,
+                    Message.id == Chat.last_message_id,
+                ),
+            )
+            .where(ChatMember.user_id == user_id)
+            .order_by(Chat.last_activity_at.desc(), Chat.id.desc())
+            .limit(limit)
+        )
+        if before is not None:
+            stmt = stmt.where(tuple_(Chat.last_activity_at, Chat.id) < tuple_(*before))
+        result = await self.session.execute(stmt)
+        return list(result.all())
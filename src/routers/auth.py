@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException
+
+from src.core.dependencies import RequiredPrincipalDepends, UserServiceDepends
+from src.core.exceptions import AuthenticationError
+from src.core.security import token_authenticator
+from src.schemas.auth import TokenRequest, TokenResponse
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+
+@router.post("/token", response_model=TokenResponse)
+async def issue_token(data: TokenRequest, service: UserServiceDepends):
+    try:
+        user = await service.authenticate(data.email, data.password)
+        token, principal = token_authenticator.issue(user.id)
+    except AuthenticationError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    return TokenResponse(
+        access_token=token,
+        expires_at=datetime.fromtimestamp(principal.expires_at, timezone.utc),
+    )
+
+
+@router.post("/revoke", status_code=204)
+async def revoke_token(principal: RequiredPrincipalDepends, all_tokens: bool = False):
+    """Отзывает текущий токен или, с all_tokens, все токены пользователя."""
+    if all_tokens:
+        await token_authenticator.revoke_user(principal.user_id)
+    else:
+        await token_authenticator.revoke_token(principal)
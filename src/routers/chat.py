@@ -1,6 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 
-from src.core.dependencies import ChatServiceDepends
+from src.core.dependencies import (
+    ChatServiceDepends,
+    PrincipalDepends,
+    check_chat_member,
+    check_principal,
+    get_principal,
+)
 from src.core.exceptions import NotFoundError, AlreadyExistsError
 from src.models.chat import Chat
 from src.schemas.base import PositiveIntID
@@ -13,13 +19,14 @@ from src.schemas.chat import (
     ChatMemberResponse,
 )
 
-router = APIRouter(prefix="/chats", tags=["chats"])
+router = APIRouter(prefix="/chats", tags=["chats"], dependencies=[Depends(get_principal)])
 
 
 @router.post("/create_personal", response_model=ChatResponse)
 async def create_personal_chat(
-    data: ChatPersonalCreate, service: ChatServiceDepends
+    data: ChatPersonalCreate, service: ChatServiceDepends, principal: PrincipalDepends
 ) -> Chat:
+    check_principal(principal, data.creator_id)
     try:
         return await service.create_personal_chat(data.creator_id, data.friend_id)
     except Exception as e:
@@ -27,7 +34,10 @@ async def create_personal_chat(
 
 
 @router.post("/create_group", response_model=ChatResponse)
-async def create_group_chat(data: ChatGroupCreate, service: ChatServiceDepends) -> Chat:
+async def create_group_chat(
+    data: ChatGroupCreate, service: ChatServiceDepends, principal: PrincipalDepends
+) -> Chat:
+    check_principal(principal, data.creator_id)
     try:
         return await service.create_group_chat(data.name, data.creator_id)
     except Exception as e:
@@ -35,7 +45,10 @@ async def create_group_chat(data: ChatGroupCreate, service: ChatServiceDepends)
 
 
 @router.get("/{chat_id}", response_model=ChatWithMembersResponse)
-async def get_chat(chat_id: PositiveIntID, service: ChatServiceDepends) -> Chat:
+async def get_chat(
+    chat_id: PositiveIntID, service: ChatServiceDepends, principal: PrincipalDepends
+) -> Chat:
+    await check_chat_member(principal, service.chat_member_service, chat_id)
     chat = await service.get_chat_with_members(chat_id)
     if chat is None:
         raise HTTPException(status_code=404, detail=f"Чат с id: {chat_id} не найден")
@@ -43,7 +56,9 @@ async def get_chat(chat_id: PositiveIntID, service: ChatServiceDepends) -> Chat:
 
 
 @router.post("/add_member", response_model=ChatMemberResponse)
-async def add_member(data: ChatMember, service: ChatServiceDepends):
+async def add_member(data: ChatMember, service: ChatServiceDepends, principal: PrincipalDepends):
+    # Добавлять в чат может только его участник
+    await check_chat_member(principal, service.chat_member_service, data.chat_id)
     try:
         await service.add_user_to_chat(data.chat_id, data.user_id)
         return ChatMemberResponse(chat_id=data.chat_id, user_id=data.user_id)
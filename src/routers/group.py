@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 
 from src.schemas.base import PositiveIntID
 from src.core.exceptions import NotFoundError
-from src.core.dependencies import GroupServiceDepends
+from src.core.dependencies import (
+    GroupServiceDepends,
+    PrincipalDepends,
+    check_chat_member,
+    check_principal,
+    get_principal,
+)
 
 from src.schemas.group import (
     GroupCreate,
@@ -12,11 +18,14 @@ from src.schemas.group import (
     GroupResponse,
 )
 
-router = APIRouter(prefix="/groups", tags=["groups"])
+router = APIRouter(prefix="/groups", tags=["groups"], dependencies=[Depends(get_principal)])
 
 
 @router.post("/", response_model=GroupResponse)
-async def create_group(data: GroupCreate, service: GroupServiceDepends):
+async def create_group(
+    data: GroupCreate, service: GroupServiceDepends, principal: PrincipalDepends
+):
+    check_principal(principal, data.creator_id)
     try:
         return await service.create_group(data.name, data.creator_id)
     except Exception as e:
@@ -24,7 +33,11 @@ async def create_group(data: GroupCreate, service: GroupServiceDepends):
 
 
 @router.get("/{group_id}", response_model=GroupMembersResponse)
-async def get_group(group_id: PositiveIntID, service: GroupServiceDepends):
+async def get_group(
+    group_id: PositiveIntID, service: GroupServiceDepends, principal: PrincipalDepends
+):
+    # id группы совпадает с id ее чата
+    await check_chat_member(principal, service.chat_member_service, group_id)
     try:
         group = await service.get_group(group_id)
         if group is None:
@@ -37,7 +50,8 @@ async def get_group(group_id: PositiveIntID, service: GroupServiceDepends):
 
 
 @router.post("/add_member", response_model=GroupMemberResponse, status_code=201)
-async def add_member(data: GroupMember, service: GroupServiceDepends):
+async def add_member(data: GroupMember, service: GroupServiceDepends, principal: PrincipalDepends):
+    await check_chat_member(principal, service.chat_member_service, data.group_id)
     try:
         await service.chat_member_service.add_user_to_chat(data.group_id, data.user_id)
         return GroupMemberResponse(group_id=data.group_id, user_id=data.user_id)
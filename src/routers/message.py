@@ -1,24 +1,52 @@
-from fastapi import APIRouter, HTTPException
+import orjson
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse, Response
 
 from src.schemas.base import PositiveIntID
 from src.core.exceptions import NotFoundError, AlreadyExistsError
-from src.core.dependencies import MessageServiceDepends
+from src.core.dependencies import (
+    MessageServiceDepends,
+    PrincipalDepends,
+    check_chat_member,
+    check_principal,
+)
+from src.services.message_idempotency import message_idempotency
+from src.services.recent_messages import recent_messages
 from src.schemas.message import (
     MessageCreate,
     MessageResponse,
     MessageHistoryResponse,
+    MessageRow,
+    MessageSearchResponse,
+    MessageSearchResult,
 )
 
 router = APIRouter(tags=["messages"])
 
 
 @router.post("/messages/", response_model=MessageResponse)
-async def send_message(data: MessageCreate, service: MessageServiceDepends):
-    try:
+async def send_message(
+    data: MessageCreate, service: MessageServiceDepends, principal: PrincipalDepends
+):
+    check_principal(principal, data.sender_id)
+
+    async def create() -> tuple[str, bool]:
         message = await service.create_message(data)
         if message is None:
-            raise AlreadyExistsError("Сообщение уже существует")
-        return message
+            original = await service.get_by_external_id(data.external_id)
+            if original is None:
+                raise AlreadyExistsError("Сообщение уже существует")
+            return orjson.dumps(original).decode(), False
+        # В буфер последних сообщений попадает только закоммиченное сообщение
+        await service.message_repo.session.commit()
+        payload = orjson.dumps(MessageRow.from_message(message)).decode()
+        await recent_messages.push(message.chat_id, payload)
+        return payload, True
+
+    try:
+        # Повтор того же external_id получает исходное сообщение без записи в БД
+        payload, _ = await message_idempotency.run(data, create)
+        return Response(payload, media_type="application/json")
     except NotFoundError as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
     except AlreadyExistsError as e:
@@ -29,13 +57,48 @@ async def send_message(data: MessageCreate, service: MessageServiceDepends):
 async def get_messages(
     chat_id: PositiveIntID,
     service: MessageServiceDepends,
+    principal: PrincipalDepends,
     limit: int = 10,
     offset: int = 0,
+    before: str | None = None,
+    after: str | None = None,
+    latest: bool = False,
+):
+    await check_chat_member(principal, service.chat_member_service, chat_id)
+    try:
+        messages, next_cursor = await service.get_history(
+            chat_id, limit, offset, before, after, latest
+        )
+        # Строки уже в форме MessageHistoryResponse: кодируем их orjson за один
+        # проход, а Response в обход response_model не валидируется повторно
+        return ORJSONResponse({"messages": messages, "next_cursor": next_cursor})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+    user_id: int,
+    service: MessageServiceDepends,
+    principal: PrincipalDepends,
+    q: str = Query(min_length=1, max_length=256),
+    chat_id: int | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
 ):
+    check_principal(principal, user_id)
     try:
-        messages = await service.get_messages(chat_id, limit, offset)
-        return MessageHistoryResponse(
-            messages=[MessageResponse.model_validate(message) for message in messages]
+        results, next_cursor = await service.search(user_id, q, limit, chat_id, cursor)
+        return MessageSearchResponse(
+            results=[
+                MessageSearchResult(
+                    message=MessageResponse.model_validate(message),
+                    snippet=snippet,
+                    rank=rank,
+                )
+                for message, snippet, rank in results
+            ],
+            next_cursor=next_cursor,
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException
-from src.core.dependencies import MessageServiceDepends
+from fastapi import APIRouter, Depends, HTTPException
+from src.core.dependencies import MessageServiceDepends, get_principal
 
-router = APIRouter(prefix="/test_data", tags=["test_data"])
+router = APIRouter(prefix="/test_data", tags=["test_data"], dependencies=[Depends(get_principal)])
 
 
 @router.post("/")
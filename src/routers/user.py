@@ -1,15 +1,21 @@
-from fastapi import APIRouter, HTTPException
-
-from src.core.dependencies import UserServiceDepends
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.core.dependencies import (
+    PrincipalDepends,
+    UserServiceDepends,
+    check_principal,
+    get_principal,
+)
 from src.core.exceptions import AlreadyExistsError, NotFoundError
 from src.models import User
 from src.schemas.base import PositiveIntID
-from src.schemas.chat import ChatResponse, ChatsResponse
+from src.schemas.chat import ChatListItem, ChatListResponse
 from src.schemas.user import UserCreate, UserResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+# Регистрация открыта: без пользователя не получить и токен
 @router.post("/", response_model=UserResponse)
 async def create_user(data: UserCreate, service: UserServiceDepends) -> User:
     try:
@@ -20,7 +26,8 @@ async def create_user(data: UserCreate, service: UserServiceDepends) -> User:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/{user_id}", response_model=UserResponse)
+# Имя пользователя видят и собеседники, поэтому нужен только токен
+@router.get("/{user_id}", response_model=UserResponse, dependencies=[Depends(get_principal)])
 async def get_user(user_id: PositiveIntID, service: UserServiceDepends) -> User:
     try:
         user = await service.get_user(user_id)
@@ -33,12 +40,20 @@ async def get_user(user_id: PositiveIntID, service: UserServiceDepends) -> User:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/{user_id}/chats", response_model=ChatsResponse)
-async def get_user_chats(user_id: PositiveIntID, service: UserServiceDepends):
+@router.get("/{user_id}/chats", response_model=ChatListResponse)
+async def get_user_chats(
+    user_id: PositiveIntID,
+    service: UserServiceDepends,
+    principal: PrincipalDepends,
+    limit: int = 100,
+    before: str | None = None,
+):
+    check_principal(principal, user_id)
     try:
-        chats = await service.get_chats_by_user_id(user_id)
-        return ChatsResponse(
-            chats=[ChatResponse.model_validate(chat) for chat in chats]
+        rows, next_cursor = await service.get_chat_list(user_id, limit, before)
+        return ChatListResponse(
+            chats=[ChatListItem.from_row(row) for row in rows],
+            next_cursor=next_cursor,
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,47 +1,150 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import time
 
-from src.core.dependencies import MessageServiceDepends, RedisChatServiceDepends
-from src.core.exceptions import NotFoundError
-from src.core.ws_manager import ws_manager
-from src.schemas.message import MessageCreate, MessageResponse
+import orjson
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
+from src.core.config import settings
+from src.core.dependencies import message_service_scope
+from src.core.exceptions import AlreadyExistsError, AuthenticationError, NotFoundError
+from src.core.metrics import WS_BROADCAST_SECONDS, WS_FANOUT_SIZE, WS_FRAMES
+from src.core.offline_queue import DEFAULT_DEVICE_ID
+from src.core.security import Principal, token_authenticator
+from src.core.ws_manager import Connection, ws_manager
+from src.core.ws_protocol import BINARY_SUBPROTOCOL, decode_frame
+from src.schemas.message import MarkReadWS, MessageCreate, MessageRow
+from src.services.message_batcher import message_batcher
+from src.services.message_idempotency import message_idempotency
+from src.services.read_receipts import read_receipts
+from src.services.recent_messages import recent_messages
 
 router = APIRouter(prefix="/ws", tags=["WebSocket"], include_in_schema=False)
 
+# Метка действия в метриках ограничена известными значениями;
+# pong отдельной обработки не требует: любой кадр продлевает жизнь соединения
+WS_ACTIONS = {"get_chat_members", "ack", "mark_read", "send_message", "pong"}
+# device_id — поле хэша курсоров оффлайн-очереди, его длина ограничена
+MAX_DEVICE_ID_LENGTH = 64
+
 
 @router.websocket("/{user_id}")
 async def websocket_handler(
     user_id: int,
     websocket: WebSocket,
-    message_service: MessageServiceDepends,
-    redis: RedisChatServiceDepends,
+    token: str | None = None,
+    device_id: str = DEFAULT_DEVICE_ID,
 ):
-    await ws_manager.connect(user_id, websocket)
-    chat_members: list[int] = []
+    try:
+        if len(device_id) > MAX_DEVICE_ID_LENGTH:
+            raise AuthenticationError("Слишком длинный device_id")
+        principal = authenticate_handshake(user_id, token)
+    except AuthenticationError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    # Бинарный подпротокол только по запросу клиента, иначе — прежний JSON
+    binary = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+    connection = await ws_manager.connect(user_id, websocket, device_id, binary, principal)
     try:
         while True:
-            data = await websocket.receive_json()
-            if data.get("action") == "get_chat_members":
-                chat_id = data.get("chat_id")
-                if not chat_id:
-                    continue
-                chat_members = await redis.get_chat_members(chat_id)
-            elif data.get("action") == "send_message":
-                message = await message_service.create_message(
-                    MessageCreate(sender_id=user_id, **data.get("msg"))
+            if binary:
+                actions = decode_frame(
+                    await websocket.receive_bytes(),
+                    settings.WS_BINARY_MAX_FRAME,
+                    settings.WS_BINARY_BATCH_SIZE,
                 )
-                await message_service.message_repo.session.commit()
-                message_json = MessageResponse.model_validate(message).model_dump_json()
-                for member_id in chat_members:
-                    if member_id == user_id:
-                        continue
-                    if ws_manager.is_online(member_id):
-                        await ws_manager.send_to_user(member_id, message_json)
-                    else:
-                        await redis.add_to_queue(member_id, message_json)
+            else:
+                actions = (await websocket.receive_json(),)
+            ws_manager.touch(connection)
+            for data in actions:
+                await handle_frame(user_id, data, connection)
     except WebSocketDisconnect:
         print(f"WebSocket disconnected: {user_id}", flush=True)
-        ws_manager.disconnect(user_id)
     except NotFoundError as e:
         print(e, flush=True)
     except Exception as e:
         print(f"Unexpected error in WebSocket: {e}", flush=True)
+    finally:
+        # Снимаем соединение (и присутствие, если оно последнее) при любом завершении
+        await ws_manager.disconnect(connection)
+
+
+def authenticate_handshake(user_id: int, token: str | None) -> Principal | None:
+    """
+    Токен передается в query (?token=), так как браузер не дает задать заголовки
+    рукопожатия. Проверка идет один раз на соединение и без БД; отзыв токена
+    позже закрывает соединение (WSManager.close_revoked).
+    """
+    if token is None:
+        if settings.auth_required:
+            raise AuthenticationError("Требуется токен доступа")
+        return None
+    principal = token_authenticator.authenticate(token)
+    if principal.user_id != user_id:
+        raise AuthenticationError("Токен выдан другому пользователю")
+    return principal
+
+
+async def handle_frame(user_id: int, data: dict, connection: Connection | None = None):
+    """Обрабатывает один входящий кадр; сессия БД открывается только на время кадра."""
+    action = data.get("action")
+    WS_FRAMES.labels(action if action in WS_ACTIONS else "unknown").inc()
+    if action == "get_chat_members":
+        # Получатели определяются сервером; действие только прогревает кэш состава
+        chat_id = data.get("chat_id")
+        if not chat_id:
+            return
+        async with message_service_scope() as service:
+            await service.chat_member_service.get_chat_member_ids(chat_id)
+    elif action == "ack":
+        cursor = data.get("cursor")
+        if connection is not None and isinstance(cursor, str):
+            try:
+                await ws_manager.ack(connection, cursor)
+            except ValueError:
+                return
+    elif action == "mark_read":
+        mark = MarkReadWS(**data)
+        read_receipts.mark_read(mark.chat_id, user_id, mark.message_id)
+    elif action == "send_message":
+        await send_message(user_id, MessageCreate(sender_id=user_id, **data.get("msg")))
+
+
+async def send_message(user_id: int, message_data: MessageCreate):
+    chat_members: list[int] = []
+
+    async def create() -> tuple[str, bool]:
+        async with message_service_scope() as service:
+            if settings.MESSAGE_WRITE_BEHIND:
+                # Рассылаем только после коммита пакета, в который попало сообщение
+                message = await message_batcher.submit(message_data)
+            else:
+                message = await service.create_message(message_data)
+                await service.message_repo.session.commit()
+            if message is None:
+                # Повторная отправка того же external_id — уже разослано
+                original = await service.get_by_external_id(message_data.external_id)
+                if original is None:
+                    raise AlreadyExistsError("Сообщение уже существует")
+                return orjson.dumps(original).decode(), False
+            chat_members.extend(
+                await service.chat_member_service.get_chat_member_ids(message.chat_id)
+            )
+        # Кодируем один раз: эта же строка уходит всем получателям, в буфер и в оффлайн-очереди
+        return orjson.dumps(MessageRow.from_message(message)).decode(), True
+
+    try:
+        message_json, created = await message_idempotency.run(message_data, create)
+    except AlreadyExistsError:
+        # external_id занят чужим сообщением: кадр отбрасываем, соединение не рвем
+        return
+    if not created:
+        return
+
+    # Рассылка идет уже после возврата соединения с БД в пул
+    await recent_messages.push(message_data.chat_id, message_json)
+    recipients = [member_id for member_id in chat_members if member_id != user_id]
+    WS_FANOUT_SIZE.observe(len(recipients))
+    started = time.perf_counter()
+    offline = await ws_manager.broadcast(recipients, message_json)
+    WS_BROADCAST_SECONDS.observe(time.perf_counter() - started)
+    if offline:
+        await ws_manager.offline_queue.push_many(offline, message_json)
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from src.schemas.base import NotBlankStrValidationMixin
+
+
+class TokenRequest(BaseModel, NotBlankStrValidationMixin):
+    email: str
+    password: str
+
+    __str_fields__ = ["email", "password"]
+
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: datetime
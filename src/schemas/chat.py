@@ -1,4 +1,9 @@
+from datetime import datetime
+
 from pydantic import BaseModel, ConfigDict
+from sqlalchemy import Row
+
+from src.models.base import ChatType
 
 from src.schemas.user import UserResponse
 from src.schemas.base import IdValidationMixin, NotBlankStrValidationMixin
@@ -34,6 +39,44 @@ class ChatsResponse(BaseModel):
     chats: list[ChatResponse]
 
 
+class LastMessagePreview(BaseModel):
+    id: int
+    sender_id: int
+    text: str
+    timestamp: datetime
+
+
+class ChatListItem(ChatResponse):
+    type: ChatType
+    last_activity_at: datetime
+    last_message: LastMessagePreview | None = None
+    unread_count: int = 0
+
+    @classmethod
+    def from_row(cls, row: Row) -> "ChatListItem":
+        last_message = None
+        if row.last_message_id is not None:
+            last_message = LastMessagePreview(
+                id=row.last_message_id,
+                sender_id=row.last_message_sender_id,
+                text=row.last_message_text,
+                timestamp=row.last_message_timestamp,
+            )
+        return cls(
+            id=row.id,
+            name=row.name,
+            type=row.type,
+            last_activity_at=row.last_activity_at,
+            last_message=last_message,
+            unread_count=row.unread_count,
+        )
+
+
+class ChatListResponse(BaseModel):
+    chats: list[ChatListItem]
+    next_cursor: str | None = None
+
+
 class ChatMemberResponse(BaseModel):
     message: str = "Пользователь успешно добавлен в чат"
     chat_id: int
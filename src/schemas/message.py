@@ -1,12 +1,18 @@
+from dataclasses import dataclass
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from pydantic import BaseModel, ConfigDict
+import orjson
+from pydantic import BaseModel, ConfigDict, field_validator
 from src.schemas.base import (
     IdValidationMixin,
     UUIDValidationMixin,
     NotBlankStrValidationMixin,
 )
 
+if TYPE_CHECKING:
+    from src.models import Message
+
 
 class MessageCreate(
     BaseModel, UUIDValidationMixin, IdValidationMixin, NotBlankStrValidationMixin
@@ -31,14 +37,74 @@ class MessageCreateWS(BaseModel, UUIDValidationMixin, NotBlankStrValidationMixin
 
 
 class MessageResponse(BaseModel):
+    id: int
     chat_id: int
     sender_id: int
     text: str
-    is_read: bool
+    is_read: bool = False
     timestamp: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
+    @field_validator("is_read", mode="before")
+    def validate_is_read(cls, value):
+        # Состояние прочтения вычисляется только при чтении истории,
+        # у только что созданного сообщения оно не загружено
+        return bool(value)
+
+
+@dataclass(slots=True)
+class MessageRow:
+    """
+    Сообщение в форме MessageResponse без ORM и валидации: история читается
+    кортежами колонок, а orjson сериализует такие строки напрямую.
+    """
+
+    id: int
+    chat_id: int
+    sender_id: int
+    text: str
+    is_read: bool
+    timestamp: datetime
+
+    @classmethod
+    def from_message(cls, message: "Message") -> "MessageRow":
+        # У только что созданного сообщения состояние прочтения не загружено
+        return cls(
+            message.id,
+            message.chat_id,
+            message.sender_id,
+            message.text,
+            bool(message.is_read),
+            message.timestamp,
+        )
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> "MessageRow":
+        data = orjson.loads(raw)
+        data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+        return cls(**data)
+
 
 class MessageHistoryResponse(BaseModel):
     messages: list[MessageResponse]
+    next_cursor: str | None = None
+
+
+class MessageSearchResult(BaseModel):
+    message: MessageResponse
+    # HTML-фрагмент: текст экранирован, совпадения обернуты в <mark>
+    snippet: str
+    rank: float
+
+
+class MessageSearchResponse(BaseModel):
+    results: list[MessageSearchResult]
+    next_cursor: str | None = None
+
+
+class MarkReadWS(BaseModel, IdValidationMixin):
+    chat_id: int
+    message_id: int
+
+    __id_fields__ = ["chat_id", "message_id"]
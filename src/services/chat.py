@@ -29,8 +29,8 @@ class ChatService:
         friend: User = await self.user_service.get_exist_user(friend_id)
 
         chat = await self.chat_repo.create_chat(friend.name, ChatType.PERSONAL)
-        await self.chat_member_repo.add_member(chat, creator)
-        await self.chat_member_repo.add_member(chat, friend)
+        await self.chat_member_service.add_member(chat, creator)
+        await self.chat_member_service.add_member(chat, friend)
         return chat
 
     async def create_group_chat(self, name: str, creator_id: int) -> Chat:
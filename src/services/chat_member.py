@@ -1,27 +1,46 @@
 from src.core.exceptions import NotFoundError, AlreadyExistsError
+from src.db.session import after_commit, has_pending_after_commit
 from src.models import Chat, Group, User
 from src.repositories.chat_member import ChatMemberRepository
+from src.services.membership_cache import MembershipCache
 from src.services.user import UserService
 
 
 class ChatMemberService:
     def __init__(
-        self, chat_member_repo: ChatMemberRepository, user_service: UserService
+        self,
+        chat_member_repo: ChatMemberRepository,
+        user_service: UserService,
+        membership_cache: MembershipCache | None = None,
     ):
         self.chat_member_repo = chat_member_repo
         self.user_service = user_service
+        self.membership_cache = membership_cache
 
     async def add_user_to_chat(self, chat_id: int, user_id: int) -> None:
-        chat = await self.chat_member_repo.get_chat_with_members(chat_id)
+        chat = await self.chat_member_repo.get_chat(chat_id)
         user = await self.user_service.get_user(user_id)
 
         if chat is None:
             raise NotFoundError(f"Чат c id: {chat_id} не найден")
         if user is None:
             raise NotFoundError(f"Пользователь c id: {user_id} не найден")
-        if any(member.id == user.id for member in chat.members):
+        if await self.chat_member_repo.is_member(chat_id, user_id):
             raise AlreadyExistsError(f"Пользователь c id: {user_id} уже состоит в чате")
+        await self.add_member(chat, user)
+
+    async def add_member(self, chat: Chat, user: User) -> None:
+        """
+        Добавляет участника без проверок. Кэш состава сбрасывается только после
+        коммита: при откате в нем не появится несуществующий участник.
+        """
         await self.chat_member_repo.add_member(chat, user)
+        if self.membership_cache is not None:
+            chat_id = chat.id
+            after_commit(
+                self.chat_member_repo.session,
+                lambda: self.membership_cache.invalidate(chat_id),
+            )
 
     async def get_chat_with_members(self, chat_id: int) -> Chat | None:
         return await self.chat_member_repo.get_chat_with_members(chat_id)
@@ -30,11 +49,50 @@ class ChatMemberService:
         return await self.chat_member_repo.get_group_with_members(group_id)
 
     async def is_user_in_chat(self, chat_id: int, user_id: int) -> bool:
-        chat = await self.get_chat_with_members(chat_id)
-        return chat is not None and any(member.id == user_id for member in chat.members)
+        cached = await self.get_cached_membership(chat_id, user_id)
+        if cached:
+            return True
+        if cached is None and self.membership_cache is not None:
+            member_ids = await self.get_chat_member_ids(chat_id)
+            return user_id in member_ids
+        # Отрицательный ответ кэша перепроверяем: участник мог быть добавлен
+        # параллельно с заполнением кэша
+        is_member = await self.chat_member_repo.is_member(chat_id, user_id)
+        if is_member and self.membership_cache is not None:
+            # Членство могло быть добавлено этой же, еще не закоммиченной сессией
+            after_commit(
+                self.chat_member_repo.session,
+                lambda: self.membership_cache.add(chat_id, user_id),
+            )
+        return is_member
+
+    async def get_cached_membership(self, chat_id: int, user_id: int) -> bool | None:
+        """Ответ кэша без обращения к БД; None, если кэша нет или промах."""
+        if self.membership_cache is None:
+            return None
+        return await self.membership_cache.is_member(chat_id, user_id)
+
+    async def get_chat_member_ids(self, chat_id: int) -> list[int]:
+        if self.membership_cache is not None:
+            cached = await self.membership_cache.get_members(chat_id)
+            if cached is not None:
+                return cached
+        if self.membership_cache is None:
+            return await self.chat_member_repo.get_chat_member_ids(chat_id)
+        # Поколение читается до запроса: сброс состава во время чтения сорвет заполнение
+        generation = await self.membership_cache.generation(chat_id)
+        member_ids = await self.chat_member_repo.get_chat_member_ids(chat_id)
+        if not has_pending_after_commit(self.chat_member_repo.session):
+            # Пустой состав тоже кэшируется, чтобы не перезаполнять его при каждом запросе;
+            # состав, прочитанный вместе с незакоммиченными изменениями, — нет
+            await self.membership_cache.fill(chat_id, member_ids, generation)
+        return member_ids
+
+    async def get_read_watermarks(self, chat_id: int) -> dict[int, int]:
+        return await self.chat_member_repo.get_read_watermarks(chat_id)
 
     async def check_user_in_this_chat(self, chat_id: int, user_id: int) -> None:
-        if not self.is_user_in_chat(chat_id, user_id):
+        if not await self.is_user_in_chat(chat_id, user_id):
             raise NotFoundError("Пользователь не состоит в чате")
 
     async def get_chat_members(self, chat_id: int) -> list[User]:
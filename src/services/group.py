@@ -22,7 +22,7 @@ class GroupService:
         chat = await self._create_chat(name)
         group = await self.group_repo.create_group(chat, creator_id)
         await self.group_repo.set_creator(group, creator)
-        await self.chat_member_repo.add_member(chat, creator)
+        await self.chat_member_service.add_member(chat, creator)
         return group
 
     async def get_group(self, group_id: int) -> Group | None:
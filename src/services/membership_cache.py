@@ -0,0 +1,181 @@
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import WatchError
+
+from src.core.config import settings
+from src.core.redis_config import redis
+
+# Маркер заполненного множества: без него ключ считается промахом кэша,
+# а множество из одного маркера — закэшированным пустым составом
+FILLED_MARKER = "*"
+INVALIDATION_CHANNEL = "chat:members:invalidate"
+
+
+class MembershipCache:
+    """
+    Кэш состава чатов в Redis-множествах `chat:{chat_id}:members`.
+
+    Множество заполняется целиком одним конвейером и содержит маркер
+    заполненности, поэтому точечные записи при добавлении и удалении участника
+    никогда не выдают частичное множество за полное.
+
+    Заполнение при промахе защищено поколением `chat:{chat_id}:members:gen`:
+    его увеличивают инвалидация и удаление участника, а fill() с поколением,
+    прочитанным до запроса в БД, не перезапишет множество данными, которые
+    устарели за время запроса.
+
+    Поверх Redis каждый процесс держит локальный LRU составов. При изменении
+    состава id чата публикуется в канал инвалидации, и все процессы сбрасывают
+    свою копию; короткий локальный TTL страхует от пропущенных уведомлений.
+    """
+
+    def __init__(self, redis: Redis, local_size: int = 0, local_ttl: float = 0):
+        self.redis = redis
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self._local: OrderedDict[int, tuple[float, frozenset[int]]] = OrderedDict()
+        self._pubsub: PubSub | None = None
+        self._listener: asyncio.Task | None = None
+
+    @staticmethod
+    def key(chat_id: int) -> str:
+        return f"chat:{chat_id}:members"
+
+    @staticmethod
+    def generation_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:members:gen"
+
+    async def generation(self, chat_id: int) -> int:
+        """Читается до запроса в БД и передается в fill()."""
+        return int(await self.redis.get(self.generation_key(chat_id)) or 0)
+
+    async def start(self):
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(INVALIDATION_CHANNEL)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._local.clear()
+
+    async def is_member(self, chat_id: int, user_id: int) -> bool | None:
+        """Возвращает None при промахе кэша."""
+        local = self._get_local(chat_id)
+        if local is not None:
+            return user_id in local
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.sismember(self.key(chat_id), FILLED_MARKER)
+            pipe.sismember(self.key(chat_id), str(user_id))
+            filled, member = await pipe.execute()
+        if not filled:
+            return None
+        return bool(member)
+
+    async def get_members(self, chat_id: int) -> list[int] | None:
+        """Возвращает None при промахе кэша."""
+        local = self._get_local(chat_id)
+        if local is not None:
+            return list(local)
+        members = await self.redis.smembers(self.key(chat_id))
+        decoded = {m.decode() if isinstance(m, bytes) else m for m in members}
+        if FILLED_MARKER not in decoded:
+            return None
+        member_ids = [int(member) for member in decoded if member != FILLED_MARKER]
+        self._set_local(chat_id, member_ids)
+        return member_ids
+
+    async def fill(
+        self, chat_id: int, member_ids: list[int], generation: int | None = None
+    ) -> bool:
+        """
+        Записывает состав чата. С generation запись идет через WATCH и
+        отменяется (False), если состав инвалидировали после чтения из БД.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                if generation is not None:
+                    await pipe.watch(self.generation_key(chat_id))
+                    if int(await pipe.get(self.generation_key(chat_id)) or 0) != generation:
+                        return False
+                    pipe.multi()
+                pipe.delete(self.key(chat_id))
+                pipe.sadd(self.key(chat_id), FILLED_MARKER, *member_ids)
+                pipe.expire(self.key(chat_id), settings.MEMBERSHIP_CACHE_TTL)
+                await pipe.execute()
+            except WatchError:
+                return False
+        self._set_local(chat_id, member_ids)
+        return True
+
+    async def add(self, chat_id: int, user_id: int):
+        self._local.pop(chat_id, None)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # Заполнение, прочитавшее БД до добавления, не затрет нового участника
+            pipe.incr(self.generation_key(chat_id))
+            pipe.expire(self.generation_key(chat_id), settings.MEMBERSHIP_CACHE_TTL)
+            pipe.sadd(self.key(chat_id), user_id)
+            pipe.expire(self.key(chat_id), settings.MEMBERSHIP_CACHE_TTL)
+            pipe.publish(INVALIDATION_CHANNEL, chat_id)
+            await pipe.execute()
+
+    async def remove(self, chat_id: int, user_id: int):
+        self._local.pop(chat_id, None)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self.generation_key(chat_id))
+            pipe.expire(self.generation_key(chat_id), settings.MEMBERSHIP_CACHE_TTL)
+            pipe.srem(self.key(chat_id), user_id)
+            pipe.publish(INVALIDATION_CHANNEL, chat_id)
+            await pipe.execute()
+
+    async def invalidate(self, chat_id: int):
+        """
+        Сбрасывает состав чата после закоммиченного изменения: следующее чтение
+        заполнит его из БД, а начатое до сброса заполнение будет отменено.
+        """
+        self._local.pop(chat_id, None)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self.generation_key(chat_id))
+            pipe.expire(self.generation_key(chat_id), settings.MEMBERSHIP_CACHE_TTL)
+            pipe.delete(self.key(chat_id))
+            pipe.publish(INVALIDATION_CHANNEL, chat_id)
+            await pipe.execute()
+
+    def _get_local(self, chat_id: int) -> frozenset[int] | None:
+        entry = self._local.get(chat_id)
+        if entry is None:
+            return None
+        expires_at, members = entry
+        if expires_at < monotonic():
+            del self._local[chat_id]
+            return None
+        self._local.move_to_end(chat_id)
+        return members
+
+    def _set_local(self, chat_id: int, member_ids: list[int]):
+        if not self.local_size:
+            return
+        self._local[chat_id] = (monotonic() + self.local_ttl, frozenset(member_ids))
+        self._local.move_to_end(chat_id)
+        if len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            try:
+                self._local.pop(int(item["data"]), None)
+            except ValueError:
+                continue
+
+
+membership_cache = MembershipCache(
+    redis, settings.MEMBERSHIP_LOCAL_CACHE_SIZE, settings.MEMBERSHIP_LOCAL_CACHE_TTL
+)
@@ -1,16 +1,16 @@
+from datetime import datetime
 from random import choice, randint, sample
 from uuid import uuid4
 
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-
+from src.core.cursor import decode_cursor, encode_cursor
 from src.core.exceptions import NotFoundError
 from src.models import Message
 from src.models.base import ChatType
 from src.repositories.message import MessageRepository
-from src.schemas.message import MessageCreate
+from src.schemas.message import MessageCreate, MessageRow
 from src.services.chat import ChatService
 from src.services.chat_member import ChatMemberService
+from src.services.recent_messages import RecentMessagesCache, overlay_read_state
 from src.services.user import UserService
 
 
@@ -21,39 +21,109 @@ class MessageService:
         chat_service: ChatService,
         user_service: UserService,
         chat_member_service: ChatMemberService,
+        recent_messages: RecentMessagesCache | None = None,
     ):
         self.message_repo = message_repo
         self.chat_service = chat_service
         self.user_service = user_service
         self.chat_member_service = chat_member_service
+        self.recent_messages = recent_messages
 
     async def create_message(self, data: MessageCreate) -> Message | None:
+        # Кэш состава позволяет сразу отклонить отправителя не из чата
+        cached = await self.chat_member_service.get_cached_membership(
+            data.chat_id, data.sender_id
+        )
+        if cached is not False:
+            # Проверка членства и вставка выполняются одним запросом
+            message = await self.message_repo.create_if_member(
+                data.external_id, data.chat_id, data.sender_id, data.text
+            )
+            if message is not None:
+                return message
+
+        # Сообщение не вставлено: выясняем причину только на этом (редком) пути
         await self.chat_service.get_exist_chat(data.chat_id)
         await self.user_service.get_exist_user(data.sender_id)
-
-        # Проверяем, может ли пользователь писать в этот чат
         if not await self.chat_member_service.is_user_in_chat(
             data.chat_id, data.sender_id
         ):
             raise NotFoundError("Пользователь не состоит в чате")
+        if cached is False:
+            # Кэш устарел, а членство подтверждено в БД — вставку еще не пробовали
+            return await self.message_repo.create_if_member(
+                data.external_id, data.chat_id, data.sender_id, data.text
+            )
+        # Пользователь в чате, значит сообщение с таким external_id уже существует
+        return None
 
-        return await self.message_repo.create(
-            data.external_id, data.chat_id, data.sender_id, data.text
-        )
+    async def get_by_external_id(self, external_id: str) -> MessageRow | None:
+        return await self.message_repo.get_by_external_id(external_id)
 
     async def get_messages(
         self, chat_id: int, limit: int = 10, offset: int = 0
-    ) -> list[Message]:
-        stmt = (
-            select(Message)
-            .where(Message.chat_id == chat_id)
-            .options(joinedload(Message.sender))
-            .order_by(Message.timestamp)
-            .limit(limit)
-            .offset(offset)
-        )
-        result = await self.message_repo.session.execute(stmt)
-        return list(result.scalars().all())
+    ) -> list[MessageRow]:
+        return await self.message_repo.get_history(chat_id, limit, offset=offset)
+
+    async def get_history(
+        self,
+        chat_id: int,
+        limit: int = 10,
+        offset: int = 0,
+        before: str | None = None,
+        after: str | None = None,
+        latest: bool = False,
+    ) -> tuple[list[MessageRow], str | None]:
+        """
+        Возвращает страницу истории и курсор следующей страницы.
+        При листании назад (before/latest) курсор указывает на самое старое
+        сообщение страницы и передается в before, иначе — на самое новое для after.
+        """
+        before_key = decode_cursor(before, datetime, int) if before else None
+        after_key = decode_cursor(after, datetime, int) if after else None
+        if latest and before_key is None and after_key is None:
+            messages = await self._get_latest(chat_id, limit)
+        else:
+            messages = await self.message_repo.get_history(
+                chat_id, limit, offset, before_key, after_key, latest
+            )
+        if not messages or len(messages) < limit:
+            return messages, None
+        backwards = (before_key is not None or latest) and after_key is None
+        edge = messages[0] if backwards else messages[-1]
+        return messages, encode_cursor(edge.timestamp, edge.id)
+
+    async def _get_latest(self, chat_id: int, limit: int) -> list[MessageRow]:
+        """Первая страница с конца чата: из буфера последних сообщений, при промахе — из БД."""
+        cache = self.recent_messages
+        if cache is None or not 0 < limit <= cache.capacity:
+            return await self.message_repo.get_history(chat_id, limit, latest=True)
+        cached = await cache.get_latest(chat_id, limit)
+        if cached is not None:
+            # Вместо истории читаются только водяные знаки участников (по первичному ключу)
+            watermarks = await self.chat_member_service.get_read_watermarks(chat_id)
+            return overlay_read_state(cached, watermarks)
+        # Поколение читается до запроса: конкурентная отправка сорвет заполнение
+        generation = await cache.generation(chat_id)
+        messages = await self.message_repo.get_history(chat_id, cache.capacity, latest=True)
+        await cache.fill(chat_id, generation, messages)
+        return messages[-limit:]
+
+    async def search(
+        self,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        chat_id: int | None = None,
+        cursor: str | None = None,
+    ) -> tuple[list[tuple[Message, str, float]], str | None]:
+        """Страница результатов поиска по чатам пользователя и курсор следующей страницы."""
+        after = decode_cursor(cursor, float, int) if cursor else None
+        results = await self.message_repo.search(user_id, query, limit, chat_id, after)
+        if len(results) < limit:
+            return results, None
+        message, _, rank = results[-1]
+        return results, encode_cursor(rank, message.id)
 
     async def create_test_data(self):
         users = [
@@ -0,0 +1,125 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.core.exceptions import NotFoundError
+from src.db.session import async_session_factory
+from src.models import Message
+from src.repositories.chat_member import ChatMemberRepository
+from src.repositories.message import MessageRepository
+from src.schemas.message import MessageCreate
+
+
+class MessageBatcher:
+    """
+    Отложенная пакетная запись сообщений.
+
+    Сообщения складываются во внутреннюю очередь, а фоновая задача записывает их
+    микропакетами (не более max_batch_size штук или max_wait_ms ожидания) одним
+    многострочным INSERT и одним коммитом. submit() завершается только после
+    коммита пакета, поэтому рассылку можно делать сразу после него.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_batch_size: int,
+        max_wait_ms: int,
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue[tuple[MessageCreate, asyncio.Future] | None] = (
+            asyncio.Queue()
+        )
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Маркер остановки встает в конец очереди: все ранее принятые сообщения будут записаны
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def submit(self, data: MessageCreate) -> Message | None:
+        """
+        Ставит сообщение в очередь и ждет коммита его пакета.
+        Возвращает None для дубликата, для отправителя не из чата бросает NotFoundError.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list[tuple[MessageCreate, asyncio.Future]]):
+        try:
+            async with self.session_factory() as session:
+                inserted = await MessageRepository(session).create_many_if_member(
+                    [(d.external_id, d.chat_id, d.sender_id, d.text) for d, _ in batch]
+                )
+                by_external_id = {message.external_id: message for message in inserted}
+                rejected = {
+                    (d.chat_id, d.sender_id)
+                    for d, _ in batch
+                    if d.external_id not in by_external_id
+                }
+                memberships = (
+                    await ChatMemberRepository(session).get_existing_memberships(
+                        list(rejected)
+                    )
+                    if rejected
+                    else set()
+                )
+                await session.commit()
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for data, future in batch:
+            if future.done():
+                continue
+            # pop: повтор external_id внутри одного пакета получает None, как дубликат
+            message = by_external_id.pop(data.external_id, None)
+            if message is not None:
+                future.set_result(message)
+            elif (data.chat_id, data.sender_id) in memberships:
+                future.set_result(None)
+            else:
+                future.set_exception(NotFoundError("Пользователь не состоит в чате"))
+
+
+message_batcher = MessageBatcher(
+    async_session_factory,
+    settings.MESSAGE_BATCH_SIZE,
+    settings.MESSAGE_BATCH_MAX_WAIT_MS,
+)
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from src.core.config import settings
+from src.core.exceptions import AlreadyExistsError
+from src.core.metrics import MESSAGE_REPLAYS
+from src.core.redis_config import redis
+from src.schemas.message import MessageCreate, MessageRow
+
+# Значение ключа, пока отправка с этим external_id выполняется
+PENDING = b"pending"
+
+# Отправка: создает и коммитит сообщение, возвращает его JSON и признак, что оно новое
+Send = Callable[[], Awaitable[tuple[str, bool]]]
+
+
+class MessageIdempotency:
+    """
+    Повторы отправки по external_id без обращения к БД.
+
+    Одновременные отправки одного external_id в воркере объединяются
+    single-flight-картой: выполняется первая, остальные ждут ее результата.
+    Между воркерами отправку резервирует `SET NX` ключа
+    `message:idempotency:{external_id}` с коротким TTL; после коммита в ключ
+    записывается JSON сообщения, и повтор сразу получает исходный ответ —
+    без проверок, записи в БД и повторной рассылки. Пока ключ в состоянии
+    PENDING или уже истек, отправка идет обычным путем: дубликат все равно
+    отсечет уникальность external_id в БД, а исходное сообщение найдется
+    по message_dedup.
+    """
+
+    def __init__(self, redis: Redis, pending_ttl: int, ttl: int):
+        self.redis = redis
+        self.pending_ttl = pending_ttl
+        self.ttl = ttl
+        self._in_flight: dict[str, asyncio.Future[tuple[str, bool]]] = {}
+
+    @staticmethod
+    def key(external_id: str) -> str:
+        return f"message:idempotency:{external_id}"
+
+    async def run(self, data: MessageCreate, send: Send) -> tuple[str, bool]:
+        """
+        Выполняет send() не более одного раза на external_id. Возвращает JSON
+        сообщения и True, если оно создано этим вызовом; для повтора — JSON
+        исходного сообщения и False. Повтор того же external_id другим
+        отправителем или в другой чат — AlreadyExistsError.
+        """
+        in_flight = self._in_flight.get(data.external_id)
+        if in_flight is not None:
+            payload, _ = await asyncio.shield(in_flight)
+            MESSAGE_REPLAYS.labels("single_flight").inc()
+            return self._replay(data, payload)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[data.external_id] = future
+        try:
+            result = await self._run(data, send)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Ожидающих может не быть: помечаем исключение полученным
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._in_flight[data.external_id]
+        payload, created = result
+        if not created:
+            return self._replay(data, payload)
+        return result
+
+    async def _run(self, data: MessageCreate, send: Send) -> tuple[str, bool]:
+        key = self.key(data.external_id)
+        reserved = await self.redis.set(key, PENDING, nx=True, ex=self.pending_ttl)
+        if not reserved:
+            stored = await self.redis.get(key)
+            if stored is not None and stored != PENDING:
+                MESSAGE_REPLAYS.labels("redis").inc()
+                return stored.decode(), False
+        try:
+            payload, created = await send()
+        except BaseException:
+            if reserved:
+                # Снимаем резерв, чтобы повтор клиента не ждал истечения TTL
+                await self.redis.delete(key)
+            raise
+        if not created:
+            MESSAGE_REPLAYS.labels("db").inc()
+        await self.redis.set(key, payload, ex=self.ttl)
+        return payload, created
+
+    @staticmethod
+    def _replay(data: MessageCreate, payload: str) -> tuple[str, bool]:
+        original = MessageRow.from_json(payload)
+        if original.sender_id != data.sender_id or original.chat_id != data.chat_id:
+            raise AlreadyExistsError("Сообщение с таким external_id уже существует")
+        return payload, False
+
+
+message_idempotency = MessageIdempotency(
+    redis, settings.MESSAGE_IDEMPOTENCY_PENDING_TTL, settings.MESSAGE_IDEMPOTENCY_TTL
+)
@@ -0,0 +1,118 @@
+import asyncio
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.core.ws_manager import WSManager, ws_manager
+from src.db.session import async_session_factory
+from src.repositories.chat_member import ChatMemberRepository
+from src.repositories.message import MessageRepository
+
+
+class ReadReceiptBatcher:
+    """
+    Агрегатор отметок о прочтении.
+
+    mark_read() только запоминает максимальный id для пары (chat_id, user_id);
+    раз в flush_interval_ms все накопленные отметки записываются одним UPDATE
+    водяных знаков, а авторам прочитанных сообщений уходит по одному кадру
+    read_receipts на всех сразу.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        manager: WSManager,
+        flush_interval_ms: int,
+    ):
+        self.session_factory = session_factory
+        self.manager = manager
+        self.flush_interval = flush_interval_ms / 1000
+        self._pending: dict[tuple[int, int], int] = {}
+        self._task: asyncio.Task | None = None
+
+    def mark_read(self, chat_id: int, user_id: int, message_id: int):
+        key = (chat_id, user_id)
+        if message_id > self._pending.get(key, 0):
+            self._pending[key] = message_id
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Read receipts flush error: {e}", flush=True)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        marks = [(chat_id, user_id, message_id) for (chat_id, user_id), message_id in pending.items()]
+
+        try:
+            async with self.session_factory() as session:
+                advanced = await ChatMemberRepository(session).advance_read_watermarks(marks)
+                senders = (
+                    await MessageRepository(session).get_read_senders(advanced)
+                    if advanced
+                    else []
+                )
+                read_by_all = (
+                    await ChatMemberRepository(session).get_read_by_all(
+                        list({(chat_id, sender_id) for chat_id, _, sender_id in senders})
+                    )
+                    if senders
+                    else {}
+                )
+                await session.commit()
+        except Exception:
+            # Возвращаем отметки, чтобы записать их при следующем сбросе
+            for (chat_id, user_id), message_id in pending.items():
+                self.mark_read(chat_id, user_id, message_id)
+            raise
+
+        new_marks = {(chat_id, reader_id): new_id for chat_id, reader_id, _, new_id in advanced}
+        await self._notify(senders, new_marks, read_by_all)
+
+    async def _notify(
+        self,
+        senders: list[tuple[int, int, int]],
+        new_marks: dict[tuple[int, int], int],
+        read_by_all: dict[tuple[int, int], int],
+    ):
+        # Собираем для каждого автора все чаты и всех прочитавших в один кадр
+        receipts: dict[int, dict[int, dict]] = {}
+        for chat_id, reader_id, sender_id in senders:
+            chat_receipt = receipts.setdefault(sender_id, {}).setdefault(
+                chat_id,
+                {
+                    "chat_id": chat_id,
+                    "readers": [],
+                    "read_by_all": read_by_all.get((chat_id, sender_id), 0),
+                },
+            )
+            chat_receipt["readers"].append(
+                {"user_id": reader_id, "message_id": new_marks[(chat_id, reader_id)]}
+            )
+        for sender_id, chats in receipts.items():
+            frame = orjson.dumps(
+                {"event": "read_receipts", "chats": list(chats.values())}
+            ).decode()
+            # Оффлайн-авторы увидят состояние прочтения в истории, в очередь не кладем
+            await self.manager.broadcast([sender_id], frame)
+
+
+read_receipts = ReadReceiptBatcher(
+    async_session_factory, ws_manager, settings.READ_RECEIPT_FLUSH_MS
+)
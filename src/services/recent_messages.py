@@ -0,0 +1,160 @@
+from datetime import datetime
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+
+from src.core.config import settings
+from src.core.redis_config import redis
+from src.schemas.message import MessageRow
+
+# Маркер начала чата в хвосте списка: в буфере лежат все сообщения чата,
+# и страница короче limit — не промах. LTRIM сам выталкивает его при переполнении
+START_MARKER = b"*"
+
+
+def _entry(message: MessageRow) -> bytes:
+    return orjson.dumps(
+        {
+            "id": message.id,
+            "chat_id": message.chat_id,
+            "sender_id": message.sender_id,
+            "text": message.text,
+            "timestamp": message.timestamp,
+        }
+    )
+
+
+def _strip_read_state(message_json: str | bytes) -> bytes:
+    data = orjson.loads(message_json)
+    data.pop("is_read", None)
+    return orjson.dumps(data)
+
+
+def _row(item: bytes) -> MessageRow:
+    data = orjson.loads(item)
+    data.pop("is_read", None)
+    data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+    # Состояние прочтения не хранится: его накладывает overlay_read_state()
+    return MessageRow(is_read=False, **data)
+
+
+def overlay_read_state(messages: list[MessageRow], watermarks: dict[int, int]) -> list[MessageRow]:
+    """
+    Проставляет is_read по водяным знакам участников чата {user_id: last_read_message_id}:
+    сообщение прочитано, если водяные знаки всех участников, кроме отправителя, не меньше его id.
+    """
+    # Минимум по участникам без отправителя — первый в порядке возрастания, кто не он
+    ordered = sorted(watermarks.items(), key=lambda item: item[1])
+    for message in messages:
+        lowest = next((mark for user_id, mark in ordered if user_id != message.sender_id), None)
+        message.is_read = lowest is None or lowest >= message.id
+    return messages
+
+
+class RecentMessagesCache:
+    """
+    Кольцевой буфер последних сообщений чата в Redis-списке `chat:{chat_id}:recent`.
+
+    Элементы — JSON MessageResponse (MessageRow) без is_read, новые слева.
+    Состояние прочтения меняется с каждым сбросом отметок о прочтении, поэтому
+    в буфере не хранится: читатель накладывает его по водяным знакам участников
+    (overlay_read_state), и отметки буфер не сбрасывают. Отправка сообщения
+    после коммита делает LPUSHX + LTRIM, поэтому буфер только дополняется и
+    никогда не создается записью. Заполнение при промахе идет из Postgres и
+    защищено поколением `chat:{chat_id}:recent:gen`: его увеличивают каждая
+    отправка и каждая инвалидация, а fill() записывает буфер через WATCH только
+    если поколение не сменилось с момента перед чтением из БД. Порядок LPUSH
+    при параллельных отправках и повтор сообщения, уже попавшего в заполнение,
+    выравниваются при чтении сортировкой по (timestamp, id) и дедупликацией по id.
+    """
+
+    def __init__(self, redis: Redis, capacity: int, ttl: int):
+        self.redis = redis
+        self.capacity = capacity
+        self.ttl = ttl
+
+    @staticmethod
+    def key(chat_id: int) -> str:
+        return f"chat:{chat_id}:recent"
+
+    @staticmethod
+    def generation_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:recent:gen"
+
+    async def generation(self, chat_id: int) -> int:
+        """Читается до запроса в БД и передается в fill()."""
+        return int(await self.redis.get(self.generation_key(chat_id)) or 0)
+
+    async def get_latest(self, chat_id: int, limit: int) -> list[MessageRow] | None:
+        """
+        Последние limit сообщений в хронологическом порядке; None при промахе.
+        is_read у них не заполнен — см. overlay_read_state().
+        """
+        if not 0 < limit <= self.capacity:
+            return None
+        items = await self.redis.lrange(self.key(chat_id), 0, -1)
+        if not items:
+            return None
+        complete = items[-1] == START_MARKER
+        by_id = {}
+        for item in items:
+            if item != START_MARKER:
+                message = _row(item)
+                by_id[message.id] = message
+        if len(by_id) < limit and not complete:
+            return None
+        messages = sorted(by_id.values(), key=lambda message: (message.timestamp, message.id))
+        return messages[-limit:]
+
+    async def fill(self, chat_id: int, generation: int, messages: list[MessageRow]) -> bool:
+        """
+        Записывает буфер из последних сообщений чата (в хронологическом порядке),
+        прочитанных из БД после generation(). Возвращает False, если за это время
+        в чат писали или буфер инвалидировали: прочитанные данные могли устареть.
+        """
+        if not self.capacity:
+            return False
+        items = [_entry(message) for message in reversed(messages[-self.capacity:])]
+        if len(messages) < self.capacity:
+            items.append(START_MARKER)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(self.generation_key(chat_id))
+                if int(await pipe.get(self.generation_key(chat_id)) or 0) != generation:
+                    return False
+                pipe.multi()
+                pipe.delete(self.key(chat_id))
+                pipe.rpush(self.key(chat_id), *items)
+                pipe.expire(self.key(chat_id), self.ttl)
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    async def push(self, chat_id: int, message_json: str | bytes):
+        """Добавляет закоммиченное сообщение в буфер, если он заполнен."""
+        if not self.capacity:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self.generation_key(chat_id))
+            pipe.expire(self.generation_key(chat_id), self.ttl)
+            pipe.lpushx(self.key(chat_id), _strip_read_state(message_json))
+            pipe.ltrim(self.key(chat_id), 0, self.capacity - 1)
+            await pipe.execute()
+
+    async def invalidate(self, chat_ids: set[int]):
+        """Сбрасывает буферы чатов."""
+        if not self.capacity or not chat_ids:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for chat_id in chat_ids:
+                pipe.incr(self.generation_key(chat_id))
+                pipe.expire(self.generation_key(chat_id), self.ttl)
+                pipe.delete(self.key(chat_id))
+            await pipe.execute()
+
+
+recent_messages = RecentMessagesCache(
+    redis, settings.RECENT_MESSAGES_CAPACITY, settings.RECENT_MESSAGES_TTL
+)
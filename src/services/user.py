@@ -1,4 +1,11 @@
-from src.core.exceptions import AlreadyExistsError, NotFoundError
+import hmac
+from datetime import datetime
+
+from sqlalchemy import Row
+
+from src.core.cursor import decode_cursor, encode_cursor
+from src.core.exceptions import AlreadyExistsError, AuthenticationError, NotFoundError
+from src.core.security import token_authenticator
 from src.repositories.user import UserRepository
 from src.models import Chat, User
 
@@ -21,9 +28,28 @@ class UserService:
             raise NotFoundError(f"Пользователь с id: {user_id} не найден")
         return user
 
-    async def get_user_by_token(self, token) -> User:
-        # TODO: заглушка выбор юзера с id = 15
-        return await self.get_user(15)
+    async def authenticate(self, email: str, password: str) -> User:
+        """Проверяет учетные данные при выдаче токена; дальше запросы идут по токену без БД."""
+        user = await self.repo.get_by_email(email)
+        if user is None or not hmac.compare_digest(
+            user.hashed_password.encode(), password.encode()
+        ):
+            raise AuthenticationError("Неверный email или пароль")
+        return user
+
+    async def get_user_by_token(self, token: str) -> User:
+        principal = token_authenticator.authenticate(token)
+        return await self.get_exist_user(principal.user_id)
 
     async def get_chats_by_user_id(self, user_id: int) -> list[Chat]:
         return await self.repo.get_chats_by_user_id(user_id)
+
+    async def get_chat_list(
+        self, user_id: int, limit: int = 100, before: str | None = None
+    ) -> tuple[list[Row], str | None]:
+        """Страница списка чатов по последней активности и курсор следующей страницы."""
+        before_key = decode_cursor(before, datetime, int) if before else None
+        rows = await self.repo.get_chat_list(user_id, limit, before_key)
+        if len(rows) < limit:
+            return rows, None
+        return rows, encode_cursor(rows[-1].last_activity_at, rows[-1].id)
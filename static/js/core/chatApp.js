@@ -5,6 +5,7 @@ import {DeviceService} from '../services/deviceService.js';
 import {domService} from '../services/domService.js';
 import {viewportUtils} from '../utils/viewportUtils.js';
 import ApiService from '../services/apiService.js';
+import {WebSocketService} from '../services/wsService.js';
 import {detectMobile} from '../utils/helpers.js';
 import {formatFullDateTime, formatMessageDate} from '../utils/dateUtils.js';
 
@@ -47,6 +48,7 @@ class ChatApp {
             device: new DeviceService(),
             dom: domService,
             api: new ApiService(),
+            ws: new WebSocketService(),
             viewport: viewportUtils
         };
 
@@ -346,11 +348,14 @@ class ChatApp {
             // Здесь должна быть логика подключения к WebSocket
             console.log('Подключение к WebSocket...');
 
-            // Пример:
-            // this.socket = new WebSocket(APP_CONFIG.WS_URL);
-            // this.socket.onmessage = this.handleWebSocketMessage.bind(this);
-            // this.socket.onclose = this.handleWebSocketClose.bind(this);
-            // this.socket.onerror = this.handleWebSocketError.bind(this);
+            // Пример (сервис сам согласует бинарный подпротокол). Сервер с
+            // AUTH_SECRET_KEY принимает соединение только с токеном этого пользователя:
+            // await this.services.api.login(email, password);
+            // await this.services.ws.connect(
+            //     `${APP_CONFIG.WS_URL}${userId}`,
+            //     this.handleWebSocketEvent.bind(this),
+            //     this.services.api.token
+            // );
 
         } catch (error) {
             console.error('Ошибка при подключении к WebSocket:', error);
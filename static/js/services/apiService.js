@@ -6,9 +6,40 @@ class ApiService {
      * Создает экземпляр ApiService
      */
     constructor() {
+        // Токен доступа: передается в каждый запрос и в рукопожатие WebSocket
+        this.token = null;
         console.log('ApiService инициализирован с относительными путями');
     }
 
+    /**
+     * Получает токен доступа и сохраняет его для последующих запросов
+     * @param {string} email - Email пользователя
+     * @param {string} password - Пароль
+     * @returns {Promise<Object>} Ответ сервера с access_token и expires_at
+     * @throws {Error} Ошибка при неверных учетных данных
+     */
+    async login(email, password) {
+        const response = await fetch('/auth/token', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+            },
+            body: JSON.stringify({email, password})
+        });
+        const data = await this.handleResponse(response);
+        this.token = data.access_token;
+        return data;
+    }
+
+    /**
+     * Заголовок Authorization для запросов к API
+     * @returns {Object} Заголовки (пустые, пока токен не получен)
+     */
+    authHeaders() {
+        return this.token ? {'Authorization': `Bearer ${this.token}`} : {};
+    }
+
     /**
      * Обрабатывает ответ от сервера
      * @private
@@ -76,7 +107,7 @@ class ApiService {
         console.log('Sending request to:', url);
 
         try {
-            const response = await fetch(url);
+            const response = await fetch(url, {headers: this.authHeaders()});
             console.log('Response status:', response.status, response.statusText);
 
             // handleResponse уже парсит JSON и возвращает данные
@@ -138,6 +169,7 @@ class ApiService {
                 headers: {
                     'Accept': 'application/json',
                     'Content-Type': 'application/json',
+                    ...this.authHeaders(),
                 },
                 credentials: 'include' // Важно для передачи куки с сессией
             });
@@ -206,6 +238,7 @@ class ApiService {
                 headers: {
                     'Content-Type': 'application/json',
                     'Accept': 'application/json',
+                    ...this.authHeaders(),
                 },
                 credentials: 'include', // Важно для передачи куки с сессией
                 body: JSON.stringify(messageData)
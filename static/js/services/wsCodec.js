@@ -0,0 +1,237 @@
+/**
+ * Кодек бинарного подпротокола WebSocket msgpack.v1 (см. src/core/ws_protocol.py).
+ *
+ * Кадр — байт флагов и тело msgpack. Сервер присылает массив событий с
+ * короткими ключами, кодек возвращает их в форме JSON-протокола, поэтому
+ * остальному клиенту все равно, какой протокол согласован.
+ */
+
+export const BINARY_SUBPROTOCOL = 'msgpack.v1';
+const FLAG_DEFLATE = 0x01;
+
+const MESSAGE_KEYS = {i: 'id', c: 'chat_id', s: 'sender_id', t: 'text', r: 'is_read', ts: 'timestamp'};
+const ACTION_KEYS = {action: 'a', chat_id: 'c', cursor: 'cur', message_id: 'mid', msg: 'msg'};
+const MESSAGE_CREATE_KEYS = {external_id: 'x', chat_id: 'c', text: 't'};
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+/**
+ * Минимальный кодировщик msgpack: null, boolean, числа, строки, массивы и объекты
+ */
+function pack(value, out) {
+    if (value === null || value === undefined) {
+        out.push(0xc0);
+    } else if (value === false || value === true) {
+        out.push(value ? 0xc3 : 0xc2);
+    } else if (typeof value === 'number') {
+        packNumber(value, out);
+    } else if (typeof value === 'string') {
+        const bytes = textEncoder.encode(value);
+        if (bytes.length < 32) {
+            out.push(0xa0 | bytes.length);
+        } else if (bytes.length < 0x100) {
+            out.push(0xd9, bytes.length);
+        } else if (bytes.length < 0x10000) {
+            out.push(0xda, bytes.length >> 8, bytes.length & 0xff);
+        } else {
+            out.push(0xdb, ...uint32(bytes.length));
+        }
+        for (const byte of bytes) out.push(byte);
+    } else if (Array.isArray(value)) {
+        packLength(value.length, 0x90, 0xdc, out);
+        for (const item of value) pack(item, out);
+    } else {
+        const entries = Object.entries(value).filter(([, item]) => item !== undefined);
+        packLength(entries.length, 0x80, 0xde, out);
+        for (const [key, item] of entries) {
+            pack(key, out);
+            pack(item, out);
+        }
+    }
+}
+
+function packNumber(value, out) {
+    if (Number.isInteger(value) && value >= 0 && value < 0x100000000) {
+        if (value < 0x80) out.push(value);
+        else if (value < 0x100) out.push(0xcc, value);
+        else if (value < 0x10000) out.push(0xcd, value >> 8, value & 0xff);
+        else out.push(0xce, ...uint32(value));
+    } else if (Number.isInteger(value) && value < 0 && value >= -0x80000000) {
+        if (value >= -32) {
+            out.push(value & 0xff);
+        } else {
+            const view = new DataView(new ArrayBuffer(4));
+            view.setInt32(0, value);
+            out.push(0xd2, ...new Uint8Array(view.buffer));
+        }
+    } else {
+        const view = new DataView(new ArrayBuffer(8));
+        view.setFloat64(0, value);
+        out.push(0xcb, ...new Uint8Array(view.buffer));
+    }
+}
+
+function packLength(length, fixPrefix, prefix16, out) {
+    if (length < 16) out.push(fixPrefix | length);
+    else if (length < 0x10000) out.push(prefix16, length >> 8, length & 0xff);
+    else out.push(prefix16 + 1, ...uint32(length));
+}
+
+function uint32(value) {
+    return [(value >>> 24) & 0xff, (value >>> 16) & 0xff, (value >>> 8) & 0xff, value & 0xff];
+}
+
+/**
+ * Минимальный декодер msgpack для форматов, которые шлет сервер
+ */
+function unpack(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 0;
+
+    const readString = (length) => {
+        const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    };
+    const readBinary = (length) => {
+        const value = bytes.slice(offset, offset + length);
+        offset += length;
+        return value;
+    };
+    const readArray = (length) => {
+        const items = new Array(length);
+        for (let i = 0; i < length; i++) items[i] = read();
+        return items;
+    };
+    const readMap = (length) => {
+        const result = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            result[key] = read();
+        }
+        return result;
+    };
+    const take = (size, getter) => {
+        const value = getter(offset);
+        offset += size;
+        return value;
+    };
+
+    function read() {
+        const type = bytes[offset++];
+        if (type < 0x80) return type;
+        if (type < 0x90) return readMap(type & 0x0f);
+        if (type < 0xa0) return readArray(type & 0x0f);
+        if (type < 0xc0) return readString(type & 0x1f);
+        if (type >= 0xe0) return type - 0x100;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return readBinary(take(1, (o) => view.getUint8(o)));
+            case 0xc5: return readBinary(take(2, (o) => view.getUint16(o)));
+            case 0xc6: return readBinary(take(4, (o) => view.getUint32(o)));
+            case 0xca: return take(4, (o) => view.getFloat32(o));
+            case 0xcb: return take(8, (o) => view.getFloat64(o));
+            case 0xcc: return take(1, (o) => view.getUint8(o));
+            case 0xcd: return take(2, (o) => view.getUint16(o));
+            case 0xce: return take(4, (o) => view.getUint32(o));
+            case 0xcf: return Number(take(8, (o) => view.getBigUint64(o)));
+            case 0xd0: return take(1, (o) => view.getInt8(o));
+            case 0xd1: return take(2, (o) => view.getInt16(o));
+            case 0xd2: return take(4, (o) => view.getInt32(o));
+            case 0xd3: return Number(take(8, (o) => view.getBigInt64(o)));
+            case 0xd9: return readString(take(1, (o) => view.getUint8(o)));
+            case 0xda: return readString(take(2, (o) => view.getUint16(o)));
+            case 0xdb: return readString(take(4, (o) => view.getUint32(o)));
+            case 0xdc: return readArray(take(2, (o) => view.getUint16(o)));
+            case 0xdd: return readArray(take(4, (o) => view.getUint32(o)));
+            case 0xde: return readMap(take(2, (o) => view.getUint16(o)));
+            case 0xdf: return readMap(take(4, (o) => view.getUint32(o)));
+            default: throw new Error(`Неподдерживаемый тип msgpack: 0x${type.toString(16)}`);
+        }
+    }
+
+    return read();
+}
+
+async function inflate(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+/**
+ * Микросекунды UTC -> ISO-строка без зоны, как в JSON-протоколе (datetime
+ * Python через orjson): микросекунды сохраняются и опускаются, если равны нулю
+ * @param {number} micros
+ * @returns {string}
+ */
+function formatTimestamp(micros) {
+    const seconds = Math.floor(micros / 1000000);
+    const fraction = micros - seconds * 1000000;
+    const iso = new Date(seconds * 1000).toISOString().slice(0, 19);
+    return fraction ? `${iso}.${String(fraction).padStart(6, '0')}` : iso;
+}
+
+function expandMessage(message) {
+    const result = {};
+    for (const [key, value] of Object.entries(message)) {
+        result[MESSAGE_KEYS[key] || key] = value;
+    }
+    if (typeof result.timestamp === 'number') {
+        result.timestamp = formatTimestamp(result.timestamp);
+    }
+    return result;
+}
+
+function expandEvent(event) {
+    const {e: name, ...fields} = event;
+    if (name === 'm') {
+        return expandMessage(fields);
+    }
+    if (name === 'o') {
+        return {event: 'offline_messages', cursor: fields.cur, messages: fields.ms.map(expandMessage)};
+    }
+    return {event: name, ...fields};
+}
+
+function compactKeys(object, keys) {
+    const result = {};
+    for (const [key, value] of Object.entries(object)) {
+        result[keys[key] || key] = value;
+    }
+    return result;
+}
+
+/**
+ * Кодирует одно или несколько действий JSON-протокола в бинарный кадр.
+ * Клиентские кадры короткие, поэтому не сжимаются.
+ * @param {Object|Object[]} actions
+ * @returns {Uint8Array}
+ */
+export function encodeActions(actions) {
+    const compact = (action) => {
+        const result = compactKeys(action, ACTION_KEYS);
+        if (result.msg) result.msg = compactKeys(result.msg, MESSAGE_CREATE_KEYS);
+        return result;
+    };
+    const out = [0x00];
+    pack(Array.isArray(actions) ? actions.map(compact) : compact(actions), out);
+    return Uint8Array.from(out);
+}
+
+/**
+ * Декодирует кадр сервера в список событий в форме JSON-протокола
+ * @param {ArrayBuffer} frame
+ * @returns {Promise<Object[]>}
+ */
+export async function decodeEvents(frame) {
+    let bytes = new Uint8Array(frame);
+    const flags = bytes[0];
+    bytes = bytes.subarray(1);
+    if (flags & FLAG_DEFLATE) {
+        bytes = await inflate(bytes);
+    }
+    return unpack(bytes).map(expandEvent);
+}
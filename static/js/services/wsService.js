@@ -0,0 +1,105 @@
+import {BINARY_SUBPROTOCOL, decodeEvents, encodeActions} from './wsCodec.js';
+
+/**
+ * Сервис WebSocket-соединения с сервером.
+ *
+ * Предлагает серверу бинарный подпротокол msgpack.v1; если сервер его не
+ * выбрал, работает на JSON-кадрах. Обработчик получает события в одной и
+ * той же форме независимо от протокола.
+ */
+export class WebSocketService {
+    /**
+     * @param {Object} options
+     * @param {boolean} [options.binary=true] - Предлагать бинарный подпротокол
+     */
+    constructor({binary = true} = {}) {
+        this.binary = binary;
+        this.socket = null;
+        this.onEvent = () => {};
+        // Очередь разбора кадров: распаковка сжатого кадра асинхронна, а события
+        // должны уходить обработчику в порядке прихода кадров
+        this.frames = Promise.resolve();
+    }
+
+    /**
+     * Открывает соединение
+     * @param {string} url - Адрес вида ws://host/ws/{user_id}?device_id=...
+     * @param {function(Object): void} onEvent - Обработчик входящих событий
+     * @param {string|null} [token=null] - Токен доступа; браузер не дает задать
+     *     заголовки рукопожатия, поэтому он передается в query (?token=)
+     * @returns {Promise<WebSocket>}
+     */
+    connect(url, onEvent, token = null) {
+        this.onEvent = onEvent;
+        if (token) {
+            const withToken = new URL(url, window.location.href);
+            withToken.searchParams.set('token', token);
+            url = withToken.toString();
+        }
+        this.socket = this.binary ? new WebSocket(url, [BINARY_SUBPROTOCOL]) : new WebSocket(url);
+        this.socket.binaryType = 'arraybuffer';
+        this.frames = Promise.resolve();
+        this.socket.onmessage = (event) => {
+            this.frames = this.frames
+                .then(() => this.handleFrame(event.data))
+                .catch((error) => console.error('Ошибка разбора кадра WebSocket:', error));
+        };
+        return new Promise((resolve, reject) => {
+            this.socket.onopen = () => resolve(this.socket);
+            this.socket.onerror = reject;
+        });
+    }
+
+    /**
+     * Согласован ли бинарный подпротокол
+     * @returns {boolean}
+     */
+    get isBinary() {
+        return this.socket !== null && this.socket.protocol === BINARY_SUBPROTOCOL;
+    }
+
+    /**
+     * Отправляет одно действие или несколько действий одним кадром
+     * @param {Object|Object[]} actions - Действия в форме JSON-протокола
+     */
+    send(actions) {
+        if (this.isBinary) {
+            this.socket.send(encodeActions(actions));
+        } else {
+            for (const action of Array.isArray(actions) ? actions : [actions]) {
+                this.socket.send(JSON.stringify(action));
+            }
+        }
+    }
+
+    /**
+     * Подтверждает получение пакета оффлайн-сообщений
+     * @param {string} cursor
+     */
+    ack(cursor) {
+        this.send({action: 'ack', cursor});
+    }
+
+    /**
+     * @private
+     * @param {string|ArrayBuffer} data
+     */
+    async handleFrame(data) {
+        const events = typeof data === 'string' ? [JSON.parse(data)] : await decodeEvents(data);
+        for (const event of events) {
+            if (event.event === 'ping') {
+                // Без ответа на пинг сервер сочтет соединение оборванным
+                this.send({action: 'pong'});
+                continue;
+            }
+            this.onEvent(event);
+        }
+    }
+
+    close() {
+        if (this.socket !== null) {
+            this.socket.close();
+            this.socket = null;
+        }
+    }
+}
@@ -2,10 +2,12 @@ import asyncio
 
 import pytest
 import pytest_asyncio
+from alembic import command
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 from src.core.config import settings
-from src.models.base import Base
+from src.db.init_db import alembic_config
 from src.repositories.chat import ChatRepository
 from src.repositories.chat_member import ChatMemberRepository
 from src.repositories.group import GroupRepository
@@ -31,11 +33,23 @@ async def create_test_engine():
     await engine.dispose()
 
 
-@pytest_asyncio.fixture(loop_scope="session")
-async def create_tables(create_test_engine):
-    async with create_test_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        yield
+async def recreate_schema(url: str):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+    await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def create_tables():
+    """
+    Схема тестовой базы строится миграциями с нуля, как рабочая: тесты видят
+    индексы и секции, созданные ревизиями, а не create_all.
+    """
+    url = settings.test_db_url.get_secret_value()
+    asyncio.run(recreate_schema(url))
+    command.upgrade(alembic_config(url), "head")
 
 
 @pytest_asyncio.fixture(loop_scope="session")
@@ -79,6 +93,21 @@ async def db_session(create_tables, create_async_sessionmaker):
             # await session.bind.dispose()
 
 
+@pytest_asyncio.fixture
+async def isolated_sessionmaker(create_tables, create_test_engine, create_async_sessionmaker):
+    """Фабрика сессий для кода, который сам коммитит: все изменения откатываются после теста."""
+    async with create_test_engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            yield async_sessionmaker(
+                bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint"
+            )
+        finally:
+            await transaction.rollback()
+    async with create_async_sessionmaker() as session:
+        await reset_sequences(session)
+
+
 @pytest_asyncio.fixture
 def chat_repo(db_session: AsyncSession):
     return ChatRepository(db_session)
@@ -0,0 +1,31 @@
+from benchmarks.compare import compare
+from benchmarks.stats import percentile, summarize
+
+
+class TestBenchmarkStats:
+    """Тесты расчетов отчета нагрузочного прогона."""
+
+    def test_percentile_nearest_rank(self):
+        """Перцентиль берется по ближайшему рангу, пустая выборка дает ноль."""
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([], 50) == 0
+
+    def test_summarize_in_milliseconds(self):
+        """Сводка задержек переводится в миллисекунды, пустая — без значений."""
+        summary = summarize([0.003, 0.001, 0.002])
+        assert summary["count"] == 3
+        assert summary["p50"] == 2.0
+        assert summary["max"] == 3.0
+        assert summarize([])["p99"] is None
+
+    def test_compare_numeric_metrics(self):
+        """Сравнение считает изменение числовых метрик и пропускает метаданные."""
+        before = {"meta": {"revision": "abc"}, "ws": {"msgs_per_sec": 100, "latency": {"p99": 20}}}
+        after = {"meta": {"revision": "def"}, "ws": {"msgs_per_sec": 150, "latency": {"p99": None}}}
+        rows = {key: (was, now, change) for key, was, now, change in compare(before, after)}
+        assert rows["ws.msgs_per_sec"] == (100, 150, 50.0)
+        assert rows["ws.latency.p99"] == (20, None, None)
+        assert not any(key.startswith("meta.") for key in rows)
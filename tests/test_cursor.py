@@ -0,0 +1,23 @@
+from datetime import datetime
+
+import pytest
+
+from src.core.cursor import decode_cursor, encode_cursor
+from src.core.exceptions import ValidationError
+
+
+class TestCursor:
+    """Тесты кодирования курсоров пагинации."""
+
+    def test_roundtrip(self):
+        """Курсор декодируется в исходные значения."""
+        timestamp = datetime(2025, 5, 1, 12, 30, 15, 123456)
+        cursor = encode_cursor(timestamp, 42)
+
+        assert decode_cursor(cursor, datetime, int) == (timestamp, 42)
+
+    @pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(1, 2, 3)])
+    def test_invalid_cursor(self, cursor):
+        """Некорректный курсор вызывает ошибку валидации."""
+        with pytest.raises(ValidationError):
+            decode_cursor(cursor, datetime, int)
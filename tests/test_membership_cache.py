@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from src.services.membership_cache import MembershipCache
+
+
+@pytest.fixture
+def cache():
+    return MembershipCache(FakeAsyncRedis())
+
+
+class TestMembershipCache:
+    """Тесты кэша состава чатов."""
+
+    async def test_miss_before_fill(self, cache):
+        """До заполнения кэш не дает ответа."""
+        assert await cache.is_member(1, 10) is None
+        assert await cache.get_members(1) is None
+
+    async def test_fill_and_lookup(self, cache):
+        """После заполнения кэш отвечает на проверки членства."""
+        await cache.fill(1, [10, 11])
+
+        assert await cache.is_member(1, 10) is True
+        assert await cache.is_member(1, 12) is False
+        assert sorted(await cache.get_members(1)) == [10, 11]
+
+    async def test_empty_chat_is_cached(self, cache):
+        """Пустой состав кэшируется и не считается промахом."""
+        await cache.fill(1, [])
+
+        assert await cache.get_members(1) == []
+        assert await cache.is_member(1, 10) is False
+
+    async def test_write_through(self, cache):
+        """Добавление и удаление меняют заполненное множество."""
+        await cache.fill(1, [10])
+        await cache.add(1, 11)
+        await cache.remove(1, 10)
+
+        assert await cache.get_members(1) == [11]
+
+    async def test_invalidate_aborts_stale_fill(self, cache):
+        """Заполнение, прочитавшее БД до сброса состава, не перезаписывает кэш."""
+        generation = await cache.generation(1)
+        await cache.fill(1, [10])
+        await cache.invalidate(1)
+
+        assert not await cache.fill(1, [10], generation)
+        assert await cache.get_members(1) is None
+        assert await cache.fill(1, [10, 11], await cache.generation(1))
+        assert sorted(await cache.get_members(1)) == [10, 11]
+
+    async def test_add_aborts_stale_fill(self, cache):
+        """Заполнение, прочитавшее БД до добавления участника, не теряет его."""
+        await cache.fill(1, [10])
+        generation = await cache.generation(1)
+        await cache.add(1, 11)
+
+        assert not await cache.fill(1, [10], generation)
+        assert sorted(await cache.get_members(1)) == [10, 11]
+
+    async def test_add_to_unfilled_is_still_miss(self, cache):
+        """Точечная запись без заполнения не выдается за полный состав."""
+        await cache.add(1, 11)
+
+        assert await cache.is_member(1, 10) is None
+
+    async def test_local_copy_invalidated_across_processes(self):
+        """Изменение состава в одном процессе сбрасывает локальную копию в другом."""
+        server = FakeServer()
+        writer = MembershipCache(FakeAsyncRedis(server=server), local_size=10, local_ttl=60)
+        reader = MembershipCache(FakeAsyncRedis(server=server), local_size=10, local_ttl=60)
+        await reader.start()
+
+        await writer.fill(1, [10])
+        assert await reader.get_members(1) == [10]
+
+        await writer.add(1, 11)
+        await asyncio.sleep(0.05)
+
+        assert sorted(await reader.get_members(1)) == [10, 11]
+        await reader.stop()
@@ -1,6 +1,8 @@
 import pytest
 import uuid
 from src.core.exceptions import NotFoundError
+from src.core.cursor import encode_cursor
+from src.schemas.message import MessageCreate
 
 
 class TestMessageService:
@@ -125,3 +127,70 @@ class TestMessageService:
         # Пытаемся получить сообщения из пустого чата
         messages = await message_service.get_messages(chat.id)
         assert len(messages) == 0
+
+    async def test_create_duplicate_message_returns_none(self, message_service, chat_service, user_service):
+        """Повторная отправка с тем же external_id не создает дубликат."""
+        user = await user_service.create_user("Alice", "alice@example.com", "secret")
+        chat = await chat_service.create_group_chat("Group Chat", creator_id=user.id)
+        data = MessageCreate(
+            external_id=str(uuid.uuid4()), chat_id=chat.id, sender_id=user.id, text="Привет!"
+        )
+
+        first = await message_service.create_message(data)
+        second = await message_service.create_message(data)
+
+        assert first is not None
+        assert second is None
+        assert len(await message_service.get_messages(chat.id)) == 1
+
+    async def test_get_history_with_cursors(self, message_service, chat_service, user_service):
+        """Keyset-пагинация назад и вперед без пропусков и повторов."""
+        user = await user_service.create_user("Alice", "alice@example.com", "secret")
+        chat = await chat_service.create_group_chat("Group Chat", creator_id=user.id)
+        for i in range(1, 8):
+            await message_service.create_message(
+                MessageCreate(
+                    external_id=str(uuid.uuid4()), chat_id=chat.id, sender_id=user.id, text=f"Сообщение {i}"
+                )
+            )
+
+        last_page, cursor = await message_service.get_history(chat.id, limit=3, latest=True)
+        assert [m.text for m in last_page] == ["Сообщение 5", "Сообщение 6", "Сообщение 7"]
+
+        middle_page, cursor = await message_service.get_history(chat.id, limit=3, before=cursor)
+        assert [m.text for m in middle_page] == ["Сообщение 2", "Сообщение 3", "Сообщение 4"]
+
+        first_page, cursor = await message_service.get_history(chat.id, limit=3, before=cursor)
+        assert [m.text for m in first_page] == ["Сообщение 1"]
+        assert cursor is None
+
+        forward_page, _ = await message_service.get_history(chat.id, limit=10, after=encode_cursor(
+            middle_page[-1].timestamp, middle_page[-1].id
+        ))
+        assert [m.text for m in forward_page] == ["Сообщение 5", "Сообщение 6", "Сообщение 7"]
+
+    async def test_search_scoped_to_member_chats(self, message_service, chat_service, user_service):
+        """Поиск находит словоформы, экранирует текст и не видит чужие чаты."""
+        alice = await user_service.create_user("Alice", "alice@example.com", "secret")
+        bob = await user_service.create_user("Bob", "bob@example.com", "secret")
+        own = await chat_service.create_group_chat("Own", creator_id=alice.id)
+        foreign = await chat_service.create_group_chat("Foreign", creator_id=bob.id)
+        texts = [(own, alice, "Купил <b>кошке</b> корм"), (own, alice, "Кошка спит"),
+                 (own, alice, "Собака лает"), (foreign, bob, "Чужая кошка")]
+        for chat, sender, text in texts:
+            await message_service.create_message(
+                MessageCreate(external_id=str(uuid.uuid4()), chat_id=chat.id, sender_id=sender.id, text=text)
+            )
+
+        first, cursor = await message_service.search(alice.id, "кошка", limit=1)
+        second, last_cursor = await message_service.search(alice.id, "кошка", limit=1, cursor=cursor)
+        rest, _ = await message_service.search(alice.id, "кошка", limit=1, cursor=last_cursor)
+        found = first + second
+
+        assert rest == []
+        assert {message.chat_id for message, _, _ in found} == {own.id}
+        assert len({message.id for message, _, _ in found}) == 2
+        snippets = {message.text: snippet for message, snippet, _ in found}
+        assert "<mark>кошке</mark>" in snippets["Купил <b>кошке</b> корм"]
+        assert "<b>" not in snippets["Купил <b>кошке</b> корм"]
+        assert await message_service.search(alice.id, "кошка", chat_id=foreign.id) == ([], None)
@@ -0,0 +1,61 @@
+import asyncio
+import uuid
+
+from src.core.exceptions import NotFoundError
+from src.models import ChatType
+from src.repositories.chat import ChatRepository
+from src.repositories.chat_member import ChatMemberRepository
+from src.repositories.user import UserRepository
+from src.schemas.message import MessageCreate
+from src.services.message_batcher import MessageBatcher
+
+
+class TestMessageBatcher:
+    """Тесты пакетной записи сообщений."""
+
+    async def test_batch_outcomes(self, isolated_sessionmaker):
+        """Один пакет: новое сообщение, дубликат и отправитель не из чата."""
+        async with isolated_sessionmaker() as session:
+            alice = await UserRepository(session).create("Alice", "alice@example.com", "secret")
+            eve = await UserRepository(session).create("Eve", "eve@example.com", "secret")
+            chat = await ChatRepository(session).create_chat("Group", ChatType.GROUP)
+            await ChatMemberRepository(session).add_member(chat, alice)
+            await session.commit()
+
+        batcher = MessageBatcher(isolated_sessionmaker, max_batch_size=10, max_wait_ms=50)
+        await batcher.start()
+        external_id = str(uuid.uuid4())
+        results = await asyncio.gather(
+            batcher.submit(MessageCreate(external_id=external_id, chat_id=chat.id, sender_id=alice.id, text="Привет")),
+            batcher.submit(MessageCreate(external_id=external_id, chat_id=chat.id, sender_id=alice.id, text="Привет")),
+            batcher.submit(MessageCreate(external_id=str(uuid.uuid4()), chat_id=chat.id, sender_id=eve.id, text="Чужой")),
+            return_exceptions=True,
+        )
+        await batcher.stop()
+
+        assert results[0].id is not None
+        assert results[0].text == "Привет"
+        assert results[1] is None
+        assert isinstance(results[2], NotFoundError)
+
+    async def test_stop_flushes_pending(self, isolated_sessionmaker):
+        """Остановка дописывает все принятые сообщения."""
+        async with isolated_sessionmaker() as session:
+            alice = await UserRepository(session).create("Alice", "alice@example.com", "secret")
+            chat = await ChatRepository(session).create_chat("Group", ChatType.GROUP)
+            await ChatMemberRepository(session).add_member(chat, alice)
+            await session.commit()
+
+        batcher = MessageBatcher(isolated_sessionmaker, max_batch_size=2, max_wait_ms=1000)
+        await batcher.start()
+        pending = [
+            asyncio.create_task(batcher.submit(
+                MessageCreate(external_id=str(uuid.uuid4()), chat_id=chat.id, sender_id=alice.id, text=f"{i}")
+            ))
+            for i in range(5)
+        ]
+        await asyncio.sleep(0)
+        await batcher.stop()
+
+        messages = await asyncio.gather(*pending)
+        assert all(message is not None for message in messages)
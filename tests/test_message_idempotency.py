@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime
+
+import orjson
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from src.core.exceptions import AlreadyExistsError
+from src.schemas.message import MessageCreate, MessageRow
+from src.services.message_idempotency import PENDING, MessageIdempotency
+
+EXTERNAL_ID = "3f0e8d5c-0000-4000-8000-000000000001"
+
+
+def payload(sender_id: int = 10, chat_id: int = 1) -> str:
+    return orjson.dumps(
+        MessageRow(1, chat_id, sender_id, "hello", False, datetime(2025, 1, 1))
+    ).decode()
+
+
+def data(sender_id: int = 10, chat_id: int = 1) -> MessageCreate:
+    return MessageCreate(
+        external_id=EXTERNAL_ID, chat_id=chat_id, sender_id=sender_id, text="hello"
+    )
+
+
+class Sender:
+    """Отправка, считающая вызовы; release задерживает ее завершение."""
+
+    def __init__(self, result: tuple[str, bool] | None = None):
+        self.calls = 0
+        self.result = result or (payload(), True)
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self) -> tuple[str, bool]:
+        self.calls += 1
+        await self.release.wait()
+        return self.result
+
+
+@pytest.fixture
+def redis():
+    return FakeAsyncRedis()
+
+
+@pytest.fixture
+def idempotency(redis):
+    return MessageIdempotency(redis, pending_ttl=30, ttl=600)
+
+
+class TestMessageIdempotency:
+    """Тесты идемпотентной отправки сообщений по external_id."""
+
+    async def test_first_send_stores_result(self, idempotency, redis):
+        """Первая отправка выполняется, ее результат сохраняется для повторов."""
+        send = Sender()
+
+        assert await idempotency.run(data(), send) == (payload(), True)
+        assert send.calls == 1
+        assert await redis.get(idempotency.key(EXTERNAL_ID)) == payload().encode()
+        assert 0 < await redis.ttl(idempotency.key(EXTERNAL_ID)) <= 600
+
+    async def test_replay_skips_send(self, idempotency):
+        """Повтор получает исходное сообщение без повторной отправки."""
+        send = Sender()
+        await idempotency.run(data(), send)
+
+        assert await idempotency.run(data(), send) == (payload(), False)
+        assert send.calls == 1
+
+    async def test_concurrent_sends_coalesce(self, idempotency):
+        """Одновременные отправки одного external_id выполняются один раз."""
+        send = Sender()
+        send.release.clear()
+        tasks = [asyncio.create_task(idempotency.run(data(), send)) for _ in range(5)]
+        await asyncio.sleep(0)
+        send.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert send.calls == 1
+        assert sorted(created for _, created in results) == [False] * 4 + [True]
+        assert {message for message, _ in results} == {payload()}
+
+    async def test_foreign_replay_rejected(self, idempotency):
+        """external_id чужого сообщения не возвращает его другому отправителю."""
+        await idempotency.run(data(), Sender())
+
+        with pytest.raises(AlreadyExistsError):
+            await idempotency.run(data(sender_id=11), Sender())
+        with pytest.raises(AlreadyExistsError):
+            await idempotency.run(data(chat_id=2), Sender())
+
+    async def test_failure_releases_reservation(self, idempotency, redis):
+        """Ошибка отправки снимает резерв, и повтор выполняется заново."""
+
+        async def failing() -> tuple[str, bool]:
+            raise RuntimeError("db is down")
+
+        with pytest.raises(RuntimeError):
+            await idempotency.run(data(), failing)
+        assert await redis.get(idempotency.key(EXTERNAL_ID)) is None
+
+        send = Sender()
+        assert await idempotency.run(data(), send) == (payload(), True)
+        assert send.calls == 1
+
+    async def test_pending_falls_through(self, idempotency, redis):
+        """Пока другой воркер держит резерв, отправка идет в БД и получает ее ответ."""
+        await redis.set(idempotency.key(EXTERNAL_ID), PENDING)
+        send = Sender((payload(), False))
+
+        assert await idempotency.run(data(), send) == (payload(), False)
+        assert send.calls == 1
+        assert await redis.get(idempotency.key(EXTERNAL_ID)) == payload().encode()
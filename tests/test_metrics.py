@@ -0,0 +1,64 @@
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+from redis.asyncio import ConnectionPool
+
+from src.core.metrics import InstrumentedRedis, db_operation, track_queries
+from src.routers.metrics import router as metrics_router
+from src.routers.ws import handle_frame
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics:
+    """Тесты инструментирования."""
+
+    async def test_redis_commands_observed(self):
+        """Команды и конвейеры Redis попадают в гистограмму по имени команды."""
+        pool = ConnectionPool(connection_class=FakeAsyncRedisConnection, server=FakeServer())
+        redis = InstrumentedRedis(connection_pool=pool)
+        before_set = sample("redis_command_seconds_count", command="SET")
+        before_pipeline = sample("redis_command_seconds_count", command="PIPELINE")
+
+        await redis.set("key", "value")
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get("key")
+            pipe.get("key")
+            assert await pipe.execute() == [b"value", b"value"]
+
+        assert sample("redis_command_seconds_count", command="SET") == before_set + 1
+        assert sample("redis_command_seconds_count", command="PIPELINE") == before_pipeline + 1
+        await redis.aclose()
+
+    async def test_track_queries_sets_operation(self):
+        """Методы репозитория выставляют метку операции только на время вызова."""
+
+        @track_queries
+        class FakeRepository:
+            async def get(self):
+                return db_operation.get()
+
+        assert await FakeRepository().get() == "FakeRepository.get"
+        assert db_operation.get() == "other"
+
+    async def test_unknown_action_label_bounded(self):
+        """Неизвестные действия считаются под одной меткой."""
+        before = sample("ws_frames_total", action="unknown")
+        await handle_frame(1, {"action": "whatever"})
+        await handle_frame(1, {})
+        assert sample("ws_frames_total", action="unknown") == before + 2
+        assert sample("ws_frames_total", action="whatever") == 0
+
+    async def test_metrics_endpoint(self):
+        """Эндпоинт отдает метрики в текстовом формате Prometheus."""
+        app = FastAPI()
+        app.include_router(metrics_router)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert "ws_frames_total" in response.text
+        assert "db_query_seconds" in response.text
@@ -0,0 +1,89 @@
+import asyncio
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.db.init_db import BASELINE_REVISION, alembic_config, baseline_differences
+from src.models.base import Base
+
+
+def include_object(obj, name, type_, reflected, compare_to):  # noqa
+    # Секции messages создаются миграциями и PartitionManager, в моделях их нет
+    return not (type_ == "table" and reflected and compare_to is None and name.startswith("messages_"))
+
+
+def schema_diff(conn) -> list:
+    context = MigrationContext.configure(conn, opts={"include_object": include_object})
+    return compare_metadata(context, Base.metadata)
+
+
+BASELINE_DATA = [
+    "INSERT INTO users (id, name, email, hashed_password) "
+    "VALUES (1, 'Alice', 'alice@example.com', 'x'), (2, 'Bob', 'bob@example.com', 'x')",
+    "INSERT INTO chats (id, name, type) VALUES (1, 'Group', 'GROUP')",
+    "INSERT INTO chat_members (chat_id, user_id) VALUES (1, 1), (1, 2)",
+    "INSERT INTO messages (id, external_id, chat_id, sender_id, text, timestamp, is_read) VALUES "
+    "(1, 'a', 1, 1, 'Привет, мир', '2025-01-15 10:00', true), "
+    "(2, 'b', 1, 1, 'Как дела?', '2025-02-01 09:00', false)",
+    "SELECT setval('messages_id_seq', 2)",
+]
+
+
+class TestMigrations:
+    """Тесты цепочки миграций схемы."""
+
+    async def test_head_matches_models(self, create_tables, create_test_engine):
+        """Схема после всех ревизий совпадает с моделями."""
+        async with create_test_engine.connect() as conn:
+            assert await conn.run_sync(schema_diff) == []
+            assert await conn.run_sync(baseline_differences) != []
+
+    async def test_baseline_schema_upgraded_with_data(self, create_tables, create_test_engine):
+        """База в схеме create_all до миграций доводится до последней ревизии без потери данных."""
+        config = alembic_config(settings.test_db_url.get_secret_value())
+        await asyncio.to_thread(command.downgrade, config, BASELINE_REVISION)
+        try:
+            async with create_test_engine.begin() as conn:
+                assert await conn.run_sync(baseline_differences) == []
+                for statement in BASELINE_DATA:
+                    await conn.execute(text(statement))
+            await asyncio.to_thread(command.upgrade, config, "head")
+
+            async with create_test_engine.connect() as conn:
+                messages = await conn.execute(text("SELECT id, external_id FROM messages ORDER BY id"))
+                assert messages.all() == [(1, "a"), (2, "b")]
+                dedup = await conn.execute(text("SELECT external_id, message_id FROM message_dedup"))
+                assert sorted(dedup.all()) == [("a", 1), ("b", 2)]
+                partitions = await conn.execute(
+                    text(
+                        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                        "WHERE i.inhparent = 'messages'::regclass"
+                    )
+                )
+                assert {"messages_default", "messages_p202501", "messages_p202502"} <= set(
+                    partitions.scalars()
+                )
+                # Прочитанное сообщение Алисы стало водяным знаком Боба
+                marks = await conn.execute(
+                    text("SELECT user_id, last_read_message_id FROM chat_members ORDER BY user_id")
+                )
+                assert marks.all() == [(1, None), (2, 1)]
+                chat = await conn.execute(text("SELECT last_message_id FROM chats"))
+                assert chat.scalar() == 2
+                found = await conn.execute(
+                    text("SELECT id FROM messages WHERE search_vector @@ to_tsquery('russian', 'мир')")
+                )
+                assert found.scalars().all() == [1]
+                assert (await conn.execute(text("SELECT nextval('messages_id_seq')"))).scalar() == 3
+        finally:
+            await asyncio.to_thread(command.upgrade, config, "head")
+            async with create_test_engine.begin() as conn:
+                await conn.execute(
+                    text(
+                        "TRUNCATE users, chats, groups, chat_members, messages, message_dedup "
+                        "RESTART IDENTITY CASCADE"
+                    )
+                )
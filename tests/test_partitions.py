@@ -0,0 +1,37 @@
+from datetime import date, datetime
+
+from src.db.partitions import add_months, month_start, partition_ddl, partition_month, partition_name
+
+
+class TestPartitionNaming:
+    """Тесты расчета месяцев и DDL секций messages."""
+
+    def test_month_arithmetic_crosses_year(self):
+        """Начало месяца и сдвиг на месяцы корректны на границе года."""
+        assert month_start(datetime(2024, 12, 31, 23, 59)) == date(2024, 12, 1)
+        assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+        assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+
+    def test_partition_name_roundtrip(self):
+        """Имя секции однозначно переводится в месяц и обратно."""
+        assert partition_name(date(2025, 3, 1)) == "messages_p202503"
+        assert partition_month("messages_p202503") == date(2025, 3, 1)
+        assert partition_month("messages_default") is None
+
+    def test_range_partition_ddl(self):
+        """Месячная секция занимает диапазон от начала месяца до начала следующего."""
+        assert partition_ddl(date(2025, 12, 1)) == [
+            "CREATE TABLE IF NOT EXISTS messages_p202512 PARTITION OF messages "
+            "FOR VALUES FROM ('2025-12-01') TO ('2026-01-01')"
+        ]
+
+    def test_hash_subpartitions_ddl(self):
+        """С модулем хэша месячная секция делится на подсекции по chat_id."""
+        statements = partition_ddl(date(2025, 1, 1), hash_modulus=4)
+
+        assert statements[0].endswith("PARTITION BY HASH (chat_id)")
+        assert len(statements) == 5
+        assert statements[-1] == (
+            "CREATE TABLE IF NOT EXISTS messages_p202501_h3 PARTITION OF messages_p202501 "
+            "FOR VALUES WITH (MODULUS 4, REMAINDER 3)"
+        )
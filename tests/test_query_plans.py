@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+from uuid import uuid4
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import ChatType
+
+
+@contextmanager
+def record_queries(session: AsyncSession):
+    """Запоминает SQL и параметры всех запросов, выполненных внутри блока."""
+    statements: list[tuple[str, tuple]] = []
+    sync_engine = session.bind.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):  # noqa
+        statements.append((statement, tuple(parameters or ())))
+
+    event.listen(sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", record)
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """Таблицы, которые план читает последовательным сканированием."""
+    found = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def explain_seq_scans(session: AsyncSession, statements: list[tuple[str, tuple]]) -> dict[str, list[str]]:
+    # Без штрафа последовательное чтение почти пустых таблиц всегда дешевле:
+    # с enable_seqscan = off оно остается в плане, только если подходящего индекса нет
+    await session.execute(text("SET LOCAL enable_seqscan = off"))
+    conn = await session.connection()
+    scans = {}
+    for statement, parameters in statements:
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        found = seq_scans(result.scalar()[0]["Plan"])
+        if found:
+            scans[statement] = found
+    return scans
+
+
+class TestQueryPlans:
+    """Запросы горячих путей читают таблицы по индексам."""
+
+    async def test_repository_queries_use_indexes(
+        self, db_session, user_repo, chat_repo, chat_member_repo, group_repo, message_repo
+    ):
+        """Ни один запрос репозиториев не читает таблицы последовательным сканированием."""
+        alice = await user_repo.create("Alice", "alice@example.com", "secret")
+        bob = await user_repo.create("Bob", "bob@example.com", "secret")
+        chat = await chat_repo.create_chat("Group", ChatType.GROUP)
+        await group_repo.create_group(chat, alice.id)
+        for user in (alice, bob):
+            await chat_member_repo.add_member(chat, user)
+        message = await message_repo.create_if_member(str(uuid4()), chat.id, alice.id, "Привет, мир")
+
+        with record_queries(db_session) as statements:
+            await user_repo.get_by_email("bob@example.com")
+            await user_repo.get_chats_by_user_id(bob.id)
+            await user_repo.get_chat_list(bob.id, 20)
+            await chat_member_repo.is_member(chat.id, bob.id)
+            await chat_member_repo.get_chat_member_ids(chat.id)
+            await chat_member_repo.get_chat_members(chat.id)
+            await chat_member_repo.get_read_by_all([(chat.id, alice.id)])
+            await chat_member_repo.get_read_watermarks(chat.id)
+            await group_repo.get_by_id_with_members(chat.id)
+            await message_repo.get_history(chat.id, 20, latest=True)
+            await message_repo.get_history(chat.id, 20, before=(message.timestamp, message.id + 1))
+            await message_repo.get_read_senders([(chat.id, bob.id, 0, message.id)])
+            await message_repo.search(bob.id, "мир", 20)
+            await message_repo.create_if_member(str(uuid4()), chat.id, bob.id, "Ответ")
+
+        assert len(statements) >= 14
+        assert await explain_seq_scans(db_session, statements) == {}
@@ -0,0 +1,86 @@
+import json
+import uuid
+
+from src.models import ChatType
+from src.repositories.chat import ChatRepository
+from src.repositories.chat_member import ChatMemberRepository
+from src.repositories.message import MessageRepository
+from src.repositories.user import UserRepository
+from src.services.read_receipts import ReadReceiptBatcher
+
+
+class FakeManager:
+    """Запоминает кадры, разосланные пользователям."""
+
+    def __init__(self):
+        self.frames: dict[int, list[dict]] = {}
+
+    async def broadcast(self, user_ids, message):
+        for user_id in user_ids:
+            self.frames.setdefault(user_id, []).append(json.loads(message))
+        return []
+
+
+class TestReadReceipts:
+    """Тесты водяных знаков прочтения и пакетных уведомлений."""
+
+    async def test_receipts_are_coalesced(self, isolated_sessionmaker):
+        """Несколько отметок сводятся в один сдвиг и одно уведомление автору."""
+        async with isolated_sessionmaker() as session:
+            users = UserRepository(session)
+            alice = await users.create("Alice", "alice@example.com", "secret")
+            bob = await users.create("Bob", "bob@example.com", "secret")
+            carol = await users.create("Carol", "carol@example.com", "secret")
+            chat = await ChatRepository(session).create_chat("Group", ChatType.GROUP)
+            for user in (alice, bob, carol):
+                await ChatMemberRepository(session).add_member(chat, user)
+            messages = [
+                await MessageRepository(session).create_if_member(str(uuid.uuid4()), chat.id, alice.id, f"{i}")
+                for i in range(3)
+            ]
+            await session.commit()
+
+        manager = FakeManager()
+        receipts = ReadReceiptBatcher(isolated_sessionmaker, manager, flush_interval_ms=1000)
+        receipts.mark_read(chat.id, bob.id, messages[0].id)
+        receipts.mark_read(chat.id, bob.id, messages[2].id)
+        receipts.mark_read(chat.id, bob.id, messages[1].id)
+        await receipts.flush()
+
+        assert len(manager.frames[alice.id]) == 1
+        chat_receipt = manager.frames[alice.id][0]["chats"][0]
+        assert chat_receipt["readers"] == [{"user_id": bob.id, "message_id": messages[2].id}]
+        assert chat_receipt["read_by_all"] == 0
+
+        async with isolated_sessionmaker() as session:
+            history = await MessageRepository(session).get_history(chat.id, limit=10)
+            assert not any(message.is_read for message in history)
+
+        receipts.mark_read(chat.id, carol.id, messages[1].id)
+        await receipts.flush()
+        assert manager.frames[alice.id][1]["chats"][0]["read_by_all"] == messages[1].id
+
+        async with isolated_sessionmaker() as session:
+            history = await MessageRepository(session).get_history(chat.id, limit=10)
+            assert [message.is_read for message in history] == [True, True, False]
+
+    async def test_watermark_never_moves_back(self, isolated_sessionmaker):
+        """Отметка на более старое сообщение не сдвигает водяной знак назад."""
+        async with isolated_sessionmaker() as session:
+            alice = await UserRepository(session).create("Alice", "alice@example.com", "secret")
+            bob = await UserRepository(session).create("Bob", "bob@example.com", "secret")
+            chat = await ChatRepository(session).create_chat("Personal", ChatType.PERSONAL)
+            await ChatMemberRepository(session).add_member(chat, alice)
+            await ChatMemberRepository(session).add_member(chat, bob)
+            first = await MessageRepository(session).create_if_member(str(uuid.uuid4()), chat.id, alice.id, "1")
+            second = await MessageRepository(session).create_if_member(str(uuid.uuid4()), chat.id, alice.id, "2")
+            await session.commit()
+
+        manager = FakeManager()
+        receipts = ReadReceiptBatcher(isolated_sessionmaker, manager, flush_interval_ms=1000)
+        receipts.mark_read(chat.id, bob.id, second.id)
+        await receipts.flush()
+        receipts.mark_read(chat.id, bob.id, first.id)
+        await receipts.flush()
+
+        assert len(manager.frames[alice.id]) == 1
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from src.schemas.message import MessageResponse, MessageRow
+from src.services.recent_messages import RecentMessagesCache, overlay_read_state
+
+START = datetime(2025, 1, 1)
+
+
+def message(message_id: int, chat_id: int = 1) -> MessageRow:
+    return MessageRow(
+        message_id, chat_id, 10, f"text {message_id}", False, START + timedelta(seconds=message_id)
+    )
+
+
+def ids(messages: list[MessageRow] | None) -> list[int] | None:
+    return None if messages is None else [m.id for m in messages]
+
+
+@pytest.fixture
+def cache():
+    return RecentMessagesCache(FakeAsyncRedis(), capacity=3, ttl=60)
+
+
+class TestRecentMessagesCache:
+    """Тесты буфера последних сообщений чата."""
+
+    async def test_miss_before_fill(self, cache):
+        """Отправка в незаполненный буфер его не создает."""
+        await cache.push(1, orjson.dumps(message(1)))
+
+        assert await cache.get_latest(1, 2) is None
+
+    async def test_fill_and_push(self, cache):
+        """После заполнения новые сообщения дописываются, старые вытесняются."""
+        assert await cache.fill(1, await cache.generation(1), [message(i) for i in (1, 2, 3)])
+        await cache.push(1, orjson.dumps(message(4)))
+
+        assert ids(await cache.get_latest(1, 3)) == [2, 3, 4]
+        assert ids(await cache.get_latest(1, 2)) == [3, 4]
+        assert await cache.get_latest(1, 4) is None
+
+    async def test_short_chat_is_complete(self, cache):
+        """Чат короче буфера отдается целиком, пока маркер начала не вытеснен."""
+        await cache.fill(1, await cache.generation(1), [message(1)])
+
+        assert ids(await cache.get_latest(1, 3)) == [1]
+        for message_id in (2, 3, 4):
+            await cache.push(1, orjson.dumps(message(message_id)))
+        assert ids(await cache.get_latest(1, 3)) == [2, 3, 4]
+
+    async def test_empty_chat_is_cached(self, cache):
+        """Пустой чат кэшируется и отдается без обращения к БД."""
+        await cache.fill(1, await cache.generation(1), [])
+
+        assert await cache.get_latest(1, 3) == []
+
+    async def test_fill_aborted_by_concurrent_send(self, cache):
+        """Сообщение, отправленное между чтением из БД и заполнением, не теряется."""
+        generation = await cache.generation(1)
+        await cache.push(1, orjson.dumps(message(3)))
+
+        assert not await cache.fill(1, generation, [message(1), message(2)])
+        assert await cache.get_latest(1, 2) is None
+
+    async def test_out_of_order_and_duplicate_push(self, cache):
+        """Порядок отправок и повтор уже заполненного сообщения выравниваются при чтении."""
+        await cache.fill(1, await cache.generation(1), [message(1), message(2)])
+        await cache.push(1, orjson.dumps(message(4)))
+        await cache.push(1, orjson.dumps(message(2)))
+
+        # Повтор занял место в буфере: уникальных сообщений меньше, чем просили
+        assert ids(await cache.get_latest(1, 2)) == [2, 4]
+        assert await cache.get_latest(1, 3) is None
+        await cache.push(1, orjson.dumps(message(3)))
+        assert ids(await cache.get_latest(1, 3)) == [2, 3, 4]
+
+    async def test_invalidate(self, cache):
+        """Сброс удаляет буфер и срывает заполнение, начатое до него."""
+        generation = await cache.generation(1)
+        await cache.fill(1, generation, [message(1)])
+        await cache.invalidate({1})
+
+        assert await cache.get_latest(1, 1) is None
+        assert not await cache.fill(1, generation, [message(1)])
+
+    async def test_read_state_not_stored(self, cache):
+        """is_read не попадает в буфер: оно меняется без записи в буфер."""
+        read = message(1)
+        read.is_read = True
+        await cache.fill(1, await cache.generation(1), [read])
+        await cache.push(1, orjson.dumps(message(2)))
+
+        raw = await cache.redis.lrange(cache.key(1), 0, -1)
+        assert all(b"is_read" not in item for item in raw)
+        assert [m.is_read for m in await cache.get_latest(1, 2)] == [False, False]
+
+
+class TestOverlayReadState:
+    """Тесты наложения состояния прочтения по водяным знакам."""
+
+    def test_read_by_all_except_sender(self):
+        """Сообщение прочитано, когда его прочитали все участники, кроме отправителя."""
+        messages = [message(5), message(7), message(9)]
+        # Отправитель 10 сам не читал, но его водяной знак не учитывается
+        overlay_read_state(messages, {10: 0, 11: 9, 12: 7})
+
+        assert [m.is_read for m in messages] == [True, True, False]
+
+    def test_sender_with_lowest_watermark(self):
+        """Наименьший водяной знак отправителя не делает его сообщения непрочитанными."""
+        mine = message(5)
+        theirs = MessageRow(6, 1, 11, "reply", False, START)
+        overlay_read_state([mine, theirs], {10: 0, 11: 5})
+
+        assert mine.is_read is True
+        assert theirs.is_read is False
+
+    def test_chat_without_other_members(self):
+        """Сообщение в чате без других участников считается прочитанным."""
+        assert overlay_read_state([message(1)], {10: 0})[0].is_read is True
+
+
+class TestMessageRow:
+    """Тесты быстрой сериализации строк истории."""
+
+    def test_matches_message_response(self):
+        """orjson выдает тот же JSON, что и MessageResponse, и читается обратно."""
+        row = MessageRow(1, 2, 3, "привет", True, datetime(2025, 1, 1, 12, 30, 15, 123456))
+
+        assert orjson.loads(orjson.dumps(row)) == orjson.loads(
+            MessageResponse.model_validate(row, from_attributes=True).model_dump_json()
+        )
+        assert MessageRow.from_json(orjson.dumps(row)) == row
@@ -0,0 +1,192 @@
+import asyncio
+import time
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import SecretStr
+
+from src.core import security
+from src.core.config import Settings, settings
+from src.core.exceptions import AuthenticationError
+from src.core.security import Principal, TokenAuthenticator, decode_token, encode_token
+from src.routers.chat import router as chat_router
+
+SECRET = "test-secret"
+
+
+def make_authenticator(server: FakeServer | None = None) -> TokenAuthenticator:
+    return TokenAuthenticator(
+        FakeAsyncRedis(server=server or FakeServer()), SECRET, 3600, 10, 60
+    )
+
+
+class TestTokens:
+    """Тесты подписи и проверки токенов."""
+
+    def test_roundtrip(self):
+        """Подписанный токен декодируется в того же пользователя."""
+        now = time.time()
+        principal = Principal(7, "abc", round(now, 3), round(now + 60, 3))
+
+        assert decode_token(encode_token(principal, SECRET), SECRET) == principal
+
+    def test_tampered_signature_rejected(self):
+        """Токен, подписанный другим ключом, отклоняется."""
+        now = time.time()
+        token = encode_token(Principal(7, "abc", now, now + 60), "other-secret")
+
+        with pytest.raises(AuthenticationError):
+            decode_token(token, SECRET)
+
+    def test_expired_token_rejected(self):
+        """Истекший токен отклоняется."""
+        now = time.time()
+        token = encode_token(Principal(7, "abc", now - 120, now - 60), SECRET)
+
+        with pytest.raises(AuthenticationError):
+            decode_token(token, SECRET)
+
+    def test_garbage_rejected(self):
+        """Произвольная строка не считается токеном."""
+        with pytest.raises(AuthenticationError):
+            decode_token("not-a-token", SECRET)
+
+
+class TestTokenAuthenticator:
+    """Тесты аутентификации с кэшем и отзывом токенов."""
+
+    def test_issue_and_authenticate(self):
+        """Выданный токен проверяется и кэшируется."""
+        auth = make_authenticator()
+        token, principal = auth.issue(7)
+
+        assert auth.authenticate(token) == principal
+        assert token in auth._cache
+        assert auth.authenticate(token) == principal
+
+    def test_issue_without_secret(self):
+        """Без секрета токены не выдаются и не принимаются."""
+        auth = TokenAuthenticator(FakeAsyncRedis(), "", 3600, 10, 60)
+
+        with pytest.raises(AuthenticationError):
+            auth.issue(7)
+
+    def test_cache_is_bounded(self):
+        """Кэш проверенных токенов вытесняет самые старые."""
+        auth = make_authenticator()
+        tokens = [auth.issue(user_id)[0] for user_id in range(1, 13)]
+        for token in tokens:
+            auth.authenticate(token)
+
+        assert len(auth._cache) == 10
+        assert tokens[0] not in auth._cache
+
+    async def test_revocation_propagates(self):
+        """Отзыв токена в одном процессе действует в другом, даже для закэшированного токена."""
+        server = FakeServer()
+        issuer = make_authenticator(server)
+        other = make_authenticator(server)
+        await other.start()
+        token, principal = issuer.issue(7)
+        other.authenticate(token)
+
+        await issuer.revoke_token(principal)
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(AuthenticationError):
+            other.authenticate(token)
+        await other.stop()
+
+    async def test_revocation_notifies_subscribers(self):
+        """Отзыв в другом процессе вызывает подписчиков on_revoke."""
+        server = FakeServer()
+        issuer = make_authenticator(server)
+        other = make_authenticator(server)
+        await other.start()
+        _, principal = issuer.issue(7)
+        notified = asyncio.Event()
+
+        async def on_revoke():
+            if other.is_revoked(principal):
+                notified.set()
+
+        other.on_revoke(on_revoke)
+        await issuer.revoke_user(7)
+
+        await asyncio.wait_for(notified.wait(), 1)
+        await other.stop()
+
+    async def test_revoke_user_cuts_off_earlier_tokens(self):
+        """Отзыв пользователя отклоняет ранее выданные токены, но не новые."""
+        auth = make_authenticator()
+        old_token, _ = auth.issue(7)
+        await auth.revoke_user(7)
+        await asyncio.sleep(0.01)
+        new_token, _ = auth.issue(7)
+
+        with pytest.raises(AuthenticationError):
+            auth.authenticate(old_token)
+        assert auth.authenticate(new_token).user_id == 7
+
+    async def test_revocations_loaded_on_start(self):
+        """Процесс, запущенный после отзыва, видит его."""
+        server = FakeServer()
+        issuer = make_authenticator(server)
+        token, principal = issuer.issue(7)
+        await issuer.revoke_token(principal)
+
+        late = make_authenticator(server)
+        await late.start()
+
+        with pytest.raises(AuthenticationError):
+            late.authenticate(token)
+        await late.stop()
+
+
+class TestAuthRequired:
+    """Тесты обязательности токена."""
+
+    def test_secret_makes_token_required(self):
+        """С заданным AUTH_SECRET_KEY токен обязателен и при AUTH_REQUIRED=false."""
+        assert Settings(AUTH_SECRET_KEY=SECRET, AUTH_REQUIRED=False).auth_required
+
+    def test_optional_without_secret(self):
+        """Без ключа токен обязателен, только если AUTH_REQUIRED включен явно."""
+        assert not Settings(AUTH_SECRET_KEY="", AUTH_REQUIRED=False).auth_required
+        assert Settings(AUTH_SECRET_KEY="", AUTH_REQUIRED=True).auth_required
+
+
+@pytest.fixture
+async def chat_client(monkeypatch):
+    """Клиент роутера чатов с заданным AUTH_SECRET_KEY."""
+    monkeypatch.setattr(settings, "AUTH_SECRET_KEY", SecretStr(SECRET))
+    monkeypatch.setattr(security.token_authenticator, "secret", SECRET)
+    app = FastAPI()
+    app.include_router(chat_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+class TestRouterAuth:
+    """Тесты аутентификации и проверки владельца в роутерах."""
+
+    async def test_anonymous_request_rejected(self, chat_client):
+        """С заданным ключом роутер чатов не принимает запрос без токена."""
+        response = await chat_client.post(
+            "/chats/create_personal", json={"creator_id": 1, "friend_id": 2}
+        )
+
+        assert response.status_code == 401
+
+    async def test_foreign_creator_rejected(self, chat_client):
+        """Создать чат от имени другого пользователя нельзя."""
+        token, _ = security.token_authenticator.issue(1)
+        response = await chat_client.post(
+            "/chats/create_personal",
+            json={"creator_id": 2, "friend_id": 3},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == 403
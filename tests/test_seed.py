@@ -0,0 +1,31 @@
+import random
+
+from src.db.seed import bursts, chunked, power_law_sizes
+
+
+class TestSeedGenerators:
+    """Тесты распределений генератора синтетических данных."""
+
+    def test_power_law_sizes_bounded_with_heavy_tail(self):
+        """Размеры групп лежат в границах, а распределение имеет тяжелый хвост."""
+        sizes = power_law_sizes(random.Random(1), 10_000, alpha=1.5, min_size=3, max_size=5_000)
+
+        assert min(sizes) >= 3 and max(sizes) <= 5_000
+        # Медиана мала, но в хвосте есть группы на порядки больше
+        assert sorted(sizes)[len(sizes) // 2] < 10
+        assert max(sizes) > 500
+
+    def test_bursts_cover_count_within_span(self):
+        """Всплески содержат ровно заданное число отметок, упорядоченных внутри интервала."""
+        span = 86_400.0
+        groups = list(bursts(random.Random(1), 5_000, span, mean_burst=8, burst_gap=20))
+        offsets = [offset for burst in groups for offset in burst]
+
+        assert len(offsets) == 5_000
+        assert offsets == sorted(offsets)
+        assert offsets[-1] <= span
+        assert 300 < len(groups) < 1_000
+
+    def test_chunked(self):
+        """Поток строк делится на пачки заданного размера с неполной последней."""
+        assert [len(chunk) for chunk in chunked(((i,) for i in range(7)), 3)] == [3, 3, 1]
@@ -0,0 +1,70 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import Settings
+from src.db.session import after_commit, engine_options, engine_url, run_after_commit
+
+
+class TestEngineOptions:
+    """Тесты параметров движка БД."""
+
+    def test_default_mode(self):
+        """По умолчанию включены кэши подготовленных выражений и statement_timeout."""
+        settings = Settings(DB_STATEMENT_TIMEOUT_MS=5000, DB_APPLICATION_NAME="api")
+        options = engine_options(settings)
+
+        assert options["connect_args"]["statement_cache_size"] == settings.DB_STATEMENT_CACHE_SIZE
+        assert options["connect_args"]["server_settings"] == {
+            "application_name": "api",
+            "statement_timeout": "5000",
+        }
+        assert engine_url(settings).query["prepared_statement_cache_size"] == "100"
+
+    def test_pgbouncer_mode(self):
+        """Режим PgBouncer отключает подготовленные выражения."""
+        settings = Settings(DB_PGBOUNCER=True, DB_STATEMENT_TIMEOUT_MS=5000)
+        options = engine_options(settings)
+
+        assert options["connect_args"]["statement_cache_size"] == 0
+        assert "statement_timeout" not in options["connect_args"]["server_settings"]
+        assert options["connect_args"]["prepared_statement_name_func"]() != (
+            options["connect_args"]["prepared_statement_name_func"]()
+        )
+        assert engine_url(settings).query["prepared_statement_cache_size"] == "0"
+
+
+class TestAfterCommit:
+    """Тесты действий, отложенных до коммита сессии."""
+
+    async def test_runs_after_commit(self):
+        """Действие выполняется только после коммита и один раз."""
+        calls = []
+
+        async def callback():
+            calls.append(1)
+
+        session = AsyncSession()
+        await session.begin()
+        after_commit(session, callback)
+        await run_after_commit(session)
+        assert calls == []
+
+        await session.commit()
+        await run_after_commit(session)
+        await run_after_commit(session)
+        assert calls == [1]
+
+    async def test_discarded_on_rollback(self):
+        """Откат отбрасывает отложенные действия."""
+        calls = []
+
+        async def callback():
+            calls.append(1)
+
+        session = AsyncSession()
+        await session.begin()
+        after_commit(session, callback)
+        await session.rollback()
+        await session.commit()
+        await run_after_commit(session)
+
+        assert calls == []
@@ -0,0 +1,46 @@
+from src.core.timer_wheel import TimerWheel
+
+
+def advance(wheel: TimerWheel, ticks: int) -> list[set]:
+    return [wheel.advance() for _ in range(ticks)]
+
+
+class TestTimerWheel:
+    """Тесты колеса таймеров."""
+
+    def test_fires_after_delay(self):
+        """Таймер срабатывает на тике, округленном вверх."""
+        wheel = TimerWheel(1, 10)
+        wheel.schedule("a", 2.5)
+
+        assert advance(wheel, 3) == [set(), set(), {"a"}]
+        assert "a" not in wheel
+        assert len(wheel) == 0
+
+    def test_reschedule_and_cancel(self):
+        """Повторная постановка переносит таймер, отмена снимает его."""
+        wheel = TimerWheel(1, 10)
+        wheel.schedule("a", 1)
+        wheel.schedule("a", 3)
+        wheel.schedule("b", 1)
+        wheel.cancel("b")
+        wheel.cancel("missing")
+
+        assert advance(wheel, 3) == [set(), set(), {"a"}]
+
+    def test_minimum_one_tick(self):
+        """Нулевая задержка срабатывает на следующем тике, а не в текущей корзине."""
+        wheel = TimerWheel(1, 10)
+        wheel.schedule("a", 0)
+
+        assert wheel.advance() == {"a"}
+
+    def test_long_delay_capped_to_revolution(self):
+        """Задержка длиннее оборота срабатывает через оборот, а не раньше по модулю."""
+        wheel = TimerWheel(1, 3)
+        wheel.advance()
+        wheel.schedule("a", 100)
+
+        fired = advance(wheel, 4)
+        assert fired[:2] == [set(), set()]
+        assert "a" in fired[2]
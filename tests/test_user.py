@@ -1,3 +1,5 @@
+from uuid import uuid4
+
 import pytest
 from src.core.exceptions import AlreadyExistsError, NotFoundError
 
@@ -42,3 +44,31 @@ class TestUserService:
 
         with pytest.raises(NotFoundError, match='не найден'):
             await user_service.get_exist_user(999)
+
+    async def test_chat_list_with_preview_and_unread(
+        self, user_service, chat_service, chat_member_repo, message_repo
+    ):
+        """Список чатов содержит последнее сообщение, непрочитанные и листается курсором."""
+        alice = await user_service.create_user("Alice", "alice@example.com", "hashed_password")
+        bob = await user_service.create_user("Bob", "bob@example.com", "hashed_password")
+        personal = await chat_service.create_personal_chat(alice.id, bob.id)
+        group = await chat_service.create_group_chat("Group", alice.id)
+
+        first = await message_repo.create(str(uuid4()), personal.id, bob.id, "Привет")
+        await message_repo.create(str(uuid4()), personal.id, alice.id, "Свое")
+        last = await message_repo.create(str(uuid4()), personal.id, bob.id, "x" * 200)
+        await chat_member_repo.advance_read_watermarks([(personal.id, alice.id, first.id)])
+
+        rows, cursor = await user_service.get_chat_list(alice.id, limit=1)
+        assert len(rows) == 1 and cursor is not None
+        rest, next_cursor = await user_service.get_chat_list(alice.id, limit=1, before=cursor)
+        assert next_cursor is not None
+        empty, _ = await user_service.get_chat_list(alice.id, limit=1, before=next_cursor)
+        assert empty == []
+
+        by_id = {row.id: row for row in rows + rest}
+        assert by_id[personal.id].unread_count == 1
+        assert by_id[personal.id].last_message_id == last.id
+        assert by_id[personal.id].last_message_text == "x" * 100
+        assert by_id[group.id].last_message_id is None
+        assert by_id[group.id].unread_count == 0
@@ -0,0 +1,73 @@
+import gc
+import tracemalloc
+import uuid
+
+from fakeredis import FakeAsyncRedis
+
+from src.core import dependencies
+from src.models import ChatType
+from src.repositories.chat import ChatRepository
+from src.repositories.chat_member import ChatMemberRepository
+from src.repositories.user import UserRepository
+from src.routers import ws
+from src.services.membership_cache import MembershipCache
+from src.services.message_idempotency import MessageIdempotency
+from src.services.recent_messages import RecentMessagesCache
+
+
+class CountingManager:
+    """Считает рассылки, не удерживая сами сообщения."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def broadcast(self, user_ids, message):
+        self.sent += 1
+        return []
+
+
+class TestWebSocketFrames:
+    """Тесты обработки кадров WebSocket."""
+
+    async def test_memory_flat_across_messages(self, isolated_sessionmaker, monkeypatch):
+        """Память соединения не растет с числом обработанных сообщений."""
+        async with isolated_sessionmaker() as session:
+            alice = await UserRepository(session).create("Alice", "alice@example.com", "secret")
+            bob = await UserRepository(session).create("Bob", "bob@example.com", "secret")
+            chat = await ChatRepository(session).create_chat("Personal", ChatType.PERSONAL)
+            await ChatMemberRepository(session).add_member(chat, alice)
+            await ChatMemberRepository(session).add_member(chat, bob)
+            await session.commit()
+
+        manager = CountingManager()
+        redis = FakeAsyncRedis()
+        recent_messages = RecentMessagesCache(redis, 50, 60)
+        monkeypatch.setattr(dependencies.db_session, "async_session_factory", isolated_sessionmaker)
+        monkeypatch.setattr(dependencies, "membership_cache", MembershipCache(redis, 100, 60))
+        monkeypatch.setattr(dependencies, "recent_messages", recent_messages)
+        monkeypatch.setattr(ws, "recent_messages", recent_messages)
+        monkeypatch.setattr(ws, "message_idempotency", MessageIdempotency(redis, 30, 600))
+        monkeypatch.setattr(ws, "ws_manager", manager)
+
+        async def send(count: int):
+            for i in range(count):
+                await ws.handle_frame(alice.id, {
+                    "action": "send_message",
+                    "msg": {"chat_id": chat.id, "external_id": str(uuid.uuid4()), "text": f"Сообщение {i}"},
+                })
+
+        # Прогрев: кэши компиляции запросов и подготовленных выражений
+        await send(1_000)
+        gc.collect()
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+        await send(9_000)
+        # Ключи идемпотентности живут в Redis, а не в памяти соединения
+        await redis.flushall()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert manager.sent == 10_000
+        assert current - baseline < 1024 * 1024
@@ -0,0 +1,358 @@
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+import msgpack
+import pytest
+from fakeredis import FakeAsyncRedis
+from prometheus_client import REGISTRY
+
+from src.core.config import settings
+from src.core import timer_wheel, ws_manager
+from src.core.security import Principal
+from src.core.ws_manager import PING_FRAME, WSManager, build_envelope, parse_envelope
+
+
+class FakeWebSocket:
+    """Минимальная замена WebSocket, запоминающая отправленные сообщения."""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent: list[str | bytes] = []
+        self.closed_with: int | None = None
+
+    async def accept(self, subprotocol: str | None = None):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes):
+        await self.send_text(message)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+        # Медленный клиент не дочитывает и кадр закрытия
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def redis():
+    return FakeAsyncRedis()
+
+
+class TestWSManager:
+    """Тесты рассылки через WSManager."""
+
+    async def test_broadcast_not_blocked_by_slow_client(self, redis):
+        """Медленный клиент не задерживает доставку остальным."""
+        manager = WSManager(redis)
+        slow, fast = FakeWebSocket(delay=10), FakeWebSocket()
+        await manager.connect(1, slow)
+        await manager.connect(2, fast)
+
+        undelivered = await asyncio.wait_for(manager.broadcast([1, 2], "hi"), 1)
+        await asyncio.sleep(0.01)
+
+        assert undelivered == []
+        assert fast.sent == ["hi"]
+        await manager.stop()
+
+    async def test_slow_consumer_disconnected(self, redis, monkeypatch):
+        """Переполнение очереди отключает клиента, не дожидаясь закрытия сокета, и возвращает его как недоставленного."""
+        monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 1)
+        monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_POLICY", "disconnect")
+        manager = WSManager(redis)
+        slow = FakeWebSocket(delay=10)
+        await manager.connect(1, slow)
+
+        assert await manager.broadcast([1], "first") == []
+        await asyncio.sleep(0.01)
+        assert await manager.broadcast([1], "second") == []
+        assert await asyncio.wait_for(manager.broadcast([1], "third"), 1) == [1]
+        await asyncio.sleep(0)
+        assert slow.closed_with is not None
+        assert not await manager.is_online(1)
+        await manager.stop()
+
+    async def test_unknown_user_is_undelivered(self, redis):
+        """Пользователь без присутствия ни на одном узле считается оффлайн."""
+        manager = WSManager(redis)
+        assert await manager.broadcast([42], "hi") == [42]
+
+    async def test_stale_node_presence_pruned(self, redis):
+        """Запись о присутствии на неслушающем узле удаляется."""
+        manager = WSManager(redis)
+        await redis.sadd(WSManager.presence_key(7), "dead-node")
+
+        assert not await manager.send_to_user(7, "hi")
+        assert not await redis.exists(WSManager.presence_key(7))
+
+    async def test_offline_replay_waits_for_ack(self, redis, monkeypatch):
+        """Оффлайн-очередь выдается пакетами и удаляется только после ack."""
+        monkeypatch.setattr(settings, "OFFLINE_REPLAY_BATCH", 2)
+        manager = WSManager(redis)
+        for i in range(3):
+            await manager.offline_queue.push_many([1], json.dumps({"text": f"m{i}"}))
+        websocket = FakeWebSocket()
+        connection = await manager.connect(1, websocket)
+        await asyncio.sleep(0.01)
+
+        assert len(websocket.sent) == 1
+        first = json.loads(websocket.sent[0])
+        assert [m["text"] for m in first["messages"]] == ["m0", "m1"]
+
+        await manager.ack(connection, first["cursor"])
+        await asyncio.sleep(0.01)
+        second = json.loads(websocket.sent[1])
+        assert [m["text"] for m in second["messages"]] == ["m2"]
+
+        await manager.ack(connection, second["cursor"])
+        assert await manager.offline_queue.read(1, None, 10) == []
+        await manager.stop()
+
+    async def test_offline_replay_resends_unacked(self, redis, monkeypatch):
+        """Неподтвержденный пакет отправляется повторно."""
+        monkeypatch.setattr(settings, "OFFLINE_ACK_TIMEOUT", 0.01)
+        manager = WSManager(redis)
+        await manager.offline_queue.push_many([1], json.dumps({"text": "m0"}))
+        websocket = FakeWebSocket()
+        await manager.connect(1, websocket)
+        await asyncio.sleep(0.05)
+
+        assert len(websocket.sent) >= 2
+        assert websocket.sent[0] == websocket.sent[1]
+        await manager.stop()
+
+    async def test_broadcast_reaches_every_device(self, redis):
+        """Сообщение доставляется во все соединения пользователя."""
+        manager = WSManager(redis)
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(1, phone, "phone")
+        await manager.connect(1, laptop, "laptop")
+
+        assert await manager.broadcast([1], "hi") == []
+        await asyncio.sleep(0.01)
+
+        assert phone.sent == ["hi"]
+        assert laptop.sent == ["hi"]
+        await manager.stop()
+
+    async def test_broadcast_reaches_devices_on_other_nodes(self, redis):
+        """Устройства пользователя на разных узлах получают сообщение оба."""
+        first_node, second_node = WSManager(redis), WSManager(redis)
+        await first_node.start()
+        await second_node.start()
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        await first_node.connect(1, phone, "phone")
+        await second_node.connect(1, laptop, "laptop")
+
+        assert await first_node.broadcast([1], "hi") == []
+        await asyncio.sleep(0.05)
+
+        assert phone.sent == ["hi"]
+        assert laptop.sent == ["hi"]
+        await first_node.stop()
+        await second_node.stop()
+
+    async def test_disconnect_keeps_other_devices(self, redis):
+        """Закрытие одной вкладки не отключает пользователя на остальных."""
+        manager = WSManager(redis)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        connection = await manager.connect(1, first)
+        await manager.connect(1, second)
+
+        await manager.disconnect(connection)
+        await manager.disconnect(connection)
+
+        assert manager.connection_count == 1
+        assert await redis.sismember(WSManager.presence_key(1), manager.node_id)
+        assert await manager.broadcast([1], "hi") == []
+        await asyncio.sleep(0.01)
+        assert first.sent == []
+        assert second.sent == ["hi"]
+        await manager.stop()
+
+    async def test_revoked_connection_closed(self, redis):
+        """Отзыв токена закрывает открытое им соединение, остальные не трогает."""
+        manager = WSManager(redis)
+        revoked = Principal(1, "revoked", 0, time.time() + 60)
+        kept = Principal(1, "kept", 0, time.time() + 60)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(1, first, "phone", principal=revoked)
+        await manager.connect(1, second, "laptop", principal=kept)
+
+        await manager.close_revoked(lambda principal: principal.token_id == "revoked")
+        await asyncio.sleep(0.01)
+
+        assert first.closed_with == 1008
+        assert second.closed_with is None
+        assert manager.connection_count == 1
+        await manager.stop()
+
+    async def test_offline_cursor_per_device(self, redis):
+        """Каждое устройство получает оффлайн-очередь со своего курсора."""
+        manager = WSManager(redis)
+        await manager.offline_queue.push_many([1], json.dumps({"text": "m0"}))
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        connection = await manager.connect(1, phone, "phone")
+        await manager.disconnect(await manager.connect(1, laptop, "laptop"))
+        await asyncio.sleep(0.01)
+        await manager.ack(connection, json.loads(phone.sent[0])["cursor"])
+        await manager.disconnect(connection)
+        await manager.offline_queue.push_many([1], json.dumps({"text": "m1"}))
+
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(1, phone, "phone")
+        await manager.connect(1, laptop, "laptop")
+        await asyncio.sleep(0.01)
+
+        assert [m["text"] for m in json.loads(phone.sent[0])["messages"]] == ["m1"]
+        assert [m["text"] for m in json.loads(laptop.sent[0])["messages"]] == ["m0", "m1"]
+        await manager.stop()
+
+    async def test_stale_device_stops_pinning_queue(self, redis, monkeypatch):
+        """Курсор устройства, давно не подключавшегося, не задерживает очистку очереди."""
+        monkeypatch.setattr(settings, "OFFLINE_DEVICE_TTL", 60)
+        manager = WSManager(redis)
+        queue = manager.offline_queue
+        await queue.get_cursor(1, "old-phone")
+        await redis.zadd(queue.seen_key(1), {"old-phone": time.time() - 120})
+        await queue.push_many([1], json.dumps({"text": "m0"}))
+        (stream_id, _), = await queue.read(1, None, 10)
+
+        await queue.get_cursor(1, "laptop")
+        await queue.ack(1, stream_id, "laptop")
+
+        assert await redis.xlen(queue.key(1)) == 0
+        assert await redis.hkeys(queue.cursors_key(1)) == [b"laptop"]
+        await manager.stop()
+
+    async def test_binary_connection_batches_events(self, redis):
+        """Соединению с бинарным подпротоколом накопленные события уходят одним кадром."""
+        manager = WSManager(redis)
+        binary, text = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(1, binary, binary=True)
+        await manager.connect(2, text)
+        messages = [json.dumps({"id": i, "text": f"m{i}"}) for i in range(3)]
+
+        for message in messages:
+            await manager.broadcast([1, 2], message)
+        await asyncio.sleep(0.01)
+
+        assert len(binary.sent) == 1
+        assert [event["i"] for event in msgpack.unpackb(binary.sent[0][1:])] == [0, 1, 2]
+        assert text.sent == messages
+        await manager.stop()
+
+    async def test_idle_connection_memory_bounded(self, redis):
+        """Простаивающее соединение не держит очередь, писателя и задачу выдачи; учитывается и колесо heartbeat."""
+        manager = WSManager(redis)
+        await manager.connect(0, FakeWebSocket())
+        await asyncio.sleep(0.01)
+        websockets = [FakeWebSocket() for _ in range(500)]
+        gc.collect()
+        tracemalloc.start()
+
+        for user_id, websocket in enumerate(websockets, start=1):
+            await manager.connect(user_id, websocket)
+        await asyncio.sleep(0.05)
+        gc.collect()
+        # Учитываем только память реестра: fakeredis хранит присутствие в этом же процессе
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(True, ws_manager.__file__), tracemalloc.Filter(True, timer_wheel.__file__)]
+        )
+        tracemalloc.stop()
+
+        per_connection = sum(stat.size for stat in snapshot.statistics("filename")) / len(websockets)
+        # 100 тыс. простаивающих сокетов — не больше ~64 МБ на стороне реестра
+        assert per_connection < 640
+        assert all(
+            connection.queue is None and connection.writer is None and connection.replay is None
+            for connections in manager.connections.values()
+            for connection in connections
+        )
+        await manager.stop()
+
+    async def test_silent_connection_pinged_then_evicted(self, redis, monkeypatch):
+        """Молчащее соединение получает пинг, а без ответа отключается и теряет присутствие."""
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_TICK", 0.01)
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_INTERVAL", 0.03)
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_TIMEOUT", 0.03)
+        manager = WSManager(redis)
+        await manager.start()
+        evicted_before = sample("ws_disconnects_total", reason="heartbeat")
+        websocket = FakeWebSocket()
+        await manager.connect(1, websocket)
+
+        await asyncio.sleep(0.05)
+        assert websocket.sent == [PING_FRAME]
+        assert await manager.is_online(1)
+
+        await asyncio.sleep(0.1)
+        assert not await manager.is_online(1)
+        assert websocket.closed_with is not None
+        assert sample("ws_disconnects_total", reason="heartbeat") == evicted_before + 1
+        await manager.stop()
+
+    async def test_heartbeat_error_reschedules(self, redis, monkeypatch):
+        """Ошибка проверки не снимает соединение с heartbeat: его проверят снова."""
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_TICK", 0.01)
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_INTERVAL", 0.03)
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_TIMEOUT", 0.03)
+        manager = WSManager(redis)
+        check = manager._check_heartbeat
+        failures = []
+
+        async def flaky_check(connection, now):
+            if not failures:
+                failures.append(connection)
+                raise ConnectionError("redis is down")
+            await check(connection, now)
+
+        monkeypatch.setattr(manager, "_check_heartbeat", flaky_check)
+        await manager.start()
+        websocket = FakeWebSocket()
+        await manager.connect(1, websocket)
+
+        await asyncio.sleep(0.2)
+        assert failures
+        assert websocket.sent == [PING_FRAME]
+        assert websocket.closed_with is not None
+        assert not await manager.is_online(1)
+        await manager.stop()
+
+    async def test_active_connection_kept(self, redis, monkeypatch):
+        """Соединение, присылающее кадры, не пингуется и не отключается."""
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_TICK", 0.01)
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_INTERVAL", 0.03)
+        monkeypatch.setattr(settings, "WS_HEARTBEAT_TIMEOUT", 0.03)
+        manager = WSManager(redis)
+        await manager.start()
+        websocket = FakeWebSocket()
+        connection = await manager.connect(1, websocket)
+
+        for _ in range(15):
+            await asyncio.sleep(0.01)
+            manager.touch(connection)
+
+        assert websocket.sent == []
+        assert manager.connection_count == 1
+        assert connection in manager.heartbeats
+        await manager.stop()
+
+    async def test_envelope_keeps_message_verbatim(self):
+        """Конверт межузловой рассылки не переэкранирует сериализованное сообщение."""
+        message = json.dumps({"text": "строка\nс \"кавычками\""}, ensure_ascii=False)
+
+        assert parse_envelope(build_envelope([3, 14], message)) == ([3, 14], message)
+        assert parse_envelope(build_envelope([5], message).encode()) == ([5], message)
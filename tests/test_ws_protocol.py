@@ -0,0 +1,107 @@
+import zlib
+from datetime import datetime
+
+import msgpack
+import orjson
+import pytest
+
+from src.core.offline_queue import OfflineQueue
+from src.core.ws_protocol import FLAG_DEFLATE, decode_frame, encode_event, encode_frame
+from src.schemas.message import MessageRow
+
+
+def message_json(message_id: int = 1, text: str = "Привет") -> str:
+    row = MessageRow(message_id, 2, 3, text, False, datetime(2025, 6, 1, 12, 0, 0, 123456))
+    return orjson.dumps(row).decode()
+
+
+def unpack_frame(frame: bytes) -> list[dict]:
+    body = frame[1:]
+    if frame[0] & FLAG_DEFLATE:
+        body = zlib.decompress(body)
+    return msgpack.unpackb(body)
+
+
+class TestWSProtocol:
+    """Тесты бинарного подпротокола WebSocket."""
+
+    def test_message_event_uses_short_keys(self):
+        """Сообщение кодируется с короткими ключами и временем в микросекундах."""
+        event = msgpack.unpackb(encode_event(message_json()))
+
+        assert event == {
+            "e": "m", "i": 1, "c": 2, "s": 3, "t": "Привет", "r": False, "ts": 1748779200123456,
+        }
+        assert len(encode_event(message_json())) < len(message_json().encode())
+
+    def test_offline_frame_event(self):
+        """Пакет оффлайн-очереди сохраняет курсор и сообщения."""
+        frame = OfflineQueue.build_frame([("1-0", message_json(1)), ("2-0", message_json(2))])
+        event = msgpack.unpackb(encode_event(frame))
+
+        assert event["e"] == "o"
+        assert event["cur"] == "2-0"
+        assert [message["i"] for message in event["ms"]] == [1, 2]
+
+    def test_other_events_pass_through(self):
+        """Прочие события сохраняют имя и поля."""
+        frame = orjson.dumps({"event": "read_receipts", "chats": [{"chat_id": 1}]}).decode()
+
+        assert msgpack.unpackb(encode_event(frame)) == {"e": "read_receipts", "chats": [{"chat_id": 1}]}
+
+    @pytest.mark.parametrize("count", [1, 15, 16, 40])
+    def test_frame_batches_events(self, count):
+        """Несколько событий уходят одним кадром-массивом."""
+        events = [encode_event(message_json(i)) for i in range(count)]
+        frame = encode_frame(events, 0, 1)
+
+        assert frame[0] == 0
+        assert [event["i"] for event in unpack_frame(frame)] == list(range(count))
+
+    def test_frame_compressed_above_threshold(self):
+        """Кадр не короче порога сжимается, короткий — нет."""
+        events = [encode_event(message_json(i, "текст " * 20)) for i in range(10)]
+
+        compressed = encode_frame(events, 256, 1)
+        plain = encode_frame(events[:1], 4096, 1)
+
+        assert compressed[0] & FLAG_DEFLATE
+        assert len(compressed) < len(encode_frame(events, 0, 1))
+        assert not plain[0] & FLAG_DEFLATE
+        assert len(unpack_frame(compressed)) == 10
+
+    def test_decode_expands_actions(self):
+        """Входящие действия приводятся к полям JSON-протокола."""
+        frame = b"\x00" + msgpack.packb(
+            [
+                {"a": "send_message", "msg": {"x": "id-1", "c": 5, "t": "Привет"}},
+                {"a": "ack", "cur": "1-0"},
+            ]
+        )
+
+        assert decode_frame(frame, 1024, 10) == [
+            {"action": "send_message", "msg": {"external_id": "id-1", "chat_id": 5, "text": "Привет"}},
+            {"action": "ack", "cursor": "1-0"},
+        ]
+
+    def test_decode_compressed_single_action(self):
+        """Одиночное действие в сжатом кадре тоже принимается."""
+        frame = bytes((FLAG_DEFLATE,)) + zlib.compress(msgpack.packb({"a": "mark_read", "c": 1, "mid": 7}))
+
+        assert decode_frame(frame, 1024, 10) == [{"action": "mark_read", "chat_id": 1, "message_id": 7}]
+
+    @pytest.mark.parametrize(
+        "frame",
+        [
+            b"",
+            b"\x00\xc1",
+            b"\x00" + msgpack.packb("text"),
+            b"\x00" + msgpack.packb([{"a": "ack"}] * 11),
+            bytes((FLAG_DEFLATE,)) + b"not zlib",
+            bytes((FLAG_DEFLATE,)) + zlib.compress(msgpack.packb({"t": "x" * 4096})),
+        ],
+    )
+    def test_decode_rejects_bad_frames(self, frame):
+        """Некорректные, слишком большие и слишком длинные кадры отклоняются."""
+        with pytest.raises(ValueError):
+            decode_frame(frame, 1024, 10)